@@ -1,25 +1,159 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
+import csv
+import functools
+import io
+import itertools
 import os
 import json
+import queue
+import time
+import zlib
+from datetime import datetime, timezone
 from duckle_parser import BankStatementParser
 from database_handler import DatabaseHandler
-import pdfplumber
+from transaction import to_cents
+from ingest_jobs import IngestJobQueue
+from category_rules import get_registry
+from recategorizer import recategorize
+from instrumentation import configure_logging, increment, metrics, observe
 import tempfile
 
+try:
+    import brotli  # Optional; gzip is used when it isn't installed
+except ImportError:
+    brotli = None
+
 app = Flask(__name__, static_folder='react-build')
 CORS(app)  # Enable CORS for all routes
 
-# Initialize the parser and database handler
+# Production servers (main.py --serve) set these before importing this module
+DB_NAME = os.environ.get('DUCKLE_DB', 'transactions.db')
+SERVER_THREADS = int(os.environ.get('DUCKLE_THREADS', 8))
+
+# Initialize the parser and database handler; one read connection per server thread
 parser = BankStatementParser()
-db_handler = DatabaseHandler()
+db_handler = DatabaseHandler(DB_NAME, readers=SERVER_THREADS)
+
+# Uploads are processed in the background so requests return immediately;
+# init_app() starts the queue's worker threads
+INGEST_WORKERS = 2
+INGEST_MAX_QUEUED = 16
+ingest_queue = None
 
 UPLOAD_FOLDER = 'uploads'
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+
+_initialized = False
+
+
+def init_app():
+    """Sets up logging, creates or upgrades the schema and the upload folder and starts the ingest queue.
+
+    Call before serving. Importing this module has no side effects, so
+    tools can import the app without touching the database.
+    """
+    global _initialized, ingest_queue
+    if not _initialized:
+        configure_logging()  # No-op when the hosting server already set up logging
+        db_handler.create_tables()
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        ingest_queue = IngestJobQueue(parser, db_handler, workers=INGEST_WORKERS, max_queued=INGEST_MAX_QUEUED)
+        _initialized = True
+    return app
+
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+
+def conditional_on_data(view):
+    """Answers repeat reads of unchanged transaction data with 304 Not Modified.
+
+    The validators come from the database change counter, so any insert,
+    update or delete invalidates every cached listing at once. The ETag
+    is weak because the same data may be sent gzip-encoded or not.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified = db_handler.data_version()
+        etag = f'data-{version}'
+        last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = (request.if_modified_since is not None
+                            and last_modified.timestamp() <= request.if_modified_since.timestamp())
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'no-cache'  # Cache, but revalidate every time
+        return response
+    return wrapper
+
+def compress_chunks(chunks, encoding):
+    """Compresses an iterable of body chunks, flushing after each so streams stay incremental."""
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# Registered before compress_response, so it runs after it and includes compression
+@app.after_request
+def record_request_metrics(response):
+    """Counts requests and times handlers per route; streamed bodies are timed up to the first byte."""
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    increment('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        observe('http_request_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Brotli- or gzip-encodes large JSON, NDJSON and CSV bodies, including streamed ones."""
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and request.accept_encodings['br']:
+        encoding = 'br'
+    elif request.accept_encodings['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_BYTES:
+            return response
+        response.set_data(b''.join(compress_chunks([data], encoding)))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/api/upload-pdf', methods=['POST'])
 def upload_pdf():
+    """Queues an uploaded statement for import and returns its job id right away."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
@@ -28,83 +162,237 @@ def upload_pdf():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and file.filename.endswith('.pdf'):
-        # Save the uploaded file temporarily
+        # Save the uploaded file temporarily; the job deletes it when done
         with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp:
             file.save(temp.name)
             pdf_path = temp.name
         
         try:
-            # Extract text from PDF
-            with pdfplumber.open(pdf_path) as pdf:
-                all_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            
-            if not all_text.strip():
-                # If no text found, attempt OCR
-                all_text = parser.perform_ocr_on_pdf(pdf_path)
-            
-            # Parse the text
-            transactions = parser.parse_bank_statement_with_year(all_text)
-            
-            # Insert transactions into the database
-            for transaction in transactions:
-                db_handler.insert_transaction(transaction)
-            
-            # Clean up the temporary file
+            job = ingest_queue.submit(pdf_path, file.filename, delete_after=True)
+        except queue.Full:
             os.unlink(pdf_path)
-            
-            return jsonify({
-                'message': f'Successfully parsed {len(transactions)} transactions',
-                'transactions': [
-                    {
-                        'date': t[0],
-                        'withdrawal_or_deposit': t[1],
-                        'transaction_type': t[2],
-                        'details': t[3],
-                        'amount': t[4],
-                        'balance': t[5],
-                        'category': t[6],
-                        'subcategory': t[7]
-                    } for t in transactions
-                ]
-            })
-        
-        except Exception as e:
-            # Clean up in case of error
-            if os.path.exists(pdf_path):
-                os.unlink(pdf_path)
-            return jsonify({'error': str(e)}), 500
+            response = jsonify({'error': 'Too many imports in progress, try again shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        return jsonify({
+            'message': f'Queued {file.filename} for import',
+            'job_id': job.id,
+            'status_url': f'/api/jobs/{job.id}'
+        }), 202
     
     return jsonify({'error': 'Invalid file format'}), 400
 
+@app.route('/api/upload-batch', methods=['POST'])
+def upload_batch():
+    """Queues many statements as one import job; each file gets its own summary in the job result."""
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+
+    invalid = [file.filename for file in files if not file.filename.endswith('.pdf')]
+    if invalid:
+        return jsonify({'error': f'Invalid file format: {", ".join(invalid)}'}), 400
+
+    pdf_paths = []
+    for file in files:
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp:
+            file.save(temp.name)
+            pdf_paths.append(temp.name)
+
+    try:
+        job = ingest_queue.submit_batch(pdf_paths, [file.filename for file in files], delete_after=True)
+    except queue.Full:
+        for pdf_path in pdf_paths:
+            os.unlink(pdf_path)
+        response = jsonify({'error': 'Too many imports in progress, try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    return jsonify({
+        'message': f'Queued {len(files)} files for import',
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Reports an import job's status and per-stage progress.
+
+    rows_inserted only moves once the whole statement has been stored in a
+    single transaction; see ingest_jobs.PROGRESS_STAGES.
+    """
+    job = ingest_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+def transaction_to_dict(t):
+    # The *_cents fields are exact; amount and balance stay for existing clients
+    return {
+        'id': t[0],
+        'date': t[1],
+        'withdrawal_or_deposit': t[2],
+        'transaction_type': t[3],
+        'details': t[4],
+        'amount': t[5],
+        'balance': t[6],
+        'amount_cents': to_cents(t[5]),
+        'balance_cents': to_cents(t[6]),
+        'category': t[7],
+        'subcategory': t[8]
+    }
+
+def transaction_filters_from_request(args):
+    """Reads the transaction filter query parameters shared by the listing endpoints."""
+    return {
+        'date_from': args.get('date_from'),
+        'date_to': args.get('date_to'),
+        'category': args.get('category'),
+        'subcategory': args.get('subcategory'),
+        'withdrawal_or_deposit': args.get('type'),
+        'transaction_type': args.get('transaction_type'),
+        'min_amount': args.get('min_amount', type=float),
+        'max_amount': args.get('max_amount', type=float),
+    }
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def stream_transactions(batches, stream_format):
+    """Serializes transaction batches as they are read, one chunk per batch."""
+    if stream_format == 'ndjson':
+        for batch in batches:
+            yield ''.join(json.dumps(transaction_to_dict(t)) + '\n' for t in batch)
+        return
+
+    # A single JSON array written incrementally
+    yield '['
+    separator = ''
+    for batch in batches:
+        if not batch:
+            continue
+        yield separator + ','.join(json.dumps(transaction_to_dict(t)) for t in batch)
+        separator = ','
+    yield ']'
+
 @app.route('/api/transactions', methods=['GET'])
+@conditional_on_data
 def get_transactions():
-    transactions = db_handler.fetch_all_transactions()
-    return jsonify([
-        {
-            'id': t[0],
-            'date': t[1],
-            'withdrawal_or_deposit': t[2],
-            'transaction_type': t[3],
-            'details': t[4],
-            'amount': t[5],
-            'balance': t[6],
-            'category': t[7],
-            'subcategory': t[8]
-        } for t in transactions
-    ])
+    """Returns one page of transactions.
+
+    Query parameters: limit, after (cursor from the previous page), sort,
+    order (asc/desc) and the filters date_from, date_to, category,
+    subcategory, type, transaction_type, min_amount and max_amount.
+
+    With format=ndjson (or an Accept: application/x-ndjson header) or
+    format=json-stream, every matching row is streamed instead of a page.
+    """
+    stream_format = request.args.get('format')
+    if stream_format is None and 'application/x-ndjson' in request.headers.get('Accept', ''):
+        stream_format = 'ndjson'
+
+    if stream_format in ('ndjson', 'json-stream'):
+        try:
+            batches = db_handler.iter_transaction_batches(
+                sort=request.args.get('sort', 'date'),
+                descending=request.args.get('order', 'asc').lower() == 'desc',
+                filters=transaction_filters_from_request(request.args),
+                batch_size=STREAM_BATCH_SIZE
+            )
+            # Run the query now so bad parameters still get a 400
+            first_batch = next(batches, [])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        def all_batches():
+            yield first_batch
+            yield from batches
+
+        mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+        return Response(stream_with_context(stream_transactions(all_batches(), stream_format)), mimetype=mimetype)
+
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_PAGE_SIZE)
+
+    try:
+        transactions, next_cursor = db_handler.fetch_transactions(
+            limit=limit,
+            after=request.args.get('after'),
+            sort=request.args.get('sort', 'date'),
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            filters=transaction_filters_from_request(request.args)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'transactions': [transaction_to_dict(t) for t in transactions],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/search', methods=['GET'])
+@conditional_on_data
+def search_transactions():
+    """Full-text search over details and transaction type, best matches first.
+
+    Query parameters: q (words, "a phrase", or prefix*), limit and after
+    (cursor from the previous page).
+    """
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 100, type=int), 1), MAX_PAGE_SIZE)
+
+    try:
+        transactions, next_cursor = db_handler.search_transactions(
+            query, limit=limit, after=request.args.get('after')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'transactions': [transaction_to_dict(t) for t in transactions],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/summary', methods=['GET'])
+@conditional_on_data
+def get_summary():
+    """Monthly totals per category from the rollup table.
+
+    Query parameters: month_from and month_to (YYYY-MM), category,
+    subcategory, type (Withdrawal/Deposit) and group_by, a comma-separated
+    subset of month,category,subcategory,direction (default: all four).
+    """
+    filters = {
+        'month_from': request.args.get('month_from'),
+        'month_to': request.args.get('month_to'),
+        'category': request.args.get('category'),
+        'subcategory': request.args.get('subcategory'),
+        'direction': request.args.get('type'),
+    }
+    group_by = [column.strip() for column in request.args.get('group_by', 'month,category,subcategory,direction').split(',')]
+
+    try:
+        rows = db_handler.summary(filters, group_by)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify([dict(zip(row.keys(), row)) for row in rows])
 
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
-    from gui import CATEGORY_RULES  # Import here to avoid circular imports
-    return jsonify(list(CATEGORY_RULES.keys()))
+    """Lists category names; clients revalidate with If-None-Match and usually get a 304."""
+    registry = get_registry()
+    etag = registry.etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(list(registry.rules.keys()))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-@app.route('/api/set-category', methods=['POST'])
-def set_category():
-    data = request.json
-    if not data or 'transaction_id' not in data or 'category' not in data:
-        return jsonify({'error': 'Missing required fields'}), 400
-    
-    transaction_id = data['transaction_id']
+def category_from_request(data):
+    """Returns (category, subcategory); "Main -> Sub" category names are split."""
     category = data['category']
     subcategory = data.get('subcategory', category)
     
@@ -113,6 +401,16 @@ def set_category():
         main_category, subcategory = category.split(" -> ")
     else:
         main_category = category
+    return main_category, subcategory
+
+@app.route('/api/set-category', methods=['POST'])
+def set_category():
+    data = request.json
+    if not data or 'transaction_id' not in data or 'category' not in data:
+        return jsonify({'error': 'Missing required fields'}), 400
+    
+    transaction_id = data['transaction_id']
+    main_category, subcategory = category_from_request(data)
     
     try:
         db_handler.update_transaction_category(transaction_id, main_category, subcategory)
@@ -120,6 +418,48 @@ def set_category():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/bulk-set-category', methods=['POST'])
+def bulk_set_category():
+    """Sets one category on many transactions in a single statement.
+
+    JSON body: category (and optional subcategory) plus any of ids (a
+    non-empty list of ints), filters (the /api/transactions filter names)
+    and q (a search query, as for /api/search). Every given selector must
+    match.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'category' not in data:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    main_category, subcategory = category_from_request(data)
+    ids = data.get('ids')
+    # bool is an int subclass, but true/false are never ids
+    if ids is not None and (
+            not isinstance(ids, list) or not ids
+            or any(isinstance(i, bool) or not isinstance(i, int) for i in ids)):
+        return jsonify({'error': 'ids must be a non-empty list of integer transaction ids'}), 400
+    filters = data.get('filters')
+    if filters is not None and (
+            not isinstance(filters, dict)
+            or any(isinstance(value, (list, dict)) for value in filters.values())):
+        return jsonify({'error': 'filters must be an object of /api/transactions filter values'}), 400
+    if filters:
+        filters = dict(filters)
+        if 'type' in filters:
+            filters['withdrawal_or_deposit'] = filters.pop('type')
+    search = data.get('q')
+    if search is not None and not isinstance(search, str):
+        return jsonify({'error': 'q must be a search string'}), 400
+
+    try:
+        updated = db_handler.bulk_update_category(
+            main_category, subcategory, ids=ids, filters=filters, search=search
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'message': f'Updated {updated} transactions', 'updated': updated})
+
 @app.route('/api/add-category', methods=['POST'])
 def add_category():
     data = request.json
@@ -128,48 +468,54 @@ def add_category():
     
     new_category = data['category'].strip()
     
-    # Update CATEGORY_RULES (needs file modification for persistence)
-    from gui import CATEGORY_RULES
-    if new_category and new_category not in CATEGORY_RULES:
-        CATEGORY_RULES[new_category] = []
-        # Save updated categories to a JSON file for persistence
-        with open('categories.json', 'w') as f:
-            json.dump(CATEGORY_RULES, f)
+    # The registry saves categories.json and bumps the categories ETag
+    if new_category and parser.add_category(new_category):
         return jsonify({'message': f'Category {new_category} added successfully'})
     else:
         return jsonify({'error': 'Category already exists or is empty'}), 400
 
+EXPORT_COLUMNS = ['ID', 'Date', 'Withdrawal/Deposit', 'Transaction Type',
+                  'Details', 'Amount', 'Balance', 'Category', 'Subcategory']
+
+@app.route('/api/recategorize', methods=['POST'])
+def recategorize_transactions():
+    """Re-applies the current rules to rows categorized by older rules; manual choices are kept."""
+    data = request.get_json(silent=True) or {}
+    try:
+        summary = recategorize(parser, db_handler, include_unknown=bool(data.get('include_unknown')))
+        return jsonify(summary)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/export', methods=['GET'])
+@conditional_on_data
 def export_data():
-    import pandas as pd
-    
-    transactions = db_handler.fetch_all_transactions()
-    if not transactions:
+    """Streams every transaction as CSV straight from the database, without building a DataFrame."""
+    batches = db_handler.iter_transaction_batches(sort='id', batch_size=STREAM_BATCH_SIZE)
+    first_batch = next(batches, None)
+    if not first_batch:
         return jsonify({'error': 'No data to export'}), 404
-    
-    columns = ['ID', 'Date', 'Withdrawal/Deposit', 'Transaction Type', 
-               'Details', 'Amount', 'Balance', 'Category', 'Subcategory']
-    
-    df = pd.DataFrame(transactions, columns=columns)
-    
-    # Save to a temporary CSV file
-    temp_csv = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
-    df.to_csv(temp_csv.name, index=False)
-    temp_csv.close()
-    
-    # Return the CSV file
-    response = send_from_directory(os.path.dirname(temp_csv.name),
-                                  os.path.basename(temp_csv.name),
-                                  as_attachment=True,
-                                  download_name='transactions.csv')
-    
-    # Schedule the temporary file for deletion after response is sent
-    @response.call_on_close
-    def remove_file():
-        if os.path.exists(temp_csv.name):
-            os.unlink(temp_csv.name)
-    
-    return response
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in itertools.chain([first_batch], batches):
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=transactions.csv'}
+    )
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage timings and counters in the Prometheus text exposition format."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Serve React app
 @app.route('/', defaults={'path': ''})
@@ -181,4 +527,4 @@ def serve(path):
         return send_from_directory(app.static_folder, 'index.html')
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    init_app().run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""End-to-end throughput benchmark on synthetic statements.
+
+For each size a statement is generated (statement_generator.py) and
+written as a PDF, then every ingest stage is timed on it: extract, OCR,
+parse, categorize, insert, fetch and export. The rows are inserted a
+second time with the transactions table's triggers dropped (insert_bare),
+and triggers records the difference, so index and rollup upkeep shows up
+on its own. Results are written as JSON so runs on two commits can be
+compared:
+
+    python benchmark.py --output before.json
+    git checkout my-branch
+    python benchmark.py --output after.json --compare before.json
+
+With --compare the run exits non-zero when a stage got slower than
+--max-slowdown allows. Extract is skipped without pdfplumber and OCR
+without pytesseract and the tesseract binary; parsing then runs on the
+generated page text instead.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from statement_generator import generate_statement, page_texts, write_pdf_statement
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+STAGES = ('extract', 'ocr', 'parse', 'categorize', 'insert', 'insert_bare', 'triggers', 'fetch', 'export')
+
+FETCH_PAGE_SIZE = 500
+
+
+def timed(results, stage, unit, function, *args):
+    """Run function(*args), record its wall time under stage and return its value."""
+    start = time.perf_counter()
+    value = function(*args)
+    results[stage] = {'seconds': round(time.perf_counter() - start, 4), 'unit': unit}
+    return value
+
+
+def record_count(results, stage, count):
+    seconds = results[stage]['seconds']
+    results[stage]['count'] = count
+    results[stage]['per_second'] = round(count / seconds, 1) if seconds else None
+
+
+def missing_ocr_dependency():
+    if importlib.util.find_spec('pytesseract') is None:
+        return 'pytesseract is not installed'
+    if shutil.which('tesseract') is None:
+        return 'the tesseract binary is not on PATH'
+    return None
+
+
+def fetch_everything(db_handler):
+    rows = 0
+    cursor = None
+    while True:
+        page, cursor = db_handler.fetch_transactions(limit=FETCH_PAGE_SIZE, after=cursor)
+        rows += len(page)
+        if cursor is None:
+            return rows
+
+
+def drop_triggers(db_handler):
+    with db_handler.pool.writer() as conn:
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'transactions'"
+        )]
+        for name in names:
+            conn.execute(f'DROP TRIGGER {name}')
+        conn.commit()
+
+
+def benchmark_size(size, directory, workers, seed, ocr_pages):
+    """Time every stage for one statement size; returns {stage: result}."""
+    from database_handler import DatabaseHandler
+    from duckle_parser import BankStatementParser, ocr_page
+    from main import run_export
+    from transaction import TransactionBatch
+
+    results = {}
+    pages = timed(results, 'generate', 'rows', generate_statement, size, seed)
+    record_count(results, 'generate', size)
+
+    pdf_path = os.path.join(directory, f'statement-{size}.pdf')
+    write_pdf_statement(pdf_path, pages)
+    results['generate']['pdf_bytes'] = os.path.getsize(pdf_path)
+
+    parser = BankStatementParser(workers=workers, use_cache=False)
+    rules_version, rules = parser.rules_snapshot()
+    try:
+        if importlib.util.find_spec('pdfplumber') is None:
+            results['extract'] = {'skipped': 'pdfplumber is not installed'}
+            texts = page_texts(pages)
+        else:
+            # Every page has a text layer, so this never hands pages to OCR
+            texts = timed(results, 'extract', 'pages', lambda: list(parser.iter_pdf_page_texts(pdf_path)))
+            record_count(results, 'extract', len(texts))
+
+        skipped = missing_ocr_dependency()
+        if skipped:
+            results['ocr'] = {'skipped': skipped}
+        else:
+            # OCR is orders of magnitude slower, so only a sample of pages is rasterized
+            sample = range(min(ocr_pages, len(pages)))
+            timed(results, 'ocr', 'pages', lambda: [ocr_page(pdf_path, number) for number in sample])
+            record_count(results, 'ocr', len(sample))
+
+        # Parsing categorizes each row as it goes, as imports do
+        transactions = timed(results, 'parse', 'rows',
+                             lambda: TransactionBatch(parser.iter_transactions(texts)))
+        record_count(results, 'parse', len(transactions))
+        results['parse']['complete'] = len(transactions) == size
+
+        timed(results, 'categorize', 'rows', parser.categorize_batch, transactions)
+        record_count(results, 'categorize', len(transactions))
+    finally:
+        parser.extractor.close()
+
+    db_handler = DatabaseHandler(os.path.join(directory, f'benchmark-{size}.db'))
+    try:
+        db_handler.create_tables()
+        inserted = timed(results, 'insert', 'rows', db_handler.insert_transactions,
+                         transactions, rules_version, rules)
+        record_count(results, 'insert', inserted['inserted'])
+
+        fetched = timed(results, 'fetch', 'rows', fetch_everything, db_handler)
+        record_count(results, 'fetch', fetched)
+
+        timed(results, 'export', 'rows', run_export, os.path.join(directory, f'export-{size}.csv'), db_handler)
+        record_count(results, 'export', fetched)
+    finally:
+        db_handler.close()
+
+    # The same insert without search index, rollup and change counter triggers
+    bare_handler = DatabaseHandler(os.path.join(directory, f'benchmark-{size}-bare.db'))
+    try:
+        bare_handler.create_tables()
+        drop_triggers(bare_handler)
+        inserted = timed(results, 'insert_bare', 'rows', bare_handler.insert_transactions,
+                         transactions, rules_version, rules)
+        record_count(results, 'insert_bare', inserted['inserted'])
+    finally:
+        bare_handler.close()
+
+    results['triggers'] = {
+        'seconds': round(max(results['insert']['seconds'] - results['insert_bare']['seconds'], 0), 4),
+        'unit': 'rows',
+    }
+    record_count(results, 'triggers', results['insert']['count'])
+    results['triggers']['share_of_insert'] = (
+        round(results['triggers']['seconds'] / results['insert']['seconds'], 3)
+        if results['insert']['seconds'] else None
+    )
+    return results
+
+
+def git_commit():
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=here, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, max_slowdown, min_seconds):
+    """Print each stage's change against a baseline report; return True if any regressed."""
+    regressed = False
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    for size, stages in report['results'].items():
+        for stage in ('generate',) + STAGES:
+            result = stages.get(stage, {})
+            before = baseline.get('results', {}).get(size, {}).get(stage, {})
+            if 'seconds' not in result or 'seconds' not in before:
+                continue
+            change = (result['seconds'] - before['seconds']) / before['seconds'] if before['seconds'] else 0
+            # Stages this short are mostly noise
+            slower = change > max_slowdown and result['seconds'] >= min_seconds
+            regressed = regressed or slower
+            print(f"{'SLOWER' if slower else '':<8}{size:>8} {stage:<11} "
+                  f"{before['seconds']:9.3f}s -> {result['seconds']:9.3f}s ({change:+.0%})")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every ingest stage on synthetic statements')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Transactions per statement (default: 1000 10000 100000)')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='Where to write the JSON results (default: benchmark_results.json)')
+    parser.add_argument('--compare', metavar='JSON', help='Earlier results to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=0.2,
+                        help='With --compare, fail when a stage is this fraction slower (default: 0.2)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Ignore slowdowns in stages faster than this (default: 0.05)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Extraction worker processes (default: one per core)')
+    parser.add_argument('--ocr-pages', type=int, default=3,
+                        help='Pages to OCR per size when tesseract is available (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the statements (default: 0)')
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'workers': args.workers,
+        'seed': args.seed,
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='duckle-benchmark-') as directory:
+        for size in args.sizes:
+            print(f"Benchmarking {size} transactions...")
+            results = benchmark_size(size, directory, args.workers, args.seed, args.ocr_pages)
+            report['results'][str(size)] = results
+
+    print(f"\n{'rows':>8} {'stage':<11} {'seconds':>9} {'per second':>12}")
+    for size, stages in report['results'].items():
+        for stage in ('generate',) + STAGES:
+            result = stages.get(stage, {})
+            if 'skipped' in result:
+                print(f"{size:>8} {stage:<11} {'skipped':>9}  {result['skipped']}")
+            elif result:
+                print(f"{size:>8} {stage:<11} {result['seconds']:9.3f} "
+                      f"{result.get('per_second') or 0:>12,.0f} {result['unit']}/s")
+        if not stages['parse'].get('complete'):
+            print(f"WARNING: parsed {stages['parse']['count']} of {size} transactions")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.max_slowdown, args.min_seconds):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Single source of category keyword rules for the parser, the GUIs and the API.
+
+Rules are loaded once per process (the built-in defaults, then
+categories.json merged after them) and kept in memory. Every change bumps
+the registry version and is written back atomically, so readers can use
+the version to skip work when nothing changed and a crash mid-save never
+leaves a truncated file behind.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_FILE = 'categories.json'
+
+# Built-in rules in priority order; an earlier category wins when several match.
+# A "Main -> Sub" rule sets both category and subcategory, so each one sits
+# before its main category to win over the broader keywords there.
+DEFAULT_RULES = {
+    "Income": ["Payroll", "Deposit", "Best Buy Stores"],
+    "Grocery": ["Walmart", "Kroger", "Dollar-General", "Aldi", "Meijer"],
+    "Entertainment -> Meals": ["McDonalds", "Wendys", "Taco Bell", "Dominos", "Doordash"],
+    "Entertainment": ["Netflix", "Spotify", "Hulu", "Disney", "Steam", "GameStop"],
+    "Debt -> Credit Card": ["Credit Card", "Discover", "Merrick Bank", "Best Egg"],
+    "Debt": ["Loan Payment"],
+    "Utilities": ["Columbia Gas", "Toledo Edison", "Electric", "Water", "Verizon", "AT&T"],
+    "Mortgage": ["Us Bank Home Mtg", "Home Mtg", "Mortgage"],
+    "Insurance": ["State Farm", "Geico", "Allstate", "Progressive"],
+    "Home -> Home Improvement": ["Home Depot", "Lowe's", "Lowes", "Menards"],
+    "Home": [],
+    "Gas": ["Speedway", "Circle K", "Sheetz", "Shell", "BP"],
+    # Gas purchases under $30 get this subcategory from the parser; listed so it can be picked by hand
+    "Snacks": [],
+}
+
+
+class CategoryRegistry:
+    """In-memory category rules with a change counter and atomic persistence.
+
+    Changes never mutate the published dict; they build a new one and swap
+    it in, so a reader holding `rules` always sees a consistent set.
+    """
+
+    def __init__(self, path=CATEGORY_FILE, defaults=DEFAULT_RULES):
+        self.path = path
+        self.version = 0
+        self._rules = {category: list(keywords) for category, keywords in defaults.items()}
+        self._fingerprint = None
+        self._lock = threading.RLock()
+        self.load(path)
+
+    @property
+    def rules(self):
+        """The current {category: [keywords]} rules. Read-only; change them through this class."""
+        return self._rules
+
+    def snapshot(self):
+        """Return (version, rules) read together."""
+        with self._lock:
+            return self.version, self._rules
+
+    def fingerprint(self):
+        """Short content hash of the rules in priority order; stable across restarts."""
+        with self._lock:
+            if self._fingerprint is None:
+                rules = json.dumps(list(self._rules.items()))
+                self._fingerprint = hashlib.sha256(rules.encode()).hexdigest()[:16]
+            return self._fingerprint
+
+    def stamp(self):
+        """Return (fingerprint, rules) read together, for recording which rules categorized a row."""
+        with self._lock:
+            return self.fingerprint(), self._rules
+
+    def etag(self):
+        return f"{self.version}-{self.fingerprint()}"
+
+    def _publish(self, rules, save=True):
+        # Caller holds the lock
+        self._rules = rules
+        self._fingerprint = None
+        self.version += 1
+        if save:
+            self.save()
+
+    def load(self, path=CATEGORY_FILE):
+        """Merge keyword rules saved in a JSON file after the current rules."""
+        if not os.path.exists(path):
+            return
+
+        try:
+            with open(path) as f:
+                saved_rules = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load %s: %s", path, e)
+            return
+
+        with self._lock:
+            rules = {category: list(keywords) for category, keywords in self._rules.items()}
+            for category, keywords in saved_rules.items():
+                existing = rules.setdefault(category, [])
+                existing.extend(keyword for keyword in keywords if keyword not in existing)
+            if rules != self._rules:
+                self._publish(rules, save=False)
+
+    def add_category(self, category, keywords=()):
+        """Add a category, or extra keywords for one. Returns False when nothing changed."""
+        with self._lock:
+            existing = self._rules.get(category)
+            new_keywords = [keyword for keyword in keywords if keyword not in (existing or [])]
+            if existing is not None and not new_keywords:
+                return False
+
+            rules = dict(self._rules)
+            rules[category] = (existing or []) + new_keywords
+            self._publish(rules)
+            return True
+
+    def replace(self, rules):
+        """Swap in a whole new rule set."""
+        with self._lock:
+            self._publish({category: list(keywords) for category, keywords in rules.items()})
+
+    def changed(self):
+        """Record an in-place edit of `rules` made outside this class, and persist it."""
+        with self._lock:
+            self._publish(self._rules)
+
+    def save(self):
+        """Write the rules to a temporary file and rename it over the real one."""
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.categories-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._rules, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry, loading categories.json on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CategoryRegistry()
+        return _registry
@@ -0,0 +1,188 @@
+"""Bounded pool of SQLite connections shared by every thread of the process.
+
+SQLite allows any number of concurrent readers under WAL but only one
+writer, so the pool hands out a fixed number of read-only connections and
+a single writer connection guarded by a lock. Writers queue on the lock
+instead of racing each other into "database is locked", and a burst of
+requests can never open more than `readers` + 1 connections.
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from instrumentation import observe
+
+DEFAULT_READERS = 8
+
+# Applied to every connection; busy_timeout is in milliseconds
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,       # 64 MiB page cache per connection
+    'mmap_size': 268435456,     # Map up to 256 MiB of the file instead of copying pages
+    'temp_store': 'MEMORY',
+}
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no connection frees up within the pool's timeout."""
+
+
+class _Waiter:
+    """A thread queued for a read connection; release() hands one over directly."""
+    __slots__ = ('ready', 'conn')
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.conn = None
+
+
+class ConnectionPool:
+    """One writer connection and up to `readers` read-only connections to one database.
+
+    Connections are opened on first use and may move between threads
+    (only one thread uses a connection at a time). Borrow them with
+    `with pool.reader() as conn:` or `with pool.writer() as conn:`; a
+    reader is returned to the pool even if the block raises. Threads
+    waiting for a reader are served first come, first served.
+    """
+
+    def __init__(self, db_name, readers=DEFAULT_READERS, timeout=30.0, pragmas=None):
+        self.db_name = db_name
+        self.readers = max(1, readers)
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS, **(pragmas or {}))
+        self._idle = []  # Stack, so the most recently used connection (warmest cache) goes out first
+        self._waiters = deque()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._writer_depth = 0  # Only touched by the thread holding _writer_lock
+        self._closed = False
+
+    def _connect(self, read_only):
+        conn = sqlite3.connect(
+            self.db_name, timeout=self.pragmas['busy_timeout'] / 1000, check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        if not read_only:
+            # Persistent in the file, so only the writer needs to set it
+            conn.execute('PRAGMA journal_mode=WAL')
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        if read_only:
+            conn.execute('PRAGMA query_only=ON')
+        return conn
+
+    def _acquire_reader(self):
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            # Idle connections only exist while nobody is queued; release() hands them over
+            if self._idle:
+                return self._idle.pop()
+            opening = self._opened < self.readers
+            if opening:
+                self._opened += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if opening:
+            try:
+                return self._connect(read_only=True)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        if not waiter.ready.wait(self.timeout):
+            with self._lock:
+                # A release may have handed a connection over just as the wait ran out
+                if not waiter.ready.is_set():
+                    self._waiters.remove(waiter)
+                    raise PoolTimeout(
+                        f"No read connection to {self.db_name} freed up within {self.timeout}s"
+                    )
+        if waiter.conn is None:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        return waiter.conn
+
+    def _release_reader(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if self._closed:
+                self._opened -= 1
+                conn.close()
+            elif self._waiters:
+                # Straight to the longest waiter, so a thread that just released
+                # can't take the connection back ahead of the queue
+                waiter = self._waiters.popleft()
+                waiter.conn = conn
+                waiter.ready.set()
+            else:
+                self._idle.append(conn)
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection, waiting up to timeout for one to free up."""
+        start = time.perf_counter()
+        conn = self._acquire_reader()
+        observe('stage_seconds', time.perf_counter() - start, stage='db_reader_wait')
+        try:
+            yield conn
+        finally:
+            self._release_reader(conn)
+
+    @contextmanager
+    def writer(self):
+        """Borrow the writer connection; other writers wait until the block ends.
+
+        Re-entrant within a thread. Uncommitted changes are rolled back
+        when the block exits, so one caller can't leave a transaction open
+        for the next.
+        """
+        start = time.perf_counter()
+        if not self._writer_lock.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"The writer connection to {self.db_name} stayed busy for {self.timeout}s")
+        observe('stage_seconds', time.perf_counter() - start, stage='db_writer_wait')
+        self._writer_depth += 1
+        try:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            if self._writer is None:
+                self._writer = self._connect(read_only=False)
+            yield self._writer
+        finally:
+            self._writer_depth -= 1
+            try:
+                if self._writer_depth == 0 and self._writer is not None and self._writer.in_transaction:
+                    self._writer.rollback()
+            finally:
+                self._writer_lock.release()
+
+    def stats(self):
+        """Return how many read connections are open and idle, and how many threads wait for one."""
+        with self._lock:
+            return {
+                'readers_open': self._opened, 'readers_idle': len(self._idle),
+                'readers_waiting': len(self._waiters), 'max_readers': self.readers,
+            }
+
+    def close(self):
+        """Close every idle connection; readers still borrowed are closed when returned."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._opened -= 1
+            # Waiters wake up without a connection and raise
+            while self._waiters:
+                self._waiters.popleft().ready.set()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -1,86 +1,649 @@
-import sqlite3
+import base64
+import hashlib
+import json
+import logging
+import re
 import threading
+import time
+from connection_pool import DEFAULT_READERS, ConnectionPool
+from instrumentation import increment, timed
+from migrations import SCHEMA_VERSION, migrate
+from transaction import Transaction, TransactionBatch, format_cents, to_cents
+
+logger = logging.getLogger(__name__)
+
+NON_ALPHANUMERIC_PATTERN = re.compile(r'[^a-z0-9]+')
+SEARCH_TERM_PATTERN = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+WORD_PATTERN = re.compile(r'\w+')
+
+# Ranking scores every candidate, so only this many of the newest matches
+# are ranked (older ones follow newest first); that keeps searches for very
+# common words in single-digit ms
+SEARCH_RANK_WINDOW = 1000
+
+# Past this many index terms an OR over them is slower than scanning the
+# rows with LIKE, so recategorizing falls back to the scan
+MAX_KEYWORD_TERMS = 256
+
+INSERT_TRANSACTION_SQL = '''
+    INSERT OR IGNORE INTO transactions (
+        date, withdrawal_or_deposit, transaction_type,
+        details, amount, balance, category, subcategory, dedup_key,
+        category_source, rules_version
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'rule', ?)
+'''
+
+TRANSACTION_COLUMNS = (
+    'id, date, withdrawal_or_deposit, transaction_type, '
+    'details, amount, balance, category, subcategory'
+)
+
+
+# Every one has a single-column index, which SQLite keys on (column, rowid),
+# so ORDER BY column, id walks the index; add one with any new column
+SORTABLE_COLUMNS = (
+    'id', 'date', 'withdrawal_or_deposit', 'transaction_type',
+    'details', 'amount', 'balance', 'category', 'subcategory'
+)
+
+# Filter name -> SQL condition; every column referenced here is indexed or
+# cheap to check once an indexed range has narrowed the scan
+TRANSACTION_FILTERS = {
+    'date_from': 'date >= ?',
+    'date_to': 'date <= ?',
+    'category': 'category = ?',
+    'subcategory': 'subcategory = ?',
+    'withdrawal_or_deposit': 'withdrawal_or_deposit = ?',
+    'transaction_type': 'transaction_type = ?',
+    'min_amount': 'amount >= ?',
+    'max_amount': 'amount <= ?',
+}
+
+
+# Rollup key columns, and the filters summary() accepts on them
+SUMMARY_DIMENSIONS = ('month', 'category', 'subcategory', 'direction')
+
+SUMMARY_FILTERS = {
+    'month_from': 'month >= ?',
+    'month_to': 'month <= ?',
+    'category': 'category = ?',
+    'subcategory': 'subcategory = ?',
+    'direction': 'direction = ?',
+}
+
+
+def transaction_filter_sql(filters, available=TRANSACTION_FILTERS):
+    """Turns a dict of filter values (TRANSACTION_FILTERS by default) into SQL conditions and parameters."""
+    conditions = []
+    params = []
+    for name, value in (filters or {}).items():
+        if name not in available:
+            raise ValueError(f"Unknown filter: {name}")
+        if value is None:
+            continue
+        conditions.append(available[name])
+        params.append(value)
+    return conditions, params
+
+
+def encode_cursor(sort_value, transaction_id):
+    """Packs the last row's sort key into an opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps([sort_value, transaction_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    return sort_value, transaction_id
+
+
+def keyset_ranges(sort, descending, after):
+    """Returns the (condition, params) index ranges a page after the cursor reads, in order.
+
+    SQLite sorts NULLs first, and comparisons with NULL are never true, so
+    a plain (sort, id) > (?, ?) seek would skip every NULL after a NULL
+    cursor. The NULL and non-NULL blocks are therefore read as separate
+    ranges, each still a seek on the (sort, id) index.
+    """
+    if not after:
+        return [('', [])]
+    sort_value, last_id = decode_cursor(after)
+    comparison = '<' if descending else '>'
+    if sort == 'id':
+        return [(f'id {comparison} ?', [last_id])]
+
+    if sort_value is None:
+        nulls = (f'{sort} IS NULL AND id {comparison} ?', [last_id])
+        # Ascending, the non-NULL values all follow; descending, nothing does
+        return [nulls] if descending else [nulls, (f'{sort} IS NOT NULL', [])]
+
+    values = (f'({sort}, id) {comparison} (?, ?)', [sort_value, last_id])
+    return [values, (f'{sort} IS NULL', [])] if descending else [values]
+
+
+def transaction_key(date, amount, balance, details):
+    """Natural key identifying a statement line across re-imports.
+
+    The running balance tells apart identical purchases on the same day;
+    details are compared case- and punctuation-insensitively.
+    """
+    return cents_transaction_key(date, to_cents(amount), to_cents(balance), details)
+
+
+def cents_transaction_key(date, amount_cents, balance_cents, details):
+    """transaction_key() for amounts already in cents."""
+    normalized_details = NON_ALPHANUMERIC_PATTERN.sub('', details.lower())
+    details_hash = hashlib.sha1(normalized_details.encode()).hexdigest()[:16]
+    # Rows stored before amounts were always parsed can hold NULL, which formats as ''
+    return f"{date}|{format_cents(amount_cents)}|{format_cents(balance_cents)}|{details_hash}"
+
+
+def with_key(transaction):
+    """Returns the database row of a Transaction (or old-style tuple) with its dedup key appended."""
+    if not isinstance(transaction, Transaction):
+        # Old-style tuples go in as given, NULLs included
+        date, _, _, details, amount, balance = transaction[:6]
+        return tuple(transaction) + (transaction_key(date, amount, balance, details),)
+    row = transaction.as_row()
+    return row + (cents_transaction_key(row[0], transaction.amount_cents, transaction.balance_cents, row[3]),)
+
+
+def keyed_rows(transactions):
+    """Yields with_key() rows for Transactions, old-style tuples or a TransactionBatch.
+
+    A batch's rows are read straight off its columns; no per-row
+    Transaction is built and nothing is copied into a list.
+    """
+    if not isinstance(transactions, TransactionBatch):
+        for transaction in transactions:
+            yield with_key(transaction)
+        return
+
+    for row, amount_cents, balance_cents in zip(
+        transactions.iter_rows(), transactions.amounts_cents, transactions.balances_cents
+    ):
+        yield row + (cents_transaction_key(row[0], amount_cents, balance_cents, row[3]),)
+
+
+def fts_query(text):
+    """Turns a user search string into a safe FTS5 MATCH expression.
+
+    Every term must match; "quoted words" match as a phrase and a trailing
+    * (word* or "two words"*) makes the last word a prefix. Punctuation is
+    dropped, so user input can never be a query syntax error.
+    """
+    terms = []
+    for phrase, phrase_star, word in SEARCH_TERM_PATTERN.findall(text):
+        tokens = WORD_PATTERN.findall(phrase or word)
+        if not tokens:
+            continue
+        term = '"' + ' '.join(tokens) + '"'
+        if phrase_star or word.endswith('*'):
+            term += '*'
+        terms.append(term)
+    if not terms:
+        raise ValueError("Search query has no words")
+    return ' '.join(terms)
+
+
+def like_pattern(keyword):
+    """Escapes a keyword for a case-insensitive substring LIKE ... ESCAPE '\\'."""
+    escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def rule_source_sql(include_unknown):
+    # Manual categories are never touched; unknown (pre-provenance) rows only on request
+    if include_unknown:
+        return "category_source IS NOT 'manual'"
+    return "category_source = 'rule'"
 
 class DatabaseHandler:
+    """All transaction storage, over a shared ConnectionPool.
+
+    Reads borrow one of `readers` read-only connections and writes go
+    through the pool's single writer connection, so any number of threads
+    can share one handler. The pool is opened on first use; set db_name
+    before that.
+    """
     _instance = None
     _lock = threading.Lock()
-    _local = threading.local()
 
-    def __init__(self):
-        self.db_name = 'transactions.db'
+    def __init__(self, db_name='transactions.db', readers=DEFAULT_READERS):
+        self.db_name = db_name
+        self.readers = readers
+        self._pool = None
 
-    def get_connection(self):
-        # Create a new connection if one doesn't exist for this thread
-        if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(self.db_name)
-            self._local.connection.row_factory = sqlite3.Row
-        return self._local.connection
-
-    def get_cursor(self):
-        return self.get_connection().cursor()
-
-    def create_tables(self):
+    @property
+    def pool(self):
         with self._lock:
-            try:
-                conn = sqlite3.connect(self.db_name)
-                cursor = conn.cursor()
-
-                print(f"Creating transactions table in {self.db_name}")
+            if self._pool is None:
+                self._pool = ConnectionPool(self.db_name, readers=self.readers)
+            return self._pool
 
-                cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    date TEXT,
-                    withdrawal_or_deposit TEXT,
-                    transaction_type TEXT,
-                    details TEXT,
-                    amount REAL,
-                    balance REAL,
-                    category TEXT,
-                    subcategory TEXT
-                )
-            ''')
+    def create_tables(self):
+        """Creates the schema or upgrades an existing database to the latest version."""
+        try:
+            with self.pool.writer() as conn:
+                logger.info("Migrating %s to schema version %d", self.db_name, SCHEMA_VERSION)
+                migrate(conn)
 
                 # Verify the table was created
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'")
+                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='transactions'")
                 if cursor.fetchone():
-                    print("Successfully created transactions table")
+                    logger.debug("Transactions table is ready")
                 else:
-                    print("Failed to create transactions table!")
-
-                conn.commit()
-                conn.close()
-                print("Database connection closed")
-
-            except Exception as e:
-                print(f"Error creating tables: {str(e)}")
-                raise
-
-    def insert_transaction(self, transaction):
-        cursor = self.get_cursor()
-        cursor.execute('''
-            INSERT INTO transactions (
-                date, withdrawal_or_deposit, transaction_type,
-                details, amount, balance, category, subcategory
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', transaction)
-        self.get_connection().commit()
+                    logger.error("Failed to create transactions table")
+
+        except Exception as e:
+            logger.error("Error creating tables: %s", e)
+            raise
+
+    def insert_transaction(self, transaction, rules_version=None):
+        """Inserts a single transaction unless it was already imported."""
+        with timed('db_insert'), self.pool.writer() as conn:
+            cursor = conn.execute(INSERT_TRANSACTION_SQL, with_key(transaction) + (rules_version,))
+            conn.commit()
+        increment('rows_written_total', cursor.rowcount, operation='insert')
+
+    def insert_transactions(self, transactions, rules_version=None, rules=None):
+        """Inserts many transactions in one database transaction, skipping ones already stored.
+
+        transactions may be Transactions, old-style tuples or a
+        TransactionBatch, which is inserted straight from its columns.
+        Returns a dict with the new row ids and how many rows were inserted
+        or skipped as duplicates.
+        """
+        return self.insert_transaction_groups([transactions], rules_version, rules)[0]
+
+    def insert_transaction_groups(self, groups, rules_version=None, rules=None):
+        """Inserts several batches (e.g. one per statement) in a single database transaction.
+
+        rules_version is the fingerprint of the category rules the rows were
+        categorized with; pass the rules too so a later recategorization can
+        tell which rows a rule change affects.
+
+        Returns one insert_transactions()-style result per group. Rows that
+        repeat an earlier group count as duplicates of the group they're in.
+        """
+        results = []
+
+        # Commits once at the end, or rolls back on error
+        with timed('db_insert'), self.pool.writer() as conn, conn:
+            # Take the write lock up front so every id above last_id is ours
+            conn.execute('BEGIN IMMEDIATE')
+            if rules_version and rules is not None:
+                self._save_rules_version(conn, rules_version, rules)
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+
+            for transactions in groups:
+                count = 0
+
+                def rows():
+                    nonlocal count
+                    for row in keyed_rows(transactions):
+                        count += 1
+                        yield row + (rules_version,)
+
+                # rowcount, unlike total_changes, leaves out rows the triggers write
+                inserted = conn.executemany(INSERT_TRANSACTION_SQL, rows()).rowcount
+                ids = [
+                    row[0] for row in
+                    conn.execute('SELECT id FROM transactions WHERE id > ? ORDER BY id', (last_id,))
+                ]
+                if ids:
+                    last_id = ids[-1]
+                results.append({'ids': ids, 'inserted': inserted, 'duplicates': count - inserted})
+
+        increment('rows_written_total', sum(result['inserted'] for result in results), operation='insert')
+        increment('rows_duplicate_total', sum(result['duplicates'] for result in results))
+        return results
 
     def fetch_all_transactions(self):
-        cursor = self.get_cursor()
-        cursor.execute('SELECT * FROM transactions')
-        return cursor.fetchall()
+        with self.pool.reader() as conn:
+            return conn.execute(f'SELECT {TRANSACTION_COLUMNS} FROM transactions').fetchall()
+
+    def fetch_transactions(self, limit=100, after=None, sort='date', descending=False, filters=None):
+        """Returns one keyset-paginated page of transactions and the cursor for the next page.
+
+        Rows are ordered by the sort column with id as a tie-breaker, and
+        the next page starts strictly after the (sort value, id) pair in
+        the cursor, so every page is an index range scan no matter how deep.
+        The cursor is None on the last page.
+        """
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+
+        filter_conditions, filter_params = transaction_filter_sql(filters)
+        direction = 'DESC' if descending else 'ASC'
+        order_by = f'id {direction}' if sort == 'id' else f'{sort} {direction}, id {direction}'
+
+        rows = []
+        with self.pool.reader() as conn:
+            for condition, condition_params in keyset_ranges(sort, descending, after):
+                conditions = filter_conditions + ([condition] if condition else [])
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+                rows += conn.execute(f'''
+                    SELECT {TRANSACTION_COLUMNS} FROM transactions
+                    {where}
+                    ORDER BY {order_by}
+                    LIMIT ?
+                ''', filter_params + condition_params + [limit + 1 - len(rows)]).fetchall()
+                if len(rows) > limit:
+                    break
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][sort], rows[-1]['id'])
+        return rows, next_cursor
+
+    def iter_transaction_batches(self, sort='date', descending=False, filters=None, batch_size=500):
+        """Yields every matching transaction in sorted batches straight off the SQLite cursor.
+
+        Only one batch is held in memory at a time, so full-history exports
+        run in constant memory. A read connection stays borrowed until the
+        generator is exhausted or closed.
+        """
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+
+        conditions, params = transaction_filter_sql(filters)
+        direction = 'DESC' if descending else 'ASC'
+        order_by = f'id {direction}' if sort == 'id' else f'{sort} {direction}, id {direction}'
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        with self.pool.reader() as conn:
+            cursor = conn.execute(f'''
+                SELECT {TRANSACTION_COLUMNS} FROM transactions
+                {where}
+                ORDER BY {order_by}
+            ''', params)
+            try:
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                cursor.close()
+
+    def search_transactions(self, query, limit=100, after=None):
+        """Full-text searches details and transaction type; returns (rows, next_cursor).
+
+        The SEARCH_RANK_WINDOW most recent matches come first, best match
+        first (bm25, ties by id); any older matches follow, newest first.
+        Pages continue with the cursor like fetch_transactions(); it is
+        None on the last page.
+        """
+        match = fts_query(query)
+        columns = ', '.join(f't.{column.strip()}' for column in TRANSACTION_COLUMNS.split(','))
+        score, last_id = decode_cursor(after) if after else (None, None)
+
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+
+            rows = []
+            if after is None or score is not None:
+                keyset = ''
+                params = [match, SEARCH_RANK_WINDOW]
+                if after is not None:
+                    keyset = 'WHERE (m.score, m.match_id) > (?, ?)'
+                    params.extend([score, last_id])
+
+                cursor.execute(f'''
+                    SELECT {columns}, m.score FROM (
+                        SELECT rowid AS match_id, rank AS score FROM transactions_fts
+                        WHERE transactions_fts MATCH ?
+                        ORDER BY rowid DESC
+                        LIMIT ?
+                    ) AS m
+                    JOIN transactions AS t ON t.id = m.match_id
+                    {keyset}
+                    ORDER BY m.score, m.match_id
+                    LIMIT ?
+                ''', params + [limit + 1])
+                rows = [tuple(row) for row in cursor.fetchall()]
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    return [row[:-1] for row in rows], encode_cursor(rows[-1][-1], rows[-1][0])
+
+                # The ranked window is used up; matches older than it come next
+                cursor.execute('''
+                    SELECT MIN(match_id), COUNT(*) FROM (
+                        SELECT rowid AS match_id FROM transactions_fts
+                        WHERE transactions_fts MATCH ?
+                        ORDER BY rowid DESC
+                        LIMIT ?
+                    )
+                ''', (match, SEARCH_RANK_WINDOW))
+                last_id, window_size = cursor.fetchone()
+                rows = [row[:-1] for row in rows]
+                if window_size < SEARCH_RANK_WINDOW:
+                    return rows, None
+
+            cursor.execute(f'''
+                SELECT {columns} FROM transactions_fts AS f
+                JOIN transactions AS t ON t.id = f.rowid
+                WHERE transactions_fts MATCH ? AND f.rowid < ?
+                ORDER BY f.rowid DESC
+                LIMIT ?
+            ''', (match, last_id, limit - len(rows) + 1))
+            older_rows = [tuple(row) for row in cursor.fetchall()]
+
+            next_cursor = None
+            if len(rows) + len(older_rows) > limit:
+                older_rows = older_rows[:limit - len(rows)]
+                next_cursor = encode_cursor(None, older_rows[-1][0] if older_rows else last_id)
+            return rows + older_rows, next_cursor
+
+    def summary(self, filters=None, group_by=SUMMARY_DIMENSIONS):
+        """Returns monthly rollup rows: the group_by columns, then total, count, min_amount, max_amount.
+
+        Reads only the rollup table, so it costs O(months x categories) no
+        matter how many transactions are stored. Grouping by fewer
+        dimensions (e.g. month and category) merges the finer rollups.
+        """
+        group_by = list(group_by)
+        if not group_by or any(column not in SUMMARY_DIMENSIONS for column in group_by):
+            raise ValueError(f"Can only group by {', '.join(SUMMARY_DIMENSIONS)}")
+
+        conditions, params = transaction_filter_sql(filters, SUMMARY_FILTERS)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        columns = ', '.join(group_by)
+
+        with self.pool.reader() as conn:
+            return conn.execute(f'''
+                SELECT {columns}, ROUND(SUM(total), 2) AS total, SUM(count) AS count,
+                       MIN(min_amount) AS min_amount, MAX(max_amount) AS max_amount
+                FROM monthly_rollups
+                {where}
+                GROUP BY {columns}
+                ORDER BY {columns}
+            ''', params).fetchall()
+
+    def data_version(self):
+        """Returns (version, modified unix time) of the transactions table; both move on every change."""
+        with self.pool.reader() as conn:
+            row = conn.execute(
+                "SELECT version, modified FROM change_counters WHERE name = 'transactions'"
+            ).fetchone()
+        return row[0], row[1]
 
     def update_transaction_category(self, transaction_id, category, subcategory):
-        cursor = self.get_cursor()
-        cursor.execute('''
-            UPDATE transactions 
-            SET category = ?, subcategory = ?
-            WHERE id = ?
-        ''', (category, subcategory, transaction_id))
-        self.get_connection().commit()
+        """Sets a category by hand; recategorization never overrides it."""
+        with timed('db_update'), self.pool.writer() as conn, conn:
+            cursor = conn.execute('''
+                UPDATE transactions 
+                SET category = ?, subcategory = ?, category_source = 'manual'
+                WHERE id = ?
+            ''', (category, subcategory, transaction_id))
+        increment('rows_written_total', cursor.rowcount, operation='update')
+
+    def bulk_update_category(self, category, subcategory, ids=None, filters=None, search=None):
+        """Sets a category by hand on many rows in one UPDATE statement. Returns the number changed.
+
+        Rows are picked by a list of ids, TRANSACTION_FILTERS values, a
+        full-text search of the details, or any combination (all must hold).
+        """
+        conditions, params = transaction_filter_sql(filters)
+        if ids is not None:
+            # One JSON parameter instead of one placeholder per id
+            conditions.append('id IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps([int(transaction_id) for transaction_id in ids]))
+        if search:
+            conditions.append('id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)')
+            params.append(fts_query(search))
+        if not conditions:
+            raise ValueError("Select transactions by ids, filters or search")
+
+        with timed('db_bulk_update'), self.pool.writer() as conn, conn:
+            cursor = conn.execute(f'''
+                UPDATE transactions
+                SET category = ?, subcategory = ?, category_source = 'manual'
+                WHERE {' AND '.join(conditions)}
+            ''', [category, subcategory] + params)
+        increment('rows_written_total', cursor.rowcount, operation='bulk_update')
+        return cursor.rowcount
+
+    def find_transaction_ids(self, transactions):
+        """Returns the stored id of each parsed transaction (None if not stored), in order."""
+        keys = [row[-1] for row in keyed_rows(transactions)]
+        with self.pool.reader() as conn:
+            ids = dict(conn.execute(
+                'SELECT dedup_key, id FROM transactions WHERE dedup_key IN (SELECT value FROM json_each(?))',
+                (json.dumps(keys),)
+            ).fetchall())
+        return [ids.get(key) for key in keys]
+
+    def _save_rules_version(self, conn, rules_version, rules):
+        conn.execute(
+            'INSERT OR IGNORE INTO category_rule_versions (version, rules, created) VALUES (?, ?, ?)',
+            (rules_version, json.dumps(rules), time.time())
+        )
+
+    def save_rules_version(self, rules_version, rules):
+        """Remembers the rule set behind a fingerprint so later changes can be diffed against it."""
+        with self.pool.writer() as conn, conn:
+            self._save_rules_version(conn, rules_version, rules)
+
+    def get_rules_version(self, rules_version):
+        """Returns the rules recorded for a fingerprint, or None if they were never saved."""
+        if rules_version is None:
+            return None
+        with self.pool.reader() as conn:
+            row = conn.execute(
+                'SELECT rules FROM category_rule_versions WHERE version = ?', (rules_version,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stale_rules_versions(self, rules_version, include_unknown=False):
+        """Returns (rules_version, row count) for rule-categorized rows made with other rules."""
+        with self.pool.reader() as conn:
+            return conn.execute(f'''
+                SELECT rules_version, COUNT(*) FROM transactions
+                WHERE rules_version IS NOT ? AND {rule_source_sql(include_unknown)}
+                GROUP BY rules_version
+            ''', (rules_version,)).fetchall()
+
+    def keyword_index_terms(self, keywords):
+        """Returns the search index terms a row containing any of keywords must have.
+
+        Keywords match anywhere in details, even inside a word, so each
+        keyword's longest word is expanded to every indexed term containing
+        it. Returns None when the index can't narrow the rows down: a
+        keyword has no ASCII letters or digits, or the terms run past
+        MAX_KEYWORD_TERMS.
+        """
+        # Per connection, so it needs no migration; reads the index's term list.
+        # Readers are query_only, which also forbids creating temp tables
+        with self.pool.writer() as conn:
+            conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS temp.transactions_fts_terms '
+                'USING fts5vocab(main, transactions_fts, row)'
+            )
+            terms = set()
+            for keyword in keywords:
+                words = [word for word in NON_ALPHANUMERIC_PATTERN.split(keyword.lower()) if word]
+                if not words or not keyword.isascii():
+                    return None
+                terms.update(row[0] for row in conn.execute(
+                    'SELECT term FROM temp.transactions_fts_terms WHERE instr(term, ?) > 0 LIMIT ?',
+                    (max(words, key=len), MAX_KEYWORD_TERMS + 1)
+                ))
+                if len(terms) > MAX_KEYWORD_TERMS:
+                    return None
+        return sorted(terms)
+
+    def fetch_recategorize_candidates(self, rules_version, keywords=None, after_id=0, limit=1000,
+                                      include_unknown=False, terms=None):
+        """Returns up to limit (id, details, amount, category, subcategory) rows past after_id.
+
+        Only rows categorized with rules_version are considered, and when
+        keywords are given only rows whose details contain one of them.
+        Passing their keyword_index_terms as terms finds those rows through
+        the search index instead of scanning every row of rules_version.
+        """
+        conditions = ['rules_version IS ?', 'id > ?', rule_source_sql(include_unknown)]
+        params = [rules_version, after_id]
+        if keywords is not None:
+            if not keywords:
+                return []
+            # The index only narrows the rows down; LIKE keeps the match exact
+            conditions.append('(' + ' OR '.join(["transactions.details LIKE ? ESCAPE '\\'"] * len(keywords)) + ')')
+            params.extend(like_pattern(keyword) for keyword in keywords)
+
+        with self.pool.reader() as conn:
+            if keywords is not None and terms is not None:
+                if not terms:
+                    return []
+                match = 'details : (' + ' OR '.join('"' + term + '"' for term in terms) + ')'
+                # CROSS JOIN keeps the index lookup as the outer loop; FTS5 yields
+                # matches in rowid order, so the LIMIT stops it early
+                return conn.execute(f'''
+                    SELECT id, transactions.details, amount, category, subcategory
+                    FROM transactions_fts CROSS JOIN transactions ON transactions.id = transactions_fts.rowid
+                    WHERE transactions_fts MATCH ? AND transactions_fts.rowid > ?
+                    AND {' AND '.join(conditions)}
+                    ORDER BY transactions_fts.rowid
+                    LIMIT ?
+                ''', [match, after_id] + params + [limit]).fetchall()
+            return conn.execute(f'''
+                SELECT id, details, amount, category, subcategory FROM transactions
+                WHERE {' AND '.join(conditions)}
+                ORDER BY id
+                LIMIT ?
+            ''', params + [limit]).fetchall()
+
+    def apply_rule_categories(self, updates, rules_version):
+        """Writes (category, subcategory, id) rule results in one transaction, skipping manual rows."""
+        with timed('db_recategorize'), self.pool.writer() as conn, conn:
+            conn.execute('BEGIN IMMEDIATE')
+            updated = conn.executemany('''
+                UPDATE transactions
+                SET category = ?, subcategory = ?, category_source = 'rule', rules_version = ?
+                WHERE id = ? AND category_source IS NOT 'manual'
+            ''', (
+                (category, subcategory, rules_version, transaction_id)
+                for category, subcategory, transaction_id in updates
+            )).rowcount
+        increment('rows_written_total', updated, operation='recategorize')
+        return updated
+
+    def stamp_rules_version(self, old_version, rules_version, include_unknown=False):
+        """Marks every remaining row of old_version as checked against rules_version."""
+        with timed('db_stamp'), self.pool.writer() as conn, conn:
+            cursor = conn.execute(f'''
+                UPDATE transactions SET category_source = 'rule', rules_version = ?
+                WHERE rules_version IS ? AND {rule_source_sql(include_unknown)}
+            ''', (rules_version, old_version))
+        return cursor.rowcount
 
     def close(self):
-        if hasattr(self._local, 'connection'):
-            self._local.connection.close()
-            del self._local.connection
\ No newline at end of file
+        """Closes the pool's connections; the next query opens a new pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
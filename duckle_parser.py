@@ -1,162 +1,421 @@
+import logging
+import os
 import re
-import pytesseract
-from PIL import Image
-import tempfile
-import pdfplumber
+import sys
+import time
+from collections import deque
+from keyword_matcher import KeywordMatcher
+from pdf_extractor import PdfExtractor
+from extraction_cache import ExtractionCache, hash_file
+from category_rules import CATEGORY_FILE, get_registry
+from instrumentation import increment, observe, timed, timed_iter
+from transaction import Transaction, to_cents
+
+logger = logging.getLogger(__name__)
+
+# Patterns are compiled once at import time and shared by every parse.
+NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7F]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+PAGE_MARKER_PATTERN = re.compile(r'Page:\s*\d+\s*of\s*\d+')
+
+# Transaction pattern with optional withdrawal/deposit
+TRANSACTION_PATTERN = re.compile(
+    r'(\d{2}/\d{2}|[A-Za-z]{3} \d{1,2})\s+'  # Date format
+    r'(?:\b(Withdrawal|Deposit)\b\s+)?'  # Optional Withdrawal/Deposit
+    r'(?:(Card Purchase|Card purchase|POS|ACH|Transfer|ATM)?\s+)?'  # Optional Transaction Type
+    r'(.+?)\s+'  # Details until amount
+    r'(-?[\d,]+\.\d{2})\s+'  # Amount (supports negative and comma-separated)
+    r'([\d,]+\.\d{2})'  # Balance (supports comma-separated)
+)
+
+# Anything that looks like the start of the next transaction ends the extra details
+NEXT_DATE_PATTERN = re.compile(r'(?:[A-Za-z]{3}\s+\d{1,2}|\d{2}/\d{2})')
+REF_PATTERN = re.compile(r'(Ref:\d+)')
+
+
+# Bump these when extraction/OCR or parsing output changes so cached results miss
+EXTRACTION_VERSION = 1
+PARSER_VERSION = 2  # 2: transactions are cached with cents and YYYYMMDD dates
+
+# Pages with less extractable text than this are treated as scanned and OCR'd
+MIN_TEXT_LAYER_CHARS = 20
+
+MONTH_NUMBERS = {
+    "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04",
+    "May": "05", "Jun": "06", "Jul": "07", "Aug": "08",
+    "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12"
+}
+
+# Statement lines carry no year
+STATEMENT_YEAR = 2025
+
+# Gas purchases below this many cents are snacks
+SNACKS_LIMIT_CENTS = 3000
+
+def ocr_page(pdf_file_path, page_number):
+    """Rasterize one PDF page and OCR it in memory.
+
+    Runs in an extractor worker process, so it opens the PDF itself.
+    """
+    # Imported here so parsing text or cached files never loads PIL/tesseract
+    import pdfplumber
+    import pytesseract
+
+    # Several tesseract processes run side by side; keep each single-threaded
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    with pdfplumber.open(pdf_file_path) as pdf:
+        page = pdf.pages[page_number]
+        image = page.to_image().original
+        return pytesseract.image_to_string(image, config="--psm 6")
+
+def timed_ocr_page(pdf_file_path, page_number):
+    """ocr_page() plus its duration, measured in the worker so queueing isn't counted."""
+    start = time.perf_counter()
+    text = ocr_page(pdf_file_path, page_number)
+    return text, time.perf_counter() - start
 
 class BankStatementParser:
-    def __init__(self):
-        self.categorization_rules = {
-            "Income": ["Payroll", "Deposit", "Best Buy Stores"],
-            "Grocery": ["Walmart", "Kroger", "Dollar-General", "Aldi", "Meijer"],
-            "Entertainment": ["Netflix", "Spotify", "GameStop", "Doordash", "McDonalds"],
-            "Debt": ["Credit Card", "Loan Payment", "Discover", "Best Egg", "Merrick Bank"],
-            "Utilities": ["Columbia Gas", "Electric", "Water", "Verizon", "AT&T"],
-            "Mortgage": ["Home Mtg", "Mortgage"],
-            "Insurance": ["State Farm", "Geico", "Progressive"],
-            "Home": ["The Home Depot", "Lowe's", "Menards"],
-            "Gas": ["Speedway", "Circle K", "Shell", "BP"]
-        }
+    def __init__(self, workers=None, use_cache=True, registry=None):
+        # Page text extraction is spread over this many processes
+        self.extractor = PdfExtractor(workers)
+        # Repeat uploads of the same PDF are served from the extraction cache
+        self.cache = ExtractionCache() if use_cache else None
+        # Category rules are shared with the GUIs and the API through one registry
+        self.registry = registry or get_registry()
+        self._matcher = None
+        self._matcher_version = None
+
+    @property
+    def categorization_rules(self):
+        return self.registry.rules
+
+    @categorization_rules.setter
+    def categorization_rules(self, rules):
+        self.registry.replace(rules)
+
+    def load_category_file(self, path=CATEGORY_FILE):
+        """Merge keyword rules saved in a JSON file after the current rules."""
+        self.registry.load(path)
+
+    def add_category(self, category, keywords=()):
+        """Add a category (or extra keywords for one). Returns False when it already existed."""
+        return self.registry.add_category(category, keywords)
+
+    def invalidate_categorizer(self):
+        """Record an in-place edit of categorization_rules; the matcher is rebuilt on next use."""
+        self.registry.changed()
+
+    def rules_version(self):
+        """Return a short fingerprint of the current rules, in priority order."""
+        return self.registry.fingerprint()
+
+    def rules_snapshot(self):
+        """Return (rules_version, rules) read together from the registry."""
+        return self.registry.stamp()
+
+    def _get_matcher(self):
+        version, rules = self.registry.snapshot()
+        if self._matcher is None or self._matcher_version != version:
+            self._matcher = KeywordMatcher(
+                (keyword, category)
+                for category, keywords in rules.items()
+                for keyword in keywords
+            )
+            self._matcher_version = version
+        return self._matcher
+
+    def _category_pair(self, rule, amount_cents):
+        """Turn a matched rule name into (category, subcategory)."""
+        # "Main -> Sub" rules set both, the same way picking one in the UIs does
+        if " -> " in rule:
+            category, subcategory = rule.split(" -> ", 1)
+            return category, subcategory
+        # Special case: Gas transactions under $30 → Snacks, over $30 → Gas
+        if rule == "Gas":
+            return rule, "Snacks" if amount_cents is not None and amount_cents < SNACKS_LIMIT_CENTS else "Gas"
+        return rule, rule
+
+    def _categorize(self, details, amount_cents):
+        rule = self._get_matcher().first_match(details)
+        if rule is None:
+            return "Uncategorized", "Other"
+        return self._category_pair(rule, amount_cents)
 
     def categorize_transaction(self, details, amount):
-        """Assign a category and subcategory based on transaction details."""
-        for category, keywords in self.categorization_rules.items():
-            for keyword in keywords:
-                if keyword.lower() in details.lower():
-                    subcategory = ""
+        """Assign a category and subcategory based on transaction details and a dollar amount."""
+        return self._categorize(details, None if amount is None else to_cents(amount))
+
+    def _categorize_all(self, details_list, amounts_cents):
+        matcher = self._get_matcher()
+        results = []
+        with timed('categorize'):
+            for details, amount_cents in zip(details_list, amounts_cents):
+                rule = matcher.first_match(details)
+                if rule is None:
+                    results.append(("Uncategorized", "Other"))
+                else:
+                    results.append(self._category_pair(rule, amount_cents))
+        increment('rows_categorized_total', len(results))
+        return results
+
+    def categorize_many(self, details_list, amounts=None):
+        """Categorize many transactions against a single compiled matcher.
+
+        amounts (in dollars) lines up with details_list; without it Gas rows
+        keep the "Gas" subcategory since the Snacks split needs the amount.
+        """
+        if amounts is None:
+            return self._categorize_all(details_list, [None] * len(details_list))
+        return self._categorize_all(
+            details_list, [None if amount is None else to_cents(amount) for amount in amounts]
+        )
+
+    def categorize_batch(self, batch):
+        """categorize_many() for a TransactionBatch, reading its details and cents columns directly."""
+        return self._categorize_all(batch.details, batch.amounts_cents)
+
+    def _clean_text(self, text):
+        """Normalize raw statement text into a single whitespace-collapsed string."""
+        cleaned_text = NON_ASCII_PATTERN.sub('', text)
+        cleaned_text = WHITESPACE_PATTERN.sub(' ', cleaned_text).strip()
+        # Newlines are already collapsed here, so multiline transactions with
+        # reference numbers are joined onto a single line by this step.
+        return PAGE_MARKER_PATTERN.sub('', cleaned_text)
+
+    def _scan_transactions(self, cleaned_text):
+        """Walk normalized text once, yielding each transaction match and its extra details.
+
+        Yields (match, extra_details, extra_end) where extra_end is the offset
+        of the next date after the match, or None if the text ran out first.
+        """
+        for match in TRANSACTION_PATTERN.finditer(cleaned_text):
+            start_pos = match.end()
+            # Search in place instead of slicing so the scan never copies or
+            # revisits the remainder of the document.
+            next_date = NEXT_DATE_PATTERN.search(cleaned_text, start_pos)
+            extra_end = next_date.start() if next_date else None
+            extra_details = cleaned_text[start_pos:extra_end].strip()
+            yield match, extra_details, extra_end
+
+    def _build_transaction(self, match, extra_details):
+        """Turn a scanned transaction match into a Transaction."""
+        raw_date, withdrawal_or_deposit, transaction_type, details, amount, balance = match.groups()
 
-                    # Special case: Gas transactions under $30 → Snacks, over $30 → Gas
-                    if category == "Gas" and float(amount) < 30:
-                        subcategory = "Snacks"
-                    elif category == "Gas":
-                        subcategory = "Gas"
+        # Check if details contain a reference number and format it nicely
+        ref_match = REF_PATTERN.search(details)
+        if ref_match:
+            ref_number = ref_match.group(1)
+            details = details.replace(ref_number, f" - {ref_number}")
 
-                    return category, subcategory if subcategory else category
+        # Infer Withdrawal or Deposit if missing
+        if not withdrawal_or_deposit:
+            withdrawal_or_deposit = "Withdrawal" if "-" in amount else "Deposit"
 
-        return "Uncategorized", "Other"
+        # Convert date format
+        if '/' in raw_date:
+            month, day = raw_date.split('/')
+        else:
+            month_abbr, day = raw_date.split()
+            month = MONTH_NUMBERS.get(month_abbr, "00")
+
+        datestamp = STATEMENT_YEAR * 10000 + int(month) * 100 + int(day)
+
+        # Amounts are stored unsigned; the sign only tells withdrawals apart
+        amount_cents = abs(to_cents(amount))
+
+        # Append additional details to the main details field
+        if extra_details:
+            details = details.strip() + " " + extra_details
+        details = details.strip()
+
+        category, subcategory = self._categorize(details, amount_cents)
+
+        # Shared strings keep thousands of parsed rows from each holding a copy
+        return Transaction(
+            datestamp,
+            sys.intern(withdrawal_or_deposit),
+            sys.intern(transaction_type) if transaction_type else "Other",
+            details,
+            amount_cents,
+            to_cents(balance),
+            category,
+            subcategory
+        )
 
     def parse_bank_statement_with_year(self, text):
         if not text:
-            print("ERROR: No text provided for parsing!")
+            logger.error("No text provided for parsing")
             return []
 
-        transactions = []
-        print("Starting Parsing...")
-
-        # Initial text cleaning
-        cleaned_text = re.sub(r'[^\x00-\x7F]+', '', text)
-        cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
-        cleaned_text = re.sub(r'Page:\s*\d+\s*of\s*\d+', '', cleaned_text)
-
-        # First, look for multiline transactions with reference numbers and join them
-        multiline_pattern = r'(\d{2}/\d{2}|[A-Za-z]{3} \d{1,2})\s+((?:Card Purchase|POS|ACH|Transfer|ATM)?\s+.+?)\n(\d+)\n(-?[\d,]+\.\d{2})\s+([\d,]+\.\d{2})'
-
-        # Replace multiline transactions with single line format
-        cleaned_text = re.sub(multiline_pattern, r'\1 \2 \3 \4 \5', cleaned_text)
-
-        print("DEBUG: Cleaned Text After Joining Multiline Transactions:")
-        print(cleaned_text[:9000])  # Print first 9000 characters for debugging
-
-        # Transaction pattern with optional withdrawal/deposit
-        transaction_pattern = (
-            r'(\d{2}/\d{2}|[A-Za-z]{3} \d{1,2})\s+'  # Date format
-            r'(?:\b(Withdrawal|Deposit)\b\s+)?'  # Optional Withdrawal/Deposit
-            r'(?:(Card Purchase|Card purchase|POS|ACH|Transfer|ATM)?\s+)?'  # Optional Transaction Type
-            r'(.+?)\s+'  # Details until amount
-            r'(-?[\d,]+\.\d{2})\s+'  # Amount (supports negative and comma-separated)
-            r'([\d,]+\.\d{2})'  # Balance (supports comma-separated)
-        )
+        with timed('parse'):
+            cleaned_text = self._clean_text(text)
+            # Statement contents stay out of the logs, even at debug level
+            logger.debug("Parsing %d characters of cleaned text", len(cleaned_text))
 
-        matches = list(re.finditer(transaction_pattern, cleaned_text))
-        if not matches:
-            print("WARNING: No transactions matched!")
+            transactions = [
+                self._build_transaction(match, extra_details)
+                for match, extra_details, _ in self._scan_transactions(cleaned_text)
+            ]
+        increment('rows_parsed_total', len(transactions))
+        if not transactions:
+            logger.warning("No transactions matched")
             return []
 
-        for i, match in enumerate(matches):
-            raw_date, withdrawal_or_deposit, transaction_type, details, amount, balance = match.groups()
-
-            # Check if details contain a reference number and format it nicely
-            ref_match = re.search(r'(Ref:\d+)', details)
-            if ref_match:
-                ref_number = ref_match.group(1)
-                details = details.replace(ref_number, f" - {ref_number}")
+        logger.info("Parsed %d transactions", len(transactions))
+        return transactions
 
-            # Infer Withdrawal or Deposit if missing
-            if not withdrawal_or_deposit:
-                withdrawal_or_deposit = "Withdrawal" if "-" in amount else "Deposit"
+    def iter_transactions(self, pages):
+        """Parse a statement page by page, yielding transactions as soon as they are complete.
 
-            # Convert date format
-            if '/' in raw_date:
-                month, day = raw_date.split('/')
+        Accepts pdfplumber pages or already extracted page text. Only the text
+        from the last transaction onward is carried into the next page, so a
+        transaction split across a page break is still parsed as one.
+        """
+        pending_text = ""
+        total = 0
+        for page in pages:
+            if isinstance(page, str):
+                page_text = page
             else:
-                month_names = {
-                    "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04",
-                    "May": "05", "Jun": "06", "Jul": "07", "Aug": "08",
-                    "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12"
-                }
-                month_abbr, day = raw_date.split()
-                month = month_names.get(month_abbr, "00")
-
-            full_date = f"2025-{month}-{day.zfill(2)}"
-
-            # Clean amount for processing
-            amount_clean = amount.replace('-', '').replace(',', '')
-
-            # Step 6: Capture multi-line additional details
-            start_pos = match.end()  # Start looking after this transaction
-            next_transaction_match = re.search(
-                r'(?:[A-Za-z]{3}\s+\d{1,2}|\d{2}/\d{2})',  # Look for next date
-                cleaned_text[start_pos:]
-            )
+                page_text = page.extract_text() or ""
+                # Drop pdfplumber's cached layout objects once the text is out
+                page.flush_cache()
 
-            if next_transaction_match:
-                # Extract everything between this transaction and the next
-                additional_details_text = cleaned_text[start_pos:start_pos + next_transaction_match.start()].strip()
-            else:
-                # No next transaction, take everything until the end of text
-                additional_details_text = cleaned_text[start_pos:].strip()
-
-            # Append additional details to the main details field
-            if additional_details_text:
-                details = details.strip() + " " + additional_details_text
-
-            category, subcategory = self.categorize_transaction(details, amount_clean)
-
-            transaction_entry = (
-                full_date,
-                withdrawal_or_deposit,
-                transaction_type if transaction_type else "Other",
-                details.strip(),
-                float(amount_clean),
-                float(balance.replace(',', '')),
-                category,
-                subcategory
-            )
+            # A page's rows are built before any is yielded so the timing excludes the consumer
+            ready = []
+            with timed('parse_page'):
+                buffer = self._clean_text(pending_text + "\n" + page_text)
+                last_match = None
+                for match, extra_details, _ in self._scan_transactions(buffer):
+                    if last_match is not None:
+                        # A later transaction bounds this one's extra details
+                        ready.append(self._build_transaction(*last_match))
+                    last_match = (match, extra_details)
 
-            transactions.append(transaction_entry)
+                if last_match is not None:
+                    # The last transaction may continue on the next page
+                    pending_text = buffer[last_match[0].start():]
+                else:
+                    # Nothing before the first date can start a transaction; keep
+                    # the last word in case a date was split by the page break
+                    next_date = NEXT_DATE_PATTERN.search(buffer)
+                    pending_text = buffer[next_date.start() if next_date else buffer.rfind(' ') + 1:]
+            increment('rows_parsed_total', len(ready))
+            total += len(ready)
+            yield from ready
 
-        print(f"FINAL DEBUG: Total Parsed Transactions: {len(transactions)}")
-        return transactions
+        if pending_text:
+            with timed('parse_page'):
+                ready = [
+                    self._build_transaction(match, extra_details)
+                    for match, extra_details, _ in self._scan_transactions(pending_text)
+                ]
+            increment('rows_parsed_total', len(ready))
+            total += len(ready)
+            yield from ready
+
+        logger.info("Streamed %d transactions", total)
+
+    def iter_pdf_page_texts(self, pdf_file_path, on_progress=None):
+        """Yield each page's text in order, OCR-ing only pages without a usable text layer.
+
+        OCR jobs are queued on the extractor's worker pool as soon as a
+        scanned page is found, so they run in parallel with extraction.
+        on_progress, if given, is called with 'pages_extracted' or
+        'pages_ocrd' as each page finishes that stage.
+        """
+        pending = deque()
+        page_texts = timed_iter('extract_page', self.extractor.iter_page_texts(pdf_file_path))
+        for page_number, page_text in enumerate(page_texts):
+            increment('pages_extracted_total')
+            if on_progress:
+                on_progress('pages_extracted')
+            ocr_job = None
+            if len(page_text.strip()) < MIN_TEXT_LAYER_CHARS:
+                ocr_job = self.extractor.submit(timed_ocr_page, pdf_file_path, page_number)
+            pending.append((page_text, ocr_job))
+
+            # Hand back leading pages as soon as they are ready
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                yield self._resolve_page(*pending.popleft(), on_progress)
+
+        while pending:
+            yield self._resolve_page(*pending.popleft(), on_progress)
+
+    def _resolve_page(self, page_text, ocr_job, on_progress=None):
+        if ocr_job is None:
+            return page_text
+        try:
+            ocr_text, seconds = ocr_job.result()
+        except Exception as e:
+            # Keep whatever the text layer had rather than losing the page
+            increment('stage_errors_total', stage='ocr_page')
+            logger.warning("OCR failed, keeping the page's text layer: %s", e)
+            return page_text
+        observe('stage_seconds', seconds, stage='ocr_page')
+        increment('pages_ocrd_total')
+        if on_progress:
+            on_progress('pages_ocrd')
+        return ocr_text
+
+    def load_pdf_page_texts(self, pdf_file_path):
+        """Return a PDF's page texts, reusing cached extraction/OCR output for known files."""
+        if self.cache is None:
+            return list(self.iter_pdf_page_texts(pdf_file_path))
+
+        file_hash = hash_file(pdf_file_path)
+        page_texts = self.cache.get_pages(file_hash, EXTRACTION_VERSION)
+        if page_texts is None:
+            page_texts = list(self.iter_pdf_page_texts(pdf_file_path))
+            self.cache.put_pages(file_hash, EXTRACTION_VERSION, page_texts)
+        return page_texts
+
+    def iter_pdf_transactions(self, pdf_file_path, on_progress=None):
+        """Stream transactions out of a PDF, OCR-ing any pages that have no text layer.
+
+        With the cache enabled, a file seen before skips extraction and OCR,
+        and skips parsing too if the parser and rules are unchanged.
+        on_progress is passed through to iter_pdf_page_texts().
+        """
+        if self.cache is None:
+            yield from self.iter_transactions(self.iter_pdf_page_texts(pdf_file_path, on_progress))
+            return
+
+        file_hash = hash_file(pdf_file_path)
+        parse_version = f"{PARSER_VERSION}-{self.rules_version()}"
+        transactions = self.cache.get_transactions(file_hash, parse_version)
+        if transactions is not None:
+            logger.info("Using cached parse of %s", pdf_file_path)
+            yield from (Transaction(*transaction) for transaction in transactions)
+            return
+
+        page_texts = self.cache.get_pages(file_hash, EXTRACTION_VERSION)
+        extracted = page_texts is None
+        if extracted:
+            page_texts = []
+
+            def record_pages():
+                for page_text in self.iter_pdf_page_texts(pdf_file_path, on_progress):
+                    page_texts.append(page_text)
+                    yield page_text
+
+            source = record_pages()
+        else:
+            source = page_texts
+
+        transactions = []
+        for transaction in self.iter_transactions(source):
+            transactions.append(transaction)
+            yield transaction
+
+        if extracted:
+            self.cache.put_pages(file_hash, EXTRACTION_VERSION, page_texts)
+        self.cache.put_transactions(file_hash, parse_version, transactions)
 
     def perform_ocr_on_pdf(self, pdf_file_path):
-        """Performs OCR on a PDF file if text-based parsing fails."""
+        """Returns the text of a PDF, using OCR for pages without a text layer."""
         try:
-            with pdfplumber.open(pdf_file_path) as pdf:
-                all_text = ""
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    # Convert the page to an image
-                    with tempfile.NamedTemporaryFile(suffix=".png") as temp_img:
-                        image = page.to_image()
-                        image.save(temp_img.name)
-
-                        # Perform OCR
-                        ocr_text = pytesseract.image_to_string(Image.open(temp_img.name), config="--psm 6")
-                        all_text += ocr_text + "\n"
-                    if page_text:
-                        all_text += page_text + "\n\n"  # Ensure line breaks
-
-            return all_text
+            return "\n".join(self.iter_pdf_page_texts(pdf_file_path))
         except Exception as e:
-            print(f"OCR Error: {str(e)}")
-            return ""
\ No newline at end of file
+            logger.error("OCR Error: %s", e)
+            return ""
@@ -0,0 +1,176 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DB = 'extraction_cache.db'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def hash_file(file_path):
+    """Return the SHA-256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Content-addressed, size-bounded LRU cache of PDF page text and parse results.
+
+    Entries are keyed by the SHA-256 of the PDF bytes plus a version string,
+    so a changed parser or rule set simply misses instead of serving stale
+    results. Least recently used entries are evicted once the stored
+    payloads exceed max_bytes.
+    """
+
+    def __init__(self, db_name=CACHE_DB, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_name = db_name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name)
+        if not self._ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT,
+                    file_hash TEXT,
+                    version TEXT,
+                    payload TEXT,
+                    size INTEGER,
+                    created REAL,
+                    last_used REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache_entries (last_used)')
+            conn.commit()
+            self._ready = True
+        return conn
+
+    def _get(self, kind, file_hash, version):
+        key = f"{kind}:{file_hash}:{version}"
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute('SELECT payload FROM cache_entries WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE cache_entries SET last_used = ? WHERE key = ?', (time.time(), key))
+                conn.commit()
+            finally:
+                conn.close()
+        return json.loads(row[0])
+
+    def _put(self, kind, file_hash, version, value):
+        key = f"{kind}:{file_hash}:{version}"
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT OR REPLACE INTO cache_entries (
+                        key, kind, file_hash, version, payload, size, created, last_used
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (key, kind, file_hash, version, payload, len(payload), now, now))
+                self._evict(conn)
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        stale_keys = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM cache_entries WHERE key = ?', stale_keys)
+
+    def get_pages(self, file_hash, version):
+        return self._get('pages', file_hash, version)
+
+    def put_pages(self, file_hash, version, page_texts):
+        self._put('pages', file_hash, version, list(page_texts))
+
+    def get_transactions(self, file_hash, version):
+        transactions = self._get('transactions', file_hash, version)
+        if transactions is None:
+            return None
+        return [tuple(transaction) for transaction in transactions]
+
+    def put_transactions(self, file_hash, version, transactions):
+        self._put('transactions', file_hash, version, [list(transaction) for transaction in transactions])
+
+    def entries(self):
+        """Return (kind, file_hash, version, size, created, last_used) for every entry, newest first."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute('''
+                    SELECT kind, file_hash, version, size, created, last_used
+                    FROM cache_entries ORDER BY last_used DESC
+                ''').fetchall()
+            finally:
+                conn.close()
+
+    def purge(self, file_hash=None):
+        """Delete every entry, or only the entries for one file hash. Returns the number removed."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                if file_hash:
+                    cursor = conn.execute('DELETE FROM cache_entries WHERE file_hash = ?', (file_hash,))
+                else:
+                    cursor = conn.execute('DELETE FROM cache_entries')
+                conn.commit()
+                removed = cursor.rowcount
+                conn.execute('VACUUM')
+                return removed
+            finally:
+                conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or purge the Duckle extraction cache')
+    parser.add_argument('--db', default=CACHE_DB, help=f'Cache database (default: {CACHE_DB})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='Show entry count and total size')
+    subparsers.add_parser('list', help='List cached entries, most recently used first')
+    purge_parser = subparsers.add_parser('purge', help='Remove cached entries')
+    purge_parser.add_argument('file', nargs='?', help='Only purge entries for this PDF (path or SHA-256)')
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.db)
+
+    if args.command == 'stats':
+        entries = cache.entries()
+        total = sum(entry[3] for entry in entries)
+        print(f"{len(entries)} entries, {total / (1024 * 1024):.1f} MiB (limit {cache.max_bytes / (1024 * 1024):.0f} MiB)")
+
+    elif args.command == 'list':
+        for kind, file_hash, version, size, created, last_used in cache.entries():
+            used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_used))
+            print(f"{file_hash[:16]}  {kind:<12} {version:<24} {size:>10}  {used}")
+
+    else:
+        file_hash = args.file
+        if file_hash and os.path.exists(file_hash):
+            file_hash = hash_file(file_hash)
+        removed = cache.purge(file_hash)
+        print(f"Removed {removed} cache entries")
+
+
+if __name__ == '__main__':
+    main()
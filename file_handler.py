@@ -1,7 +1,7 @@
-from tkinter import filedialog
-import pdfplumber
-from duckle_parser import BankStatementParser
-from database_handler import DatabaseHandler
+
+import logging
+
+logger = logging.getLogger(__name__)
 
 class FileHandler:
     def __init__(self, parser, db_handler):
@@ -10,24 +10,29 @@ class FileHandler:
 
     def load_pdf(self):
         """Opens a file dialog and processes the selected PDF."""
+        from tkinter import filedialog
         pdf_file_path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
         if not pdf_file_path:
-            print("No file selected.")
+            logger.info("No file selected")
             return None
 
         try:
-            with pdfplumber.open(pdf_file_path) as pdf:
-                all_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-
-            if not all_text.strip():
-                print("No text found, attempting OCR...")
-                all_text = self.parser.perform_ocr_on_pdf(pdf_file_path)
+            # Scanned pages are OCR'd individually; known files come from the cache
+            all_text = "\n".join(self.parser.load_pdf_page_texts(pdf_file_path))
 
             # Return the raw text instead of parsed transactions
             return all_text
 
         except Exception as e:
-            print(f"Error reading PDF: {str(e)}")
+            logger.error("Error reading PDF: %s", e)
             return None
 
+    def load_pdf_transactions(self):
+        """Opens a file dialog and streams parsed transactions from the selected PDF."""
+        from tkinter import filedialog
+        pdf_file_path = filedialog.askopenfilename(filetypes=[("PDF Files", "*.pdf")])
+        if not pdf_file_path:
+            logger.info("No file selected")
+            return None
 
+        return self.parser.iter_pdf_transactions(pdf_file_path)
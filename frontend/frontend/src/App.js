@@ -6,40 +6,88 @@ import FileUpload from './components/FileUpload';
 import Categories from './components/Categories';
 import './App.css';
 
+const PAGE_SIZE = 200;
+const JOB_POLL_INTERVAL_MS = 1000;
+
 function App() {
   const [transactions, setTransactions] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [sortConfig, setSortConfig] = useState({ key: 'date', direction: 'ascending' });
 
   useEffect(() => {
-    // Fetch transactions when component mounts
+    // Fetch the first page on mount and whenever the server-side sort changes
     fetchTransactions();
-  }, []);
+  }, [sortConfig]);
 
-  const fetchTransactions = async () => {
-    setLoading(true);
+  const fetchTransactions = async (after = null) => {
+    if (after) {
+      setLoadingMore(true);
+    } else {
+      setLoading(true);
+    }
     try {
-      const response = await fetch('http://localhost:5000/api/transactions');
+      const params = new URLSearchParams({
+        limit: PAGE_SIZE,
+        sort: sortConfig.key,
+        order: sortConfig.direction === 'ascending' ? 'asc' : 'desc',
+      });
+      if (after) {
+        params.set('after', after);
+      }
+      const response = await fetch(`http://localhost:5000/api/transactions?${params}`);
       if (!response.ok) {
         throw new Error('Failed to fetch transactions');
       }
       const data = await response.json();
-      setTransactions(data);
+      setTransactions(previous => (after ? [...previous, ...data.transactions] : data.transactions));
+      setNextCursor(data.next_cursor);
     } catch (err) {
       setError(err.message);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
-  const handleFileUpload = async (file) => {
+  const handleSortChange = (key) => {
+    let direction = 'ascending';
+    if (sortConfig.key === key && sortConfig.direction === 'ascending') {
+      direction = 'descending';
+    }
+    setSortConfig({ key, direction });
+  };
+
+  const waitForJob = async (statusUrl) => {
+    for (;;) {
+      const response = await fetch(`http://localhost:5000${statusUrl}`);
+      if (!response.ok) {
+        throw new Error('Failed to check import status');
+      }
+      const job = await response.json();
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+  };
+
+  const handleFileUpload = async (files) => {
     setLoading(true);
     setError(null);
+    // Several statements go up as one batch job that is committed together
     const formData = new FormData();
-    formData.append('file', file);
+    if (files.length === 1) {
+      formData.append('file', files[0]);
+    } else {
+      files.forEach(file => formData.append('files', file));
+    }
+    const endpoint = files.length === 1 ? 'upload-pdf' : 'upload-batch';
 
     try {
-      const response = await fetch('http://localhost:5000/api/upload-pdf', {
+      const response = await fetch(`http://localhost:5000/api/${endpoint}`, {
         method: 'POST',
         body: formData,
       });
@@ -49,10 +97,16 @@ function App() {
         throw new Error(errorData.error || 'Failed to upload file');
       }
 
-      const data = await response.json();
+      // The upload is processed in the background; poll until the job finishes
+      const { status_url: statusUrl } = await response.json();
+      const job = await waitForJob(statusUrl);
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Failed to import file');
+      }
+
       // Reload transactions after successful upload
       fetchTransactions();
-      return data;
+      return job.result;
     } catch (err) {
       setError(err.message);
       return { error: err.message };
@@ -96,6 +150,41 @@ function App() {
     }
   };
 
+  const handleBulkCategoryUpdate = async (transactionIds, category, subcategory) => {
+    try {
+      const response = await fetch('http://localhost:5000/api/bulk-set-category', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          ids: transactionIds,
+          category,
+          subcategory,
+        }),
+      });
+
+      if (!response.ok) {
+        const errorData = await response.json();
+        throw new Error(errorData.error || 'Failed to update categories');
+      }
+
+      const updatedIds = new Set(transactionIds);
+      setTransactions(previous =>
+        previous.map(transaction =>
+          updatedIds.has(transaction.id)
+            ? { ...transaction, category, subcategory }
+            : transaction
+        )
+      );
+
+      return { success: true };
+    } catch (err) {
+      setError(err.message);
+      return { error: err.message };
+    }
+  };
+
   const handleAddCategory = async (newCategory) => {
     try {
       const response = await fetch('http://localhost:5000/api/add-category', {
@@ -155,8 +244,22 @@ function App() {
                   <TransactionsTable
                     transactions={transactions}
                     loading={loading}
+                    sortConfig={sortConfig}
+                    onSortChange={handleSortChange}
                     onCategoryUpdate={handleCategoryUpdate}
+                    onBulkCategoryUpdate={handleBulkCategoryUpdate}
                   />
+                  {nextCursor && (
+                    <div className="text-center mt-4">
+                      <button
+                        onClick={() => fetchTransactions(nextCursor)}
+                        disabled={loadingMore}
+                        className="px-4 py-2 bg-blue-600 text-white rounded-md hover:bg-blue-700 disabled:opacity-50"
+                      >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                      </button>
+                    </div>
+                  )}
                 </>
               }
             />
@@ -2,30 +2,28 @@
 import React, { useState } from 'react';
 
 const FileUpload = ({ onUpload, loading }) => {
-  const [file, setFile] = useState(null);
+  const [files, setFiles] = useState([]);
   const [message, setMessage] = useState('');
 
   const handleFileChange = (e) => {
-    if (e.target.files[0]) {
-      setFile(e.target.files[0]);
-    }
+    setFiles(Array.from(e.target.files));
   };
 
   const handleUpload = async () => {
-    if (!file) {
+    if (!files.length) {
       setMessage('Please select a file');
       return;
     }
     
     setMessage('Uploading...');
-    const result = await onUpload(file);
+    const result = await onUpload(files);
     
     if (result && result.error) {
       setMessage(`Error: ${result.error}`);
     } else if (result && result.message) {
       setMessage(result.message);
       // Clear file input
-      setFile(null);
+      setFiles([]);
       document.getElementById('file-input').value = '';
     }
   };
@@ -36,14 +34,15 @@ const FileUpload = ({ onUpload, loading }) => {
         id="file-input"
         type="file"
         accept=".pdf"
+        multiple
         onChange={handleFileChange}
         className="border p-2 rounded"
       />
       <button
         onClick={handleUpload}
-        disabled={!file || loading}
+        disabled={!files.length || loading}
         className={`px-4 py-2 rounded-md ${
-          loading || !file
+          loading || !files.length
             ? 'bg-gray-400 cursor-not-allowed'
             : 'bg-blue-600 hover:bg-blue-700 text-white'
         }`}
@@ -1,24 +1,15 @@
+import logging
 import tkinter as tk
 from tkinter import ttk, Label, PhotoImage
 from tkinter import messagebox, filedialog
-import pandas as pd
 from file_handler import FileHandler
 from duckle_parser import BankStatementParser
 from database_handler import DatabaseHandler  # Ensure this is imported
+from transaction import Transaction, TransactionBatch, as_transaction, format_cents
 
-# Predefined categories and subcategories for auto-categorization
-CATEGORY_RULES = {
-    "Grocery": ["Walmart", "Kroger", "Dollar-General"],
-    "Entertainment": ["Netflix", "Hulu", "Disney", "Steam", "GameStop"],
-    "Entertainment -> Meals": ["McDonalds", "Wendys", "Taco Bell", "Dominos", "Doordash"],
-    "Debt -> Credit Card": ["Discover", "Merrick Bank", "Best Egg"],
-    "Insurance": ["State Farm", "Geico", "Allstate"],
-    "Home -> Home Improvement": ["Home Depot", "Lowes"],
-    "Mortgage": ["Us Bank Home Mtg"],
-    "Utilities": ["Columbia Gas", "Toledo Edison", "Water"],
-    "Gas": ["Speedway", "Shell", "BP"],
-    "Snacks": ["Circle K", "Speedway", "Sheetz"],  # Transactions under $30 at gas stations
-}
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 500
 
 class BankStatementApp:
     def __init__(self, root, file_handler, parser, db_handler):
@@ -26,6 +17,7 @@ class BankStatementApp:
         self.parser = parser
         self.db_handler = db_handler
         self.file_handler = file_handler
+        self.transaction_ids = {}  # Treeview item -> database id, for rows that are stored
 
         self.logo = PhotoImage(file="Duckle256.png")  # Make sure "logo.png" is in the same folder
 
@@ -116,6 +108,25 @@ class BankStatementApp:
                                            command=self.add_new_category)
         self.add_category_btn.pack(side=tk.LEFT, padx=5)
 
+        # Search frame
+        search_frame = ttk.Frame(main_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 20))
+
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        self.search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_entry.bind("<Return>", lambda event: self.search_transactions())
+
+        self.search_btn = ttk.Button(search_frame,
+                                     text="Search",
+                                     command=self.search_transactions)
+        self.search_btn.pack(side=tk.LEFT, padx=5)
+
+        self.show_all_btn = ttk.Button(search_frame,
+                                       text="Show All",
+                                       command=self.refresh_view)
+        self.show_all_btn.pack(side=tk.LEFT, padx=5)
+
         # Treeview in a frame with scrollbars
         tree_frame = ttk.Frame(main_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True)
@@ -147,29 +158,26 @@ class BankStatementApp:
 
         self.tree.pack(fill=tk.BOTH, expand=True)
 
+        # Configure tag colors
+        self.tree.tag_configure("deposit", foreground="#008800")
+        self.tree.tag_configure("withdrawal", foreground="#880000")
+
         # Initialize category dropdown
         self.update_category_dropdown()
 
     def update_category_dropdown(self):
         """Updates the category dropdown with available categories."""
-        self.category_dropdown["values"] = list(CATEGORY_RULES.keys())
+        self.category_dropdown["values"] = list(self.parser.categorization_rules.keys())
 
     def auto_categorize_transaction(self, details, amount):
         """Automatically assigns a category based on transaction details."""
-        for category, keywords in CATEGORY_RULES.items():
-            for keyword in keywords:
-                if keyword.lower() in details.lower():
-                    # Special rule for gas/snacks categorization
-                    if category == "Snacks" and float(amount) > 30:
-                        return "Gas"
-                    return category
-        return "Uncategorized"
+        category, _ = self.parser.categorize_transaction(details, amount)
+        return category
 
     def add_new_category(self):
         """Allows the user to add a new category."""
         new_category = self.new_category_entry.get().strip()
-        if new_category and new_category not in CATEGORY_RULES:
-            CATEGORY_RULES[new_category] = []
+        if new_category and self.parser.add_category(new_category):
             self.update_category_dropdown()
             messagebox.showinfo("Success", f"Category '{new_category}' added!")
         else:
@@ -177,61 +185,76 @@ class BankStatementApp:
 
     def load_pdf(self):
         """Handles PDF loading and transaction parsing."""
-        text = self.file_handler.load_pdf()
-
-        if not isinstance(text, str) or not text.strip():
-            print("ERROR: No valid text extracted, skipping parsing.")
-            messagebox.showerror("Error", "No valid text was extracted from the PDF.")
+        transactions = self.file_handler.load_pdf_transactions()
+        if transactions is None:
             return
 
-        print("Text successfully extracted. Parsing now...")
+        self.clear_treeview()
+        parsed = TransactionBatch()
+        items = []
+        # The rules the rows are categorized with, read before parsing starts
+        rules_version, rules = self.parser.rules_snapshot()
 
-        transactions = self.parser.parse_bank_statement_with_year(text)
+        try:
+            # Rows are shown page by page as the parser yields them
+            for transaction in transactions:
+                items.append(self.insert_treeview_row(transaction))
+                parsed.append(transaction)
+                if len(parsed) % 50 == 0:
+                    self.root.update_idletasks()
+        except Exception as e:
+            logger.error("Error reading PDF: %s", e)
+            messagebox.showerror("Error", f"Error reading PDF: {str(e)}")
+            return
 
-        if not transactions:
-            print("WARNING: No transactions were parsed.")
+        if not parsed:
+            logger.warning("No transactions were parsed")
             messagebox.showwarning("Warning", "No transactions were found in the PDF.")
             return
 
-        # Insert transactions into the database
-        for transaction in transactions:
-            self.db_handler.insert_transaction(transaction)
-
-        print(f"Displaying {len(transactions)} transactions in GUI...")
-        self.populate_treeview(transactions)
+        # Store the whole statement in a single database transaction
+        result = self.db_handler.insert_transactions(parsed, rules_version, rules)
+        # Includes rows that were already imported, so they can be recategorized too
+        self.transaction_ids.update(zip(items, self.db_handler.find_transaction_ids(parsed)))
+        logger.info("Displayed %d transactions in GUI (%d new, %d already imported)",
+                    len(parsed), result['inserted'], result['duplicates'])
 
     def populate_treeview(self, transactions):
         """Displays parsed transactions in the GUI with categorization."""
-        self.tree.delete(*self.tree.get_children())  # Clear existing items
+        self.clear_treeview()
 
         for transaction in transactions:
-            # Extract transaction data
-            date, withdrawal_or_deposit, transaction_type, details = transaction[0:4]
-            amount, balance, category, subcategory = transaction[4:8]
-
-            # Create display values
-            display_values = (
-                date,
-                withdrawal_or_deposit,
-                transaction_type,
-                details,  # Details now includes any additional information
-                f"{amount:.2f}",
-                f"{balance:.2f}",
-                category,
-                subcategory
-            )
+            self.insert_treeview_row(transaction)
 
-            item_id = self.tree.insert("", tk.END, values=display_values)
-
-            # Apply color coding based on transaction type
-            if withdrawal_or_deposit == "Deposit":
-                self.tree.item(item_id, tags=("deposit",))
-            else:
-                self.tree.item(item_id, tags=("withdrawal",))
+    def populate_stored_transactions(self, rows):
+        """Displays database rows (id first), remembering each row's id."""
+        self.clear_treeview()
 
-        # Configure tag colors
-        self.tree.tag_configure("deposit", foreground="#008800")
-        self.tree.tag_configure("withdrawal", foreground="#880000")
+        for row in rows:
+            self.insert_treeview_row(Transaction.from_row(row[1:]), row[0])
+
+    def insert_treeview_row(self, transaction, transaction_id=None):
+        """Appends a single transaction to the Treeview with color coding and returns its item."""
+        transaction = as_transaction(transaction)
+
+        # Create display values
+        display_values = (
+            transaction.date,
+            transaction.withdrawal_or_deposit,
+            transaction.transaction_type,
+            transaction.details,  # Details now includes any additional information
+            format_cents(transaction.amount_cents),
+            format_cents(transaction.balance_cents),
+            transaction.category,
+            transaction.subcategory
+        )
+
+        # Apply color coding based on transaction type
+        tag = "deposit" if transaction.withdrawal_or_deposit == "Deposit" else "withdrawal"
+        item = self.tree.insert("", tk.END, values=display_values, tags=(tag,))
+        if transaction_id is not None:
+            self.transaction_ids[item] = transaction_id
+        return item
 
     def set_category(self):
         """Allows user to manually set a category for a selected transaction."""
@@ -245,33 +268,48 @@ class BankStatementApp:
             messagebox.showwarning("No Category", "Please select a category.")
             return
 
-        for item in selected_item:
-            values = list(self.tree.item(item, "values"))
-            values[6] = category  # Update category column
+        # For subcategory handling
+        if " -> " in category:
+            main_category, subcategory = category.split(" -> ")
+        else:
+            main_category = subcategory = category  # Default subcategory to match category
 
-            # For subcategory handling
-            if " -> " in category:
-                main_category, subcategory = category.split(" -> ")
-                values[6] = main_category
-                values[7] = subcategory
-            else:
-                values[7] = category  # Default subcategory to match category
+        # Every selected row is updated by one statement in one transaction
+        ids = [self.transaction_ids[item] for item in selected_item if item in self.transaction_ids]
+        if ids:
+            self.db_handler.bulk_update_category(main_category, subcategory, ids=ids)
 
+        for item in selected_item:
+            values = list(self.tree.item(item, "values"))
+            values[6] = main_category
+            values[7] = subcategory
             self.tree.item(item, values=values)
 
-            # Update in database if you want persistent changes
-            # Get unique identifier and update database
-            # (This would require modifications to your database_handler)
-
     def clear_treeview(self):
         """Clears all items from the Treeview."""
         self.tree.delete(*self.tree.get_children())
+        self.transaction_ids.clear()
 
     def refresh_view(self):
         """Refreshes transactions by reloading from the database."""
         self.clear_treeview()
         transactions = self.db_handler.fetch_all_transactions()  # Fetch stored transactions
-        self.populate_treeview(transactions)
+        self.populate_stored_transactions(transactions)
+
+    def search_transactions(self):
+        """Shows stored transactions matching the search box, best matches first."""
+        query = self.search_var.get().strip()
+        if not query:
+            self.refresh_view()
+            return
+
+        try:
+            transactions, _ = self.db_handler.search_transactions(query, limit=SEARCH_RESULT_LIMIT)
+        except ValueError as e:
+            messagebox.showwarning("Search", str(e))
+            return
+
+        self.populate_stored_transactions(transactions)
 
     def sort_column(self, col, reverse):
         """Sort tree contents when a column header is clicked."""
@@ -288,6 +326,7 @@ class BankStatementApp:
                     return float(value.replace('$', '').replace(',', ''))
                 # Try to convert to date for Date column
                 elif col == 'Date':
+                    import pandas as pd
                     return pd.to_datetime(value)
                 # Return string for other columns
                 return value
@@ -321,6 +360,7 @@ class BankStatementApp:
                     values = list(values) + [""]
                 data.append(values[:len(columns)])  # Only take as many values as there are columns
 
+            import pandas as pd
             df = pd.DataFrame(data, columns=[self.tree.heading(col)["text"] for col in columns])
 
             export_file = filedialog.asksaveasfilename(
@@ -338,6 +378,7 @@ class BankStatementApp:
 if __name__ == "__main__":
     root = tk.Tk()
     db_handler = DatabaseHandler()
+    db_handler.create_tables()  # Creates or upgrades the schema
     parser = BankStatementParser()
     file_handler = FileHandler(parser, db_handler)
     app = BankStatementApp(root, file_handler, parser, db_handler)
@@ -0,0 +1,88 @@
+"""Cold-start budget check for the API and the CLI.
+
+Each target runs in a fresh interpreter several times; the median wall
+time must stay under its budget and none of the heavy GUI/OCR/DataFrame
+modules may be imported along the way. Exits non-zero on a regression,
+so it can gate CI or a container build:
+
+    python import_benchmark.py
+    python import_benchmark.py --runs 9 --api-budget 0.8 --cli-budget 0.5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ('pandas', 'PIL', 'pytesseract', 'tkinter', 'PyQt5', 'pdfplumber')
+
+# Every target reports the heavy modules it dragged in on exit, on stderr
+REPORT_HEAVY_MODULES = f'''
+import atexit
+import sys
+atexit.register(lambda: print(
+    "heavy-modules:" + ",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules),
+    file=sys.stderr
+))
+'''
+
+API_TARGET = REPORT_HEAVY_MODULES + '''
+import api
+'''
+
+CLI_TARGET = REPORT_HEAVY_MODULES + '''
+import runpy
+sys.argv = ["main.py", "--help"]
+runpy.run_path("main.py", run_name="__main__")
+'''
+
+
+def time_target(code, runs):
+    """Run code in fresh interpreters; return (median seconds, heavy modules seen)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=here, capture_output=True, text=True
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"Target failed with exit code {result.returncode}:\n{result.stderr}")
+        for line in result.stderr.splitlines():
+            if line.startswith('heavy-modules:'):
+                loaded.update(name for name in line[len('heavy-modules:'):].split(',') if name)
+    return statistics.median(timings), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if cold start of the API or CLI exceeds its budget')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per target (default: 5)')
+    parser.add_argument('--api-budget', type=float, default=1.0,
+                        help='Median seconds allowed for "import api" (default: 1.0)')
+    parser.add_argument('--cli-budget', type=float, default=0.5,
+                        help='Median seconds allowed for "main.py --help" (default: 0.5)')
+    args = parser.parse_args()
+
+    targets = [
+        ('import api', API_TARGET, args.api_budget),
+        ('main.py --help', CLI_TARGET, args.cli_budget),
+    ]
+
+    failed = False
+    for name, code, budget in targets:
+        median, loaded = time_target(code, args.runs)
+        over_budget = median > budget
+        status = 'FAIL' if over_budget or loaded else 'OK'
+        print(f"{status:<6}{name:<16} {median * 1000:7.1f} ms (budget {budget * 1000:.0f} ms)")
+        if loaded:
+            print(f"      heavy modules imported at startup: {', '.join(loaded)}")
+        failed = failed or status == 'FAIL'
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from transaction import TransactionBatch
+
+logger = logging.getLogger(__name__)
+
+# Page and parse stages count up as the statement is read. The rows are
+# stored in one database transaction, so rows_inserted stays at 0 until the
+# insert commits and then jumps to the number of new rows.
+PROGRESS_STAGES = ('pages_extracted', 'pages_ocrd', 'rows_parsed', 'rows_inserted')
+
+
+def find_pdfs(directory, recursive=True):
+    """Return the PDF files under a directory, sorted by path."""
+    pdf_file_paths = []
+    for root, _, filenames in os.walk(directory):
+        pdf_file_paths.extend(
+            os.path.join(root, filename) for filename in filenames
+            if filename.lower().endswith('.pdf')
+        )
+        if not recursive:
+            break
+    return sorted(pdf_file_paths)
+
+
+def ingest_files(parser, db_handler, pdf_file_paths, filenames=None, workers=4, on_progress=None):
+    """Parse several PDFs concurrently and store them all in one database transaction.
+
+    Rows repeated across files (overlapping statements) are only inserted
+    once. Returns one summary dict per file, in input order; a file that
+    fails to parse is reported with its error and skipped. workers=None
+    parses one file per core at a time.
+    """
+    pdf_file_paths = list(pdf_file_paths)
+    workers = workers or os.cpu_count() or 1
+    filenames = filenames or [os.path.basename(path) for path in pdf_file_paths]
+
+    def parse(pdf_file_path):
+        try:
+            # Columnar, so a big batch import holds a fraction of the memory until it is inserted
+            transactions = TransactionBatch()
+            for transaction in parser.iter_pdf_transactions(pdf_file_path, on_progress=on_progress):
+                transactions.append(transaction)
+                if on_progress:
+                    on_progress('rows_parsed')
+            return transactions, None
+        except Exception as e:
+            logger.error("Error importing %s: %s", pdf_file_path, e)
+            return None, str(e)
+
+    if not pdf_file_paths:
+        return []
+
+    # Rows are stamped with the rules that categorized them, for later recategorization.
+    # Taken before parsing: if the rules change meanwhile, rows are stamped
+    # as older than they are and a recategorization simply re-checks them.
+    rules_version, rules = parser.rules_snapshot()
+
+    # Each file's page extraction and OCR still fans out over the parser's process pool
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pdf_file_paths)))) as executor:
+        parsed = list(executor.map(parse, pdf_file_paths))
+
+    groups = [transactions for transactions, error in parsed if error is None]
+    results = iter(db_handler.insert_transaction_groups(groups, rules_version, rules))
+
+    summaries = []
+    for filename, (transactions, error) in zip(filenames, parsed):
+        if error is not None:
+            summaries.append({'filename': filename, 'parsed': 0, 'inserted': 0, 'duplicates': 0, 'error': error})
+            continue
+        result = next(results)
+        if on_progress:
+            on_progress('rows_inserted', result['inserted'])
+        summaries.append({
+            'filename': filename,
+            'parsed': len(transactions),
+            'inserted': result['inserted'],
+            'duplicates': result['duplicates'],
+            'error': None,
+        })
+    return summaries
+
+
+class IngestJob:
+    """Status and per-stage progress of one queued import of one or more PDFs."""
+
+    def __init__(self, pdf_file_paths, filenames, delete_after=False):
+        self.id = uuid.uuid4().hex
+        self.pdf_file_paths = pdf_file_paths
+        self.filenames = filenames
+        self.delete_after = delete_after
+        self.status = 'queued'
+        self.progress = {stage: 0 for stage in PROGRESS_STAGES}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def advance(self, stage, count=1):
+        with self._lock:
+            self.progress[stage] += count
+
+    def start(self):
+        with self._lock:
+            self.status = 'running'
+            self.started = time.time()
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.status = 'failed' if error else 'done'
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'filenames': self.filenames,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'result': self.result,
+                'error': self.error,
+                'created': self.created,
+                'started': self.started,
+                'finished': self.finished,
+            }
+
+
+class IngestJobQueue:
+    """Bounded queue of PDF imports processed by a fixed pool of background threads.
+
+    submit() raises queue.Full once max_queued jobs are waiting, which
+    callers surface as backpressure instead of accepting unbounded work.
+    Finished jobs are remembered (up to keep_finished) so clients can
+    poll for their results.
+    """
+
+    def __init__(self, parser, db_handler, workers=2, max_queued=16, keep_finished=200, batch_workers=4):
+        self.parser = parser
+        self.db_handler = db_handler
+        # Files of one batch job that are parsed at the same time
+        self.batch_workers = batch_workers
+        self.keep_finished = keep_finished
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+        for index in range(workers):
+            threading.Thread(target=self._worker, name=f'ingest-worker-{index}', daemon=True).start()
+
+    def submit(self, pdf_file_path, filename=None, delete_after=False):
+        """Queue a PDF for import and return its job. Raises queue.Full when the queue is at capacity."""
+        return self.submit_batch([pdf_file_path], [filename] if filename else None, delete_after)
+
+    def submit_batch(self, pdf_file_paths, filenames=None, delete_after=False):
+        """Queue several PDFs as one job that is parsed concurrently and committed together."""
+        pdf_file_paths = list(pdf_file_paths)
+        filenames = filenames or [os.path.basename(path) for path in pdf_file_paths]
+        job = IngestJob(pdf_file_paths, filenames, delete_after)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        job.start()
+        try:
+            summaries = ingest_files(
+                self.parser, self.db_handler, job.pdf_file_paths, job.filenames,
+                workers=self.batch_workers, on_progress=job.advance
+            )
+            parsed = sum(summary['parsed'] for summary in summaries)
+            inserted = sum(summary['inserted'] for summary in summaries)
+            duplicates = sum(summary['duplicates'] for summary in summaries)
+            failed = [summary for summary in summaries if summary['error']]
+
+            if len(summaries) == 1 and failed:
+                job.finish(error=failed[0]['error'])
+                return
+
+            job.finish(result={
+                'message': (
+                    f'Successfully parsed {parsed} transactions '
+                    f'({inserted} new, {duplicates} already imported)'
+                    + (f'; {len(failed)} of {len(summaries)} files failed' if failed else '')
+                ),
+                'parsed': parsed,
+                'inserted': inserted,
+                'duplicates': duplicates,
+                'files': summaries,
+            })
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job.id)
+            job.finish(error=str(e))
+        finally:
+            if job.delete_after:
+                for pdf_file_path in job.pdf_file_paths:
+                    if os.path.exists(pdf_file_path):
+                        os.unlink(pdf_file_path)
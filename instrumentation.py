@@ -0,0 +1,208 @@
+"""Logging setup and in-process metrics for every stage of an import.
+
+Modules log through `logging.getLogger(__name__)`; configure_logging()
+sets the level and format once per process (DUCKLE_LOG_LEVEL, and
+DUCKLE_LOG_FORMAT=json for one JSON object per line).
+
+Stages are timed with `with timed('parse_page'):` and counted with
+increment(); the API serves everything at /api/metrics in the Prometheus
+text format. With tracemalloc enabled (DUCKLE_TRACEMALLOC=1 or
+enable_tracemalloc()) each stage also records its peak Python memory;
+peaks are approximate when stages overlap in different threads.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'duckle_'
+
+# Upper bounds in seconds; covers a single categorization up to a large OCR job
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name: (type, help); recording an unlisted metric is a KeyError
+METRICS = {
+    'stage_seconds': ('histogram', 'Seconds spent in each processing stage.'),
+    'stage_errors_total': ('counter', 'Processing stages that raised an exception.'),
+    'stage_peak_bytes': ('gauge', 'Largest tracemalloc peak seen in each stage, in bytes.'),
+    'pages_extracted_total': ('counter', 'PDF pages whose text layer was extracted.'),
+    'pages_ocrd_total': ('counter', 'PDF pages run through OCR.'),
+    'rows_parsed_total': ('counter', 'Transactions parsed from statements.'),
+    'rows_categorized_total': ('counter', 'Transactions categorized in batches.'),
+    'rows_written_total': ('counter', 'Transaction rows inserted or updated, by operation.'),
+    'rows_duplicate_total': ('counter', 'Parsed transactions skipped as already imported.'),
+    'http_requests_total': ('counter', 'API requests handled, by endpoint, method and status.'),
+    'http_request_seconds': ('histogram', 'Seconds spent in API handlers, by endpoint.'),
+}
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed with `extra=`."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, json_format=None):
+    """Send log records to stderr at the given level (default: DUCKLE_LOG_LEVEL or INFO).
+
+    Does nothing if logging was already configured, e.g. by an embedding
+    WSGI server.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    level = level or os.environ.get('DUCKLE_LOG_LEVEL', 'INFO')
+    if json_format is None:
+        json_format = os.environ.get('DUCKLE_LOG_FORMAT', '').lower() == 'json'
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    if os.environ.get('DUCKLE_TRACEMALLOC') == '1':
+        enable_tracemalloc()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+class Metrics:
+    """Thread-safe counters, histograms and gauges keyed by metric name and labels."""
+
+    def __init__(self, definitions=METRICS, buckets=HISTOGRAM_BUCKETS):
+        self.definitions = definitions
+        self.buckets = buckets
+        self._values = {name: {} for name in definitions}
+        self._lock = threading.Lock()
+
+    def _series(self, name, labels):
+        # Caller holds the lock
+        return self._values[name], tuple(sorted(labels.items()))
+
+    def increment(self, name, amount=1, **labels):
+        with self._lock:
+            series, key = self._series(name, labels)
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Add one observation to a histogram."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def set_max(self, name, value, **labels):
+        """Raise a gauge to value if it is the largest seen."""
+        with self._lock:
+            series, key = self._series(name, labels)
+            if value > series.get(key, float('-inf')):
+                series[key] = value
+
+    def reset(self):
+        with self._lock:
+            self._values = {name: {} for name in self.definitions}
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self.definitions.items():
+                full_name = METRIC_PREFIX + name
+                lines.append(f'# HELP {full_name} {help_text}')
+                lines.append(f'# TYPE {full_name} {kind}')
+                for labels, value in sorted(self._values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f'{full_name}{_label_text(labels)} {value}')
+                        continue
+                    for bound, count in zip(self.buckets, value['buckets']):
+                        lines.append(f'{full_name}_bucket{_label_text(labels + (("le", bound),))} {count}')
+                    lines.append(f'{full_name}_bucket{_label_text(labels + (("le", "+Inf"),))} {value["count"]}')
+                    lines.append(f'{full_name}_sum{_label_text(labels)} {value["sum"]}')
+                    lines.append(f'{full_name}_count{_label_text(labels)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def increment(name, amount=1, **labels):
+    metrics.increment(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    metrics.observe(name, value, **labels)
+
+
+def enable_tracemalloc():
+    """Start recording per-stage peak memory. Slows Python allocations down noticeably."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def timed(stage):
+    """Time the block as one observation of stage_seconds; exceptions count as stage errors."""
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.increment('stage_errors_total', stage=stage)
+        raise
+    finally:
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+        if tracing and tracemalloc.is_tracing():
+            metrics.set_max('stage_peak_bytes', tracemalloc.get_traced_memory()[1] - start_memory, stage=stage)
+
+
+def timed_iter(stage, iterable):
+    """Yield from iterable, timing how long each item took to produce as one observation."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        except Exception:
+            metrics.increment('stage_errors_total', stage=stage)
+            raise
+        metrics.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+        yield item
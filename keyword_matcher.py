@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds the highest-priority keyword in one pass.
+
+    Keywords are given in priority order; a lower index wins no matter where
+    in the text the keyword appears, matching the category-then-keyword
+    order the parser has always used.
+    """
+
+    def __init__(self, keywords):
+        # keywords: iterable of (keyword, value) pairs in priority order
+        self.values = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]  # Lowest priority ending at each state, including via fail links
+
+        for priority, (keyword, value) in enumerate(keywords):
+            self.values.append(value)
+            state = 0
+            for char in keyword.lower():
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                state = next_state
+            if self.best[state] is None or priority < self.best[state]:
+                self.best[state] = priority
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+
+                # Fold the fail state's best match in so a scan never walks the fail chain
+                inherited = self.best[self.fail[next_state]]
+                if inherited is not None and (self.best[next_state] is None or inherited < self.best[next_state]):
+                    self.best[next_state] = inherited
+
+    def first_match(self, text):
+        """Return the value of the highest-priority keyword found in text, or None."""
+        goto = self.goto
+        fail = self.fail
+        best_at = self.best
+        best = best_at[0]  # An empty keyword matches everything
+
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = best_at[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+
+        return None if best is None else self.values[best]
@@ -1,37 +1,213 @@
-from tkinter import Tk
+"""Duckle entry point: desktop GUIs, headless batch jobs and the web API.
+
+Serving the API in production
+-----------------------------
+`python main.py --serve` runs the Flask API under waitress, a pure-Python
+multi-threaded WSGI server (`pip install waitress`), instead of Flask's
+single-user development server:
+
+    python main.py --serve --host 0.0.0.0 --port 5000 --threads 8 --db /data/transactions.db
+
+Each server thread gets its own pooled read-only SQLite connection and all
+writes share one writer connection, so --threads also bounds how many
+connections the process opens (threads + 1). The same settings can be
+passed to any WSGI server through the environment; the app comes from
+api.init_app(), which also creates the schema, e.g.
+
+    DUCKLE_DB=/data/transactions.db DUCKLE_THREADS=8 waitress-serve --threads 8 --call api:init_app
+
+Stage timings and counters are served at /api/metrics for Prometheus to
+scrape. Logs go to stderr; DUCKLE_LOG_LEVEL sets the level,
+DUCKLE_LOG_FORMAT=json writes one JSON object per line and
+DUCKLE_TRACEMALLOC=1 adds per-stage peak memory to the metrics.
+"""
 import argparse
+import csv
+import logging
+import os
 import sys
 import subprocess
 import threading
+import time
 import webbrowser
 from database_handler import DatabaseHandler
 from duckle_parser import BankStatementParser
-from file_handler import FileHandler
+from instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ['ID', 'Date', 'Withdrawal/Deposit', 'Transaction Type',
+                  'Details', 'Amount', 'Balance', 'Category', 'Subcategory']
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5000
+DEFAULT_THREADS = 8
+
+def configure_api(db_name=None, threads=DEFAULT_THREADS):
+    """Point the API at a database and size its connection pool; call before importing api."""
+    if db_name:
+        os.environ['DUCKLE_DB'] = db_name
+    os.environ['DUCKLE_THREADS'] = str(threads)
+
+def run_flask_server(host=DEFAULT_HOST, port=DEFAULT_PORT, threads=DEFAULT_THREADS):
+    """Serve the API with waitress, or Flask's development server if waitress isn't installed."""
+    from api import init_app
+    app = init_app()
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("waitress is not installed; using Flask's development server")
+        app.run(debug=False, host=host, port=port, threaded=True)
+        return
+    serve(app, host=host, port=port, threads=threads)
+
+def run_production_server(host, port, threads):
+    """Serve the API with waitress until interrupted; refuses to fall back to the dev server."""
+    try:
+        from waitress import serve
+    except ImportError:
+        print("--serve needs waitress: pip install waitress")
+        return 1
+
+    from api import init_app
+    app = init_app()
+    print(f"Serving Duckle API on http://{host}:{port} with {threads} threads")
+    serve(app, host=host, port=port, threads=threads)
+    return 0
+
+def run_ingest(paths, workers, db_handler):
+    """Import PDFs and directories of PDFs without any GUI, then print throughput."""
+    from ingest_jobs import IngestJob, find_pdfs, ingest_files
 
-def run_flask_server():
-    """Run the Flask server in a separate process."""
-    from api import app
-    app.run(debug=False, port=5000)
+    pdf_file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_file_paths.extend(find_pdfs(path))
+        else:
+            pdf_file_paths.append(path)
+
+    if not pdf_file_paths:
+        print("No PDF files found.")
+        return 1
+
+    parser_instance = BankStatementParser(workers=workers)
+    # An IngestJob doubles as a thread-safe progress counter for the stages
+    progress = IngestJob(pdf_file_paths, [os.path.basename(path) for path in pdf_file_paths])
+    total_bytes = sum(os.path.getsize(path) for path in pdf_file_paths if os.path.exists(path))
+
+    start = time.perf_counter()
+    try:
+        summaries = ingest_files(parser_instance, db_handler, pdf_file_paths,
+                                 workers=workers, on_progress=progress.advance)
+    finally:
+        parser_instance.extractor.close()
+    elapsed = time.perf_counter() - start
+
+    for path, summary in zip(pdf_file_paths, summaries):
+        if summary['error']:
+            print(f"FAILED  {path}: {summary['error']}")
+        else:
+            print(f"OK      {path}: {summary['parsed']} parsed, "
+                  f"{summary['inserted']} new, {summary['duplicates']} duplicates")
+
+    counts = progress.to_dict()['progress']
+    rate = elapsed or 1e-9
+    print(f"\n{len(pdf_file_paths)} files, {counts['pages_extracted']} pages "
+          f"({counts['pages_ocrd']} OCR'd), {counts['rows_parsed']} rows parsed, "
+          f"{counts['rows_inserted']} inserted in {elapsed:.2f}s")
+    print(f"Throughput: {len(pdf_file_paths) / rate:.2f} files/s, {counts['pages_extracted'] / rate:.1f} pages/s, "
+          f"{counts['rows_parsed'] / rate:.0f} rows/s, {total_bytes / (1024 * 1024) / rate:.2f} MiB/s")
+
+    return 1 if any(summary['error'] for summary in summaries) else 0
+
+def run_export(path, db_handler):
+    """Write every stored transaction to a CSV file, streaming from the database."""
+    start = time.perf_counter()
+    rows = 0
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in db_handler.iter_transaction_batches(sort='id'):
+            writer.writerows(tuple(row) for row in batch)
+            rows += len(batch)
+    elapsed = time.perf_counter() - start
+
+    print(f"Exported {rows} transactions to {path} in {elapsed:.2f}s "
+          f"({rows / (elapsed or 1e-9):.0f} rows/s)")
+    return 0
+
+def run_recategorize(include_unknown, db_handler):
+    """Re-apply the current category rules to stored transactions."""
+    from recategorizer import recategorize
+
+    recategorize(BankStatementParser(workers=1, use_cache=False), db_handler, include_unknown)
+    return 0
 
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Duckle Bank Statement Parser')
     parser.add_argument('--gui', choices=['tkinter', 'pyqt5', 'react'], default='tkinter',
                         help='Choose GUI: tkinter (default), pyqt5, or react')
+    parser.add_argument('--ingest', nargs='+', metavar='PATH',
+                        help='Import PDFs (or directories of PDFs) without a GUI and exit')
+    parser.add_argument('--export', metavar='CSV',
+                        help='Export all transactions to a CSV file and exit')
+    parser.add_argument('--recategorize', action='store_true',
+                        help='Re-apply the current category rules to stored transactions and exit')
+    parser.add_argument('--include-unknown', action='store_true',
+                        help='With --recategorize, also update rows imported before category sources were tracked')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes for PDF extraction and OCR (default: one per core)')
+    parser.add_argument('--db', default=None,
+                        help='SQLite database to use (default: transactions.db)')
+    parser.add_argument('--serve', action='store_true',
+                        help='Serve the web API with a multi-threaded production server (needs waitress)')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'Address for --serve and the react GUI to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port for --serve and the react GUI (default: {DEFAULT_PORT})')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help=f'Server threads and pooled read connections (default: {DEFAULT_THREADS})')
+    parser.add_argument('--log-level', default=None, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Diagnostics written to stderr (default: DUCKLE_LOG_LEVEL or INFO)')
     args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    if args.serve:
+        configure_api(args.db, args.threads)
+        sys.exit(run_production_server(args.host, args.port, args.threads))
 
-    # Initialize the parser, database handler, and file handler
-    parser_instance = BankStatementParser()
     db_handler = DatabaseHandler()
+    if args.db:
+        db_handler.db_name = args.db
+    db_handler.create_tables()  # Creates or upgrades the schema
+
+    # Headless modes never import a GUI toolkit, so they run under cron or on servers
+    if args.ingest or args.recategorize or args.export:
+        status = 0
+        if args.ingest:
+            status = run_ingest(args.ingest, args.workers, db_handler)
+        if args.recategorize:
+            status = run_recategorize(args.include_unknown, db_handler) or status
+        if args.export:
+            status = run_export(args.export, db_handler) or status
+        sys.exit(status)
+
+    # Initialize the parser and file handler
+    from file_handler import FileHandler
+    parser_instance = BankStatementParser(workers=args.workers)
     file_handler = FileHandler(parser_instance, db_handler)
 
     if args.gui == 'react':
         # Start Flask server in a separate thread
-        server_thread = threading.Thread(target=run_flask_server, daemon=True)
+        configure_api(args.db, args.threads)
+        server_thread = threading.Thread(
+            target=run_flask_server, args=(args.host, args.port, args.threads), daemon=True
+        )
         server_thread.start()
 
         # Open web browser
-        webbrowser.open('http://localhost:5000')
+        webbrowser.open(f'http://localhost:{args.port}')
 
         print("React GUI started. Press Ctrl+C to exit.")
         try:
@@ -46,6 +222,7 @@ def main():
 
     else:
         # Start Tkinter GUI
+        from tkinter import Tk
         from gui import BankStatementApp
         root = Tk()
         app = BankStatementApp(root, file_handler, parser_instance, db_handler)
@@ -0,0 +1,332 @@
+"""Versioned schema migrations for the transactions database.
+
+The schema version lives in SQLite's user_version pragma. Each step runs in
+its own transaction together with the version bump, so an interrupted
+upgrade resumes from the last completed step. Steps must only ever be
+appended; never edit or reorder one that has shipped.
+
+Run directly to upgrade database files in place:
+
+    python migrations.py transactions.db bank_statements.db
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def create_transactions_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            withdrawal_or_deposit TEXT,
+            transaction_type TEXT,
+            details TEXT,
+            amount REAL,
+            balance REAL,
+            category TEXT,
+            subcategory TEXT
+        )
+    ''')
+
+
+# Frozen copy of database_handler.transaction_key as it was when add_dedup_key shipped;
+# later changes to the app's key must not change what this step backfills
+_DEDUP_KEY_DETAILS_PATTERN = re.compile(r'[^a-z0-9]+')
+
+
+def _dedup_key_v2(date, amount, balance, details):
+    normalized_details = _DEDUP_KEY_DETAILS_PATTERN.sub('', details.lower())
+    details_hash = hashlib.sha1(normalized_details.encode()).hexdigest()[:16]
+    return f"{date}|{_dedup_key_number(amount)}|{_dedup_key_number(balance)}|{details_hash}"
+
+
+def _dedup_key_number(value):
+    # Legacy rows can hold a NULL amount or balance
+    return '' if value is None else f"{float(value):.2f}"
+
+
+def add_dedup_key(cursor):
+    """Adds the natural-key column used to skip rows that were already imported."""
+    cursor.execute('PRAGMA table_info(transactions)')
+    if 'dedup_key' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE transactions ADD COLUMN dedup_key TEXT')
+
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_dedup_key
+        ON transactions (dedup_key)
+    ''')
+
+    # Backfill keys for older rows, oldest first. A row whose key is already
+    # taken was imported twice; keep the lowest id and delete the others.
+    cursor.execute('SELECT id, date, amount, balance, details FROM transactions WHERE dedup_key IS NULL ORDER BY id')
+    removed = 0
+    for transaction_id, date, amount, balance, details in cursor.fetchall():
+        key = _dedup_key_v2(date, amount, balance, details or "")
+        cursor.execute('SELECT id FROM transactions WHERE dedup_key = ?', (key,))
+        existing = cursor.fetchone()
+        if existing is not None:
+            removed += 1
+            if existing[0] < transaction_id:
+                cursor.execute('DELETE FROM transactions WHERE id = ?', (transaction_id,))
+                continue
+            cursor.execute('DELETE FROM transactions WHERE id = ?', (existing[0],))
+        cursor.execute('UPDATE transactions SET dedup_key = ? WHERE id = ?', (key, transaction_id))
+
+    if removed:
+        logger.warning("Removed %d duplicate transactions while adding dedup keys", removed)
+
+
+def add_query_indexes(cursor):
+    """Indexes for filtering and sorting; every index carries the rowid, so (date, id) is covered."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_category
+        ON transactions (category, subcategory)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_amount ON transactions (amount)')
+
+
+def add_sort_indexes(cursor):
+    """An index per sortable column, so ORDER BY column, id reads an index instead of sorting the table.
+
+    (category, subcategory) can't serve ORDER BY category, id, so category
+    gets its own index too.
+    """
+    for column in ('category', 'subcategory', 'withdrawal_or_deposit', 'transaction_type', 'details', 'balance'):
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_transactions_sort_{column} ON transactions ({column})')
+
+
+def add_category_provenance(cursor):
+    """Records who set each row's category and which rule set did it.
+
+    Rows imported before this step can't be told apart from hand-edited
+    ones, so their category_source stays NULL (unknown).
+    """
+    cursor.execute('ALTER TABLE transactions ADD COLUMN category_source TEXT')  # 'rule' or 'manual'
+    cursor.execute('ALTER TABLE transactions ADD COLUMN rules_version TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_rules_version ON transactions (rules_version)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_rule_versions (
+            version TEXT PRIMARY KEY,
+            rules TEXT NOT NULL,
+            created REAL
+        )
+    ''')
+
+
+def add_details_search(cursor):
+    """Full-text index over details and transaction type, kept in sync by triggers."""
+    # External content: the index stores only tokens, the text stays in transactions
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            details, transaction_type,
+            content='transactions', content_rowid='id'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts (rowid, details, transaction_type)
+            VALUES (new.id, new.details, new.transaction_type);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, details, transaction_type)
+            VALUES ('delete', old.id, old.details, old.transaction_type);
+        END
+    ''')
+    # Category edits don't touch the indexed columns, so they skip this trigger
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+        AFTER UPDATE OF details, transaction_type ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, details, transaction_type)
+            VALUES ('delete', old.id, old.details, old.transaction_type);
+            INSERT INTO transactions_fts (rowid, details, transaction_type)
+            VALUES (new.id, new.details, new.transaction_type);
+        END
+    ''')
+    cursor.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+
+def _rollup_month_sql(row):
+    # Rows without a date are grouped under an empty month
+    return f"IFNULL(substr({row}.date, 1, 7), '')"
+
+
+def _rollup_add_sql(row):
+    # Adds one transaction (the trigger's new/old row) to its monthly rollup
+    amount = f'IFNULL({row}.amount, 0)'
+    return f'''
+        INSERT INTO monthly_rollups (
+            month, category, subcategory, direction, total, count, min_amount, max_amount
+        ) VALUES (
+            {_rollup_month_sql(row)}, IFNULL({row}.category, ''), IFNULL({row}.subcategory, ''),
+            IFNULL({row}.withdrawal_or_deposit, ''), {amount}, 1, {amount}, {amount}
+        )
+        ON CONFLICT (month, category, subcategory, direction) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + 1,
+            min_amount = MIN(min_amount, excluded.min_amount),
+            max_amount = MAX(max_amount, excluded.max_amount);
+    '''
+
+
+def _rollup_remove_sql(row):
+    # Takes one transaction back out; min/max are only recomputed when it was the extreme
+    amount = f'IFNULL({row}.amount, 0)'
+    month = _rollup_month_sql(row)
+    group = f'''
+        month = {month} AND category = IFNULL({row}.category, '')
+        AND subcategory = IFNULL({row}.subcategory, '') AND direction = IFNULL({row}.withdrawal_or_deposit, '')
+    '''
+    members = f'''
+        FROM transactions WHERE (date >= {month} AND date < {month} || '~' OR date IS NULL)
+        AND IFNULL(substr(date, 1, 7), '') = {month}
+        AND category IS {row}.category AND subcategory IS {row}.subcategory
+        AND withdrawal_or_deposit IS {row}.withdrawal_or_deposit
+    '''
+    return f'''
+        UPDATE monthly_rollups SET total = total - {amount}, count = count - 1 WHERE {group};
+        DELETE FROM monthly_rollups WHERE {group} AND count <= 0;
+        UPDATE monthly_rollups SET
+            min_amount = (SELECT MIN(IFNULL(amount, 0)) {members}),
+            max_amount = (SELECT MAX(IFNULL(amount, 0)) {members})
+        WHERE {group} AND ({amount} <= min_amount OR {amount} >= max_amount);
+    '''
+
+
+def add_monthly_rollups(cursor):
+    """Per (month, category, subcategory, direction) totals, kept current by triggers.
+
+    Legacy rows can lack values: a NULL amount counts as 0 and a NULL date
+    is grouped under an empty month.
+
+    The triggers run inside whatever statement changes transactions, so the
+    rollups commit or roll back together with the rows they summarize.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_rollups (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            subcategory TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            min_amount REAL,
+            max_amount REAL,
+            PRIMARY KEY (month, category, subcategory, direction)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_rollups_insert AFTER INSERT ON transactions BEGIN
+            {_rollup_add_sql('new')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_rollups_delete AFTER DELETE ON transactions BEGIN
+            {_rollup_remove_sql('old')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS monthly_rollups_update
+        AFTER UPDATE OF date, amount, category, subcategory, withdrawal_or_deposit ON transactions BEGIN
+            {_rollup_remove_sql('old')}
+            {_rollup_add_sql('new')}
+        END
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO monthly_rollups (
+            month, category, subcategory, direction, total, count, min_amount, max_amount
+        )
+        SELECT IFNULL(substr(date, 1, 7), ''), IFNULL(category, ''), IFNULL(subcategory, ''),
+               IFNULL(withdrawal_or_deposit, ''), SUM(IFNULL(amount, 0)), COUNT(*),
+               MIN(IFNULL(amount, 0)), MAX(IFNULL(amount, 0))
+        FROM transactions
+        GROUP BY 1, 2, 3, 4
+    ''')
+
+
+def add_change_counter(cursor):
+    """A counter bumped by every change to transactions, used as the API's ETag."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            modified REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO change_counters (name, version, modified)
+        VALUES ('transactions', 1, (julianday('now') - 2440587.5) * 86400.0)
+    ''')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS change_counters_{event.lower()} AFTER {event} ON transactions BEGIN
+                UPDATE change_counters
+                SET version = version + 1, modified = (julianday('now') - 2440587.5) * 86400.0
+                WHERE name = 'transactions';
+            END
+        ''')
+
+
+# Ordered upgrade steps; step N brings the schema to version N
+MIGRATIONS = [
+    create_transactions_table,
+    add_dedup_key,
+    add_query_indexes,
+    add_sort_indexes,
+    add_category_provenance,
+    add_details_search,
+    add_monthly_rollups,
+    add_change_counter,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Applies every pending migration to an open connection. Returns the resulting version."""
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this build supports ({SCHEMA_VERSION})"
+        )
+
+    for target_version, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info("Applying migration %d: %s", target_version, step.__name__)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            step(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {target_version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return get_schema_version(conn)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    db_names = sys.argv[1:] or ['transactions.db']
+    for db_name in db_names:
+        conn = sqlite3.connect(db_name)
+        try:
+            before = get_schema_version(conn)
+            after = migrate(conn)
+            print(f"{db_name}: schema version {before} -> {after}")
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
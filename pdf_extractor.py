@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+def extract_page_range(pdf_file_path, start, stop):
+    """Extract the text of pages [start, stop) from a PDF.
+
+    Runs inside worker processes, so it reopens the file rather than
+    receiving pdfplumber objects (which cannot be pickled).
+    """
+    import pdfplumber  # Pulls in pdfminer and PIL, so only load it once a PDF is opened
+
+    with pdfplumber.open(pdf_file_path) as pdf:
+        return [page_text(page) for page in pdf.pages[start:stop]]
+
+
+def page_text(page):
+    text = page.extract_text() or ""
+    # Drop pdfplumber's cached layout objects once the text is out
+    page.flush_cache()
+    return text
+
+
+class PdfExtractor:
+    """Extracts PDF page text across a pool of worker processes.
+
+    Pages are split into fixed-size chunks and farmed out to the pool;
+    results are always reassembled in page order. With a single worker
+    everything runs in-process.
+    """
+
+    def __init__(self, workers=None, pages_per_task=4):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.pages_per_task = pages_per_task
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Several ingest threads can share one extractor
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _page_ranges(self, page_count):
+        return [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+
+    def iter_page_texts(self, pdf_file_path):
+        """Yield each page's text in order, extracting pages in parallel."""
+        import pdfplumber
+
+        with pdfplumber.open(pdf_file_path) as pdf:
+            ranges = self._page_ranges(len(pdf.pages))
+            if self.workers == 1 or len(ranges) <= 1:
+                # In-process there is nothing to gain from reopening the file per chunk
+                for page in pdf.pages:
+                    yield page_text(page)
+                return
+
+        # map() keeps every chunk in flight but hands results back in order
+        chunks = self._get_executor().map(
+            extract_page_range,
+            [pdf_file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [stop for _, stop in ranges],
+        )
+        for page_texts in chunks:
+            yield from page_texts
+
+    def submit(self, function, *args):
+        """Run a picklable function on the pool, or inline when only one worker is configured."""
+        if self.workers > 1:
+            return self._get_executor().submit(function, *args)
+
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -1,11 +1,14 @@
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QComboBox, QTreeWidget, QTreeWidgetItem,
-                             QScrollArea, QLineEdit, QMessageBox, QFileDialog, QStyleFactory)
+                             QScrollArea, QLineEdit, QMessageBox, QFileDialog, QStyleFactory,
+                             QAbstractItemView)
 from PyQt5.QtCore import Qt, QSize, QDateTime
 from PyQt5.QtGui import QIcon, QFont, QPalette, QColor, QPixmap
 import sys
-import pandas as pd
 from datetime import datetime
+from transaction import Transaction, TransactionBatch, as_transaction, format_cents
+
+SEARCH_RESULT_LIMIT = 500
 
 class DarkTheme:
     # Color scheme remains the same
@@ -228,6 +231,21 @@ class BudgetApp(QMainWindow):
 
         layout.addLayout(category_layout)
 
+        # Search section
+        search_layout = QHBoxLayout()
+
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Search details, "a phrase" or prefix*')
+        self.search_input.returnPressed.connect(self.search_transactions)
+        self.search_btn = QPushButton('Search')
+        self.search_btn.clicked.connect(self.search_transactions)
+
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_btn)
+        search_layout.addStretch()
+
+        layout.addLayout(search_layout)
+
         # Transaction tree
         self.tree = QTreeWidget()
         self.tree.setHeaderLabels([
@@ -236,6 +254,8 @@ class BudgetApp(QMainWindow):
         ])
         self.tree.setAlternatingRowColors(True)
         self.tree.setColumnCount(8)
+        # Shift/Ctrl-click to select many rows for one category change
+        self.tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
         # Enable sorting
         self.tree.setSortingEnabled(True)
@@ -264,63 +284,113 @@ class BudgetApp(QMainWindow):
             self.sort_order = Qt.AscendingOrder
             self.current_sort_column = column
 
+        self.tree.setSortingEnabled(True)  # Search results are shown unsorted
         self.tree.sortItems(column, self.sort_order)
 
     def load_pdf(self):
         """Handle PDF loading and transaction parsing."""
-        text = self.file_handler.load_pdf()
-
-        if not text:
-            QMessageBox.critical(self, "Error", "No valid text was extracted from the PDF.")
+        transactions = self.file_handler.load_pdf_transactions()
+        if transactions is None:
             return
 
-        transactions = self.parser.parse_bank_statement_with_year(text)
+        self.tree.clear()
+        # Sorting on every insert is quadratic, so sort once at the end
+        self.tree.setSortingEnabled(False)
+        parsed = TransactionBatch()
+        items = []
+        # The rules the rows are categorized with, read before parsing starts
+        rules_version, rules = self.parser.rules_snapshot()
+
+        try:
+            # Rows are shown page by page as the parser yields them
+            for transaction in transactions:
+                items.append(self.add_tree_item(transaction))
+                parsed.append(transaction)
+                if len(parsed) % 50 == 0:
+                    QApplication.processEvents()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error reading PDF: {str(e)}")
+            return
+        finally:
+            self.tree.setSortingEnabled(True)
+            self.tree.sortItems(self.current_sort_column, self.sort_order)
 
-        if not transactions:
+        if not parsed:
             QMessageBox.warning(self, "Warning", "No transactions were found in the PDF.")
             return
 
-        # Insert transactions into database
-        for transaction in transactions:
-            self.db_handler.insert_transaction(transaction)
-
-        self.populate_tree(transactions)
+        # Store the whole statement in a single database transaction
+        result = self.db_handler.insert_transactions(parsed, rules_version, rules)
+        # Includes rows that were already imported, so they can be recategorized too
+        for item, transaction_id in zip(items, self.db_handler.find_transaction_ids(parsed)):
+            item.setData(0, Qt.UserRole, transaction_id)
+
+        if result['duplicates']:
+            QMessageBox.information(
+                self, "Import Complete",
+                f"{result['inserted']} new transactions imported, "
+                f"{result['duplicates']} were already in the database."
+            )
 
     def populate_tree(self, transactions):
         """Display transactions in the tree widget."""
         self.tree.clear()
 
         for transaction in transactions:
-            item = SortableTreeWidgetItem(self.tree)
-
-            # Format amount and balance with 2 decimal places
-            amount = f"{transaction[4]:.2f}"
-            balance = f"{transaction[5]:.2f}"
-
-            # Set values for each column
-            values = [
-                transaction[0],  # Date
-                transaction[1],  # Type
-                transaction[2],  # Transaction Type
-                transaction[3],  # Details
-                amount,         # Amount
-                balance,        # Balance
-                transaction[6], # Category
-                transaction[7]  # Subcategory
-            ]
-
-            for i, value in enumerate(values):
-                item.setText(i, str(value))
-
-            # Color coding for deposits/withdrawals
-            if transaction[1] == "Deposit":
-                item.setForeground(4, QColor(DarkTheme.ACCENT_GREEN))
-            else:
-                item.setForeground(4, QColor(DarkTheme.ACCENT_ORANGE))
+            self.add_tree_item(transaction)
 
         # Sort by current column and order
         self.tree.sortItems(self.current_sort_column, self.sort_order)
 
+    def add_tree_item(self, transaction, transaction_id=None):
+        """Append a single transaction to the tree widget and return its item."""
+        item = SortableTreeWidgetItem(self.tree)
+        if transaction_id is not None:
+            item.setData(0, Qt.UserRole, transaction_id)  # Database id, for category changes
+
+        transaction = as_transaction(transaction)
+
+        # Set values for each column; cents format exactly to 2 decimal places
+        values = [
+            transaction.date,
+            transaction.withdrawal_or_deposit,
+            transaction.transaction_type,
+            transaction.details,
+            format_cents(transaction.amount_cents),
+            format_cents(transaction.balance_cents),
+            transaction.category,
+            transaction.subcategory
+        ]
+
+        for i, value in enumerate(values):
+            item.setText(i, str(value))
+
+        # Color coding for deposits/withdrawals
+        if transaction.withdrawal_or_deposit == "Deposit":
+            item.setForeground(4, QColor(DarkTheme.ACCENT_GREEN))
+        else:
+            item.setForeground(4, QColor(DarkTheme.ACCENT_ORANGE))
+
+        return item
+
+    def search_transactions(self):
+        """Show stored transactions matching the search box; an empty search shows everything."""
+        query = self.search_input.text().strip()
+        try:
+            if query:
+                transactions, _ = self.db_handler.search_transactions(query, limit=SEARCH_RESULT_LIMIT)
+            else:
+                transactions = self.db_handler.fetch_all_transactions()
+        except ValueError as e:
+            QMessageBox.warning(self, "Search", str(e))
+            return
+
+        # Keep the ranked order until the user sorts by a column (see handle_sort)
+        self.tree.setSortingEnabled(False)
+        self.tree.clear()
+        for transaction in transactions:
+            self.add_tree_item(Transaction.from_row(transaction[1:]), transaction[0])
+
     def set_category(self):
         """Set category for selected transactions."""
         selected_items = self.tree.selectedItems()
@@ -329,10 +399,20 @@ class BudgetApp(QMainWindow):
             return
 
         category = self.category_combo.currentText()
+        if " -> " in category:
+            main_category, subcategory = category.split(" -> ")
+        else:
+            main_category = subcategory = category
+
+        # Every selected row is updated by one statement in one transaction
+        ids = [item.data(0, Qt.UserRole) for item in selected_items]
+        ids = [transaction_id for transaction_id in ids if transaction_id is not None]
+        if ids:
+            self.db_handler.bulk_update_category(main_category, subcategory, ids=ids)
 
         for item in selected_items:
-            item.setText(6, category)  # Category column
-            item.setText(7, category)  # Subcategory column
+            item.setText(6, main_category)  # Category column
+            item.setText(7, subcategory)  # Subcategory column
 
     def add_new_category(self):
         """Add a new category to the system."""
@@ -341,11 +421,10 @@ class BudgetApp(QMainWindow):
             QMessageBox.warning(self, "Invalid", "Please enter a category name.")
             return
 
-        if new_category in self.parser.categorization_rules:
+        if not self.parser.add_category(new_category):
             QMessageBox.warning(self, "Invalid", "Category already exists.")
             return
 
-        self.parser.categorization_rules[new_category] = []
         self.category_combo.addItem(new_category)
         self.new_category_input.clear()
         QMessageBox.information(self, "Success", f"Category '{new_category}' added!")
@@ -363,6 +442,7 @@ class BudgetApp(QMainWindow):
                 row = [item.text(j) for j in range(self.tree.columnCount())]
                 data.append(row)
 
+            import pandas as pd
             df = pd.DataFrame(data, columns=[
                 self.tree.headerItem().text(i)
                 for i in range(self.tree.columnCount())
@@ -395,6 +475,7 @@ def main():
 
     parser = BankStatementParser()
     db_handler = DatabaseHandler()
+    db_handler.create_tables()  # Creates or upgrades the schema
     file_handler = FileHandler(parser, db_handler)
 
     # Create and show the main window
@@ -0,0 +1,89 @@
+"""Re-applies the current category rules to stored transactions.
+
+Every rule-categorized row remembers the fingerprint of the rules that
+categorized it, and every fingerprint's rule set is saved in the database.
+After a rule change only rows containing a keyword whose outcome could
+differ are re-checked; the rest are simply stamped with the new
+fingerprint. Hand-set categories are never touched.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def rule_pairs(rules):
+    """Return the distinct (keyword, category) pairs of a rule set in priority order."""
+    pairs = []
+    seen = set()
+    for category, keywords in rules.items():
+        for keyword in keywords:
+            pair = (keyword.lower(), category)
+            if pair not in seen:
+                seen.add(pair)
+                pairs.append(pair)
+    return pairs
+
+
+def changed_keywords(old_rules, new_rules):
+    """Return the keywords whose matches may be categorized differently under new_rules.
+
+    A row whose details contain none of these gets the same category from
+    both rule sets. If the surviving keywords were reordered, every keyword
+    is returned.
+    """
+    old_pairs = rule_pairs(old_rules)
+    new_pairs = rule_pairs(new_rules)
+    old_set = set(old_pairs)
+    new_set = set(new_pairs)
+
+    # Shared keywords must keep their relative priority for the shortcut to hold
+    if [pair for pair in old_pairs if pair in new_set] != [pair for pair in new_pairs if pair in old_set]:
+        return sorted({keyword for keyword, _ in old_pairs + new_pairs})
+    return sorted({keyword for keyword, _ in old_set ^ new_set})
+
+
+def recategorize(parser, db_handler, include_unknown=False, batch_size=1000):
+    """Bring every rule-categorized row up to the parser's current rules.
+
+    include_unknown also covers rows imported before category provenance
+    was tracked, which may hold hand-picked categories. Returns a summary
+    dict with the number of rows checked, updated and re-stamped.
+    """
+    start = time.perf_counter()
+    rules_version, rules = parser.rules_snapshot()
+    db_handler.save_rules_version(rules_version, rules)
+
+    summary = {'rules_version': rules_version, 'stale': 0, 'checked': 0, 'updated': 0}
+    for old_version, count in db_handler.stale_rules_versions(rules_version, include_unknown):
+        summary['stale'] += count
+        old_rules = db_handler.get_rules_version(old_version)
+        # Without the old rules every row of that version has to be re-checked
+        keywords = None if old_rules is None else changed_keywords(old_rules, rules)
+        terms = None if not keywords else db_handler.keyword_index_terms(keywords)
+
+        after_id = 0
+        while True:
+            rows = db_handler.fetch_recategorize_candidates(
+                old_version, keywords, after_id, batch_size, include_unknown, terms
+            )
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            summary['checked'] += len(rows)
+
+            results = parser.categorize_many([row[1] or "" for row in rows], [row[2] for row in rows])
+            updates = [
+                (category, subcategory, row[0])
+                for row, (category, subcategory) in zip(rows, results)
+                if (category, subcategory) != (row[3], row[4])
+            ]
+            if updates:
+                summary['updated'] += db_handler.apply_rule_categories(updates, rules_version)
+
+        db_handler.stamp_rules_version(old_version, rules_version, include_unknown)
+
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info("Recategorized with rules %s: %d of %d stale rows checked, %d updated in %ss",
+                rules_version, summary['checked'], summary['stale'], summary['updated'], summary['seconds'])
+    return summary
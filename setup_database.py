@@ -31,6 +31,8 @@ if cursor.fetchone():
     print("Verified 'transactions' table exists")
 else:
     print("WARNING: 'transactions' table was not created!")
+cursor.execute("PRAGMA user_version")
+print(f"Schema version: {cursor.fetchone()[0]}")
 conn.close()
 
 print("Database setup complete!")
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""Synthetic bank statements for benchmarks and parser checks.
+
+Statements mix every layout parse_bank_statement_with_year() accepts:
+MM/DD and "Mon D" dates, with and without the Withdrawal/Deposit column
+and a transaction type, reference numbers on the following line, negative
+amounts and comma-grouped thousands. Output is deterministic for a seed.
+
+    python statement_generator.py 10000 statement.pdf
+    python statement_generator.py 10000 statement.txt --seed 7
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+LINES_PER_PAGE = 60
+
+MONTH_ABBREVIATIONS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                       "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+TRANSACTION_TYPES = ["Card Purchase", "POS", "ACH", "Transfer", "ATM"]
+
+# Rule keywords mixed with merchants no rule knows. None contain digits, which
+# the parser would mistake for the start of the next transaction's date.
+WITHDRAWAL_MERCHANTS = [
+    "Walmart Supercenter", "Kroger Fuel Center", "Aldi Market", "Meijer Store",
+    "Netflix Subscription", "Spotify Premium", "Doordash Order", "McDonalds",
+    "Columbia Gas Payment", "Verizon Wireless", "State Farm Insurance",
+    "The Home Depot", "Menards Hardware", "Shell Oil", "Speedway Fuel",
+    "Circle K Store", "Discover Card Payment", "Home Mtg Payment",
+    "Corner Bakery Cafe", "City Parking Garage", "Riverside Pharmacy",
+    "Blue Door Books", "Northside Dry Cleaning", "Maple Street Vet",
+]
+DEPOSIT_MERCHANTS = [
+    "Payroll Acme Corp", "Mobile Deposit", "Best Buy Stores Refund",
+    "Interest Payment", "Zelle From Jordan",
+]
+
+
+def format_amount(value):
+    """Format like a statement does: comma thousands, two decimals, leading minus."""
+    return f"{value:,.2f}"
+
+
+def generate_transactions(count, seed=0, start=date(2025, 1, 1)):
+    """Return `count` statement lines (a list of strings; some span two lines).
+
+    Dates advance through the year so a statement reads in order; each
+    element is one transaction, with any reference number after a newline.
+    """
+    rng = random.Random(seed)
+    balance = 5000.00
+    # Roughly one year whatever the count, never going backwards
+    step = 365 / max(count, 1)
+
+    lines = []
+    for index in range(count):
+        day = start + timedelta(days=int(index * step))
+        if rng.random() < 0.5:
+            raw_date = f"{day.month:02d}/{day.day:02d}"
+        else:
+            raw_date = f"{MONTH_ABBREVIATIONS[day.month - 1]} {day.day}"
+
+        # Balances have no sign on statements, so never let a withdrawal overdraw
+        deposit = rng.random() < 0.15 or balance < 2500
+        if deposit:
+            merchant = rng.choice(DEPOSIT_MERCHANTS)
+            amount = round(rng.uniform(50, 4500), 2)
+        else:
+            merchant = rng.choice(WITHDRAWAL_MERCHANTS)
+            # Mostly small purchases, with the odd four-figure payment
+            amount = -round(rng.uniform(1000, 2500) if rng.random() < 0.05 else rng.uniform(2, 250), 2)
+        balance = round(balance + amount, 2)
+
+        parts = [raw_date]
+        if rng.random() < 0.5:
+            parts.append("Deposit" if deposit else "Withdrawal")
+        if rng.random() < 0.7:
+            parts.append(rng.choice(TRANSACTION_TYPES))
+        parts.append(merchant)
+        parts.append(format_amount(amount))
+        parts.append(format_amount(balance))
+        line = " ".join(parts)
+
+        if rng.random() < 0.3:
+            # Reference numbers wrap onto their own line on real statements
+            line += f"\nRef:{rng.randrange(10 ** 8, 10 ** 9)}"
+        lines.append(line)
+    return lines
+
+
+def paginate(transaction_lines, lines_per_page=LINES_PER_PAGE):
+    """Split transactions into pages of text lines, each headed by a page marker."""
+    pages = []
+    current = []
+    for transaction in transaction_lines:
+        lines = transaction.split("\n")
+        if current and len(current) + len(lines) > lines_per_page:
+            pages.append(current)
+            current = []
+        current.extend(lines)
+    if current or not pages:
+        pages.append(current)
+
+    return [[f"Page: {number} of {len(pages)}"] + page for number, page in enumerate(pages, 1)]
+
+
+def generate_statement(count, seed=0, lines_per_page=LINES_PER_PAGE):
+    """Return the pages of a statement with `count` transactions, as lists of lines."""
+    return paginate(generate_transactions(count, seed), lines_per_page)
+
+
+def page_texts(pages):
+    """Join each page's lines the way a PDF text layer reads back."""
+    return ["\n".join(lines) for lines in pages]
+
+
+def write_text_statement(path, pages):
+    with open(path, 'w') as f:
+        f.write("\n".join(page_texts(pages)) + "\n")
+
+
+def _pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_pdf_statement(path, pages, font_size=9, leading=11):
+    """Write pages as a minimal text-layer PDF (Letter, Helvetica); needs no PDF library."""
+    # Objects 1-3 are the catalog, page tree and font; each page adds a page and its content
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for lines in pages:
+        operations = [f"BT /F1 {font_size} Tf {leading} TL 40 760 Td"]
+        for line in lines:
+            operations.append(f"{_pdf_string(line)} Tj T*")
+        operations.append("ET")
+        stream = "\n".join(operations).encode('latin-1', 'replace')
+
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        page_ids.append(len(objects))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                % (len(objects) + 1, xref_offset))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic bank statement as PDF or text')
+    parser.add_argument('count', type=int, help='Number of transactions')
+    parser.add_argument('output', help='Output file; .pdf writes a PDF, anything else plain text')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    pages = generate_statement(args.count, args.seed)
+    if args.output.lower().endswith('.pdf'):
+        write_pdf_statement(args.output, pages)
+    else:
+        write_text_statement(args.output, pages)
+    print(f"Wrote {args.count} transactions on {len(pages)} pages to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
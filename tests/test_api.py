@@ -0,0 +1,336 @@
+import gzip
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+
+import pytest
+
+import api
+import category_rules
+import instrumentation
+from category_rules import CategoryRegistry
+from database_handler import DatabaseHandler
+from extraction_cache import ExtractionCache
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATEMENT_PDF = os.path.join(REPO_ROOT, 'tests', 'data', 'statement.pdf')
+
+
+def test_import_has_no_side_effects(tmp_path):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    script = 'import logging, threading, api; assert threading.active_count() == 1 and not logging.getLogger().handlers'
+    subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, check=True)
+    assert os.listdir(tmp_path) == []
+
+
+def make_transaction(n, category="Grocery"):
+    return (f"2025-01-{n:02d}", "Withdrawal", "POS", f"Kroger {n}", float(n), 1000.0 - n, category, category)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(api, 'db_handler', DatabaseHandler(str(tmp_path / 'transactions.db')))
+    monkeypatch.setattr(api.parser, 'cache', ExtractionCache(str(tmp_path / 'extraction_cache.db')))
+    registry = CategoryRegistry(str(tmp_path / 'categories.json'))
+    monkeypatch.setattr(category_rules, '_registry', registry)
+    monkeypatch.setattr(api.parser, 'registry', registry)
+    monkeypatch.setattr(api, '_initialized', False)
+    monkeypatch.setattr(api, 'ingest_queue', None)
+    api.init_app()
+    yield api.app.test_client()
+    api.db_handler.close()
+
+
+@pytest.fixture
+def stored(client):
+    api.db_handler.insert_transactions(
+        [make_transaction(n) for n in range(1, 11)] + [make_transaction(n, "Income") for n in range(11, 16)]
+    )
+    return client
+
+
+def test_transactions_are_paged_with_a_cursor(stored):
+    first = stored.get('/api/transactions?limit=10&sort=amount&order=desc').get_json()
+    second = stored.get(f'/api/transactions?limit=10&sort=amount&order=desc&after={first["next_cursor"]}').get_json()
+
+    amounts = [t['amount'] for t in first['transactions'] + second['transactions']]
+    assert amounts == [float(n) for n in range(15, 0, -1)]
+    assert second['next_cursor'] is None
+
+
+def test_transactions_are_filtered(stored):
+    response = stored.get('/api/transactions?category=Income&min_amount=12&date_to=2025-01-14')
+    assert [t['details'] for t in response.get_json()['transactions']] == ["Kroger 12", "Kroger 13", "Kroger 14"]
+
+
+def test_transactions_carry_exact_cents(client):
+    api.db_handler.insert_transactions([
+        ("2025-01-01", "Withdrawal", "POS", "Kroger", 0.1 + 0.2, 1234.56, "Grocery", "Grocery"),
+        ("2025-01-02", "Withdrawal", "POS", "Legacy", None, None, "Grocery", "Grocery"),
+    ])
+    transactions = client.get('/api/transactions').get_json()['transactions']
+    assert [(t['amount_cents'], t['balance_cents']) for t in transactions] == [(30, 123456), (None, None)]
+
+
+@pytest.mark.parametrize("query", ["sort=nope", "after=garbage", "format=ndjson&sort=nope"])
+def test_bad_listing_parameters_are_a_400(stored, query):
+    response = stored.get(f'/api/transactions?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_transactions_stream_as_ndjson(stored, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 4)
+    by_format = stored.get('/api/transactions?format=ndjson&category=Grocery')
+    body = by_format.get_data(as_text=True)
+    by_header = stored.get('/api/transactions?category=Grocery', headers={'Accept': 'application/x-ndjson'})
+
+    assert by_format.mimetype == 'application/x-ndjson'
+    assert by_header.get_data(as_text=True) == body
+    lines = body.splitlines()
+    assert [json.loads(line)['details'] for line in lines] == [f"Kroger {n}" for n in range(1, 11)]
+
+
+def test_transactions_stream_as_one_json_array(stored, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 4)
+    response = stored.get('/api/transactions?format=json-stream&sort=id&order=desc')
+    assert [t['id'] for t in json.loads(response.data)] == list(range(15, 0, -1))
+
+    empty = stored.get('/api/transactions?format=json-stream&category=None')
+    assert json.loads(empty.data) == []
+
+
+def upload(client, path=None, filename='statement.pdf'):
+    with open(path or STATEMENT_PDF, 'rb') as f:
+        return client.post('/api/upload-pdf', data={'file': (f, filename)}, content_type='multipart/form-data')
+
+
+def test_upload_is_queued_and_polled(client):
+    response = upload(client)
+    assert response.status_code == 202
+
+    status_url = response.get_json()['status_url']
+    deadline = time.time() + 10
+    while (job := client.get(status_url).get_json())['status'] in ('queued', 'running'):
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+    assert job['status'] == 'done'
+    assert job['result']['inserted'] == 12
+    assert len(client.get('/api/transactions').get_json()['transactions']) == 12
+
+
+def test_upload_is_refused_when_the_queue_is_full(client, monkeypatch):
+    def full(*args, **kwargs):
+        raise queue.Full
+
+    monkeypatch.setattr(api.ingest_queue, 'submit', full)
+    response = upload(client)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_upload_rejects_other_files(client):
+    assert upload(client, filename='statement.txt').status_code == 400
+    assert client.get('/api/jobs/nope').status_code == 404
+
+
+def test_batch_upload_reports_each_file(client):
+    with open(STATEMENT_PDF, 'rb') as first, open(STATEMENT_PDF, 'rb') as second:
+        response = client.post('/api/upload-batch', data={'files': [(first, 'jan.pdf'), (second, 'copy.pdf')]},
+                               content_type='multipart/form-data')
+    assert response.status_code == 202
+
+    job = api.ingest_queue.get(response.get_json()['job_id'])
+    deadline = time.time() + 10
+    while job.finished is None:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+    files = job.to_dict()['result']['files']
+    assert [(f['filename'], f['inserted'], f['duplicates']) for f in files] == [('jan.pdf', 12, 0), ('copy.pdf', 0, 12)]
+
+
+def test_batch_upload_rejects_non_pdfs(client):
+    with open(STATEMENT_PDF, 'rb') as first:
+        response = client.post('/api/upload-batch', data={'files': [(first, 'notes.txt')]},
+                               content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert client.post('/api/upload-batch').status_code == 400
+
+
+def test_export_streams_csv(stored, monkeypatch):
+    monkeypatch.setattr(api, 'STREAM_BATCH_SIZE', 4)
+    response = stored.get('/api/export')
+
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].split(',') == api.EXPORT_COLUMNS
+    assert len(lines) == 16
+    assert lines[1].startswith('1,2025-01-01,Withdrawal,POS,Kroger 1,')
+
+
+def test_export_of_an_empty_database_is_a_404(client):
+    assert client.get('/api/export').status_code == 404
+
+
+def test_categories_are_listed(client):
+    assert 'Grocery' in client.get('/api/categories').get_json()
+
+
+def test_categories_revalidate_with_an_etag(client):
+    first = client.get('/api/categories')
+    etag = first.headers['ETag']
+    assert client.get('/api/categories', headers={'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/api/add-category', json={'category': 'Pets', 'keywords': ['Petco']}).status_code == 200
+
+    changed = client.get('/api/categories', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert 'Pets' in changed.get_json()
+
+
+def test_search_returns_matches_and_pages(stored):
+    first = stored.get('/api/search?q=kroger&limit=10').get_json()
+    second = stored.get(f'/api/search?q=kroger&limit=10&after={first["next_cursor"]}').get_json()
+
+    details = [t['details'] for t in first['transactions'] + second['transactions']]
+    assert sorted(details) == sorted(f"Kroger {n}" for n in range(1, 16))
+    assert second['next_cursor'] is None
+    assert stored.get('/api/search?q="kroger 12"').get_json()['transactions'][0]['id'] == 12
+
+
+@pytest.mark.parametrize("query", ["", "q=", 'q="*"', "q=kroger&after=garbage"])
+def test_bad_search_is_a_400(stored, query):
+    assert stored.get(f'/api/search?{query}').status_code == 400
+
+
+def test_summary_groups_the_rollups(stored):
+    rows = stored.get('/api/summary?group_by=category&month_from=2025-01').get_json()
+    assert rows == [
+        {'category': 'Grocery', 'total': 55.0, 'count': 10, 'min_amount': 1.0, 'max_amount': 10.0},
+        {'category': 'Income', 'total': 65.0, 'count': 5, 'min_amount': 11.0, 'max_amount': 15.0},
+    ]
+    assert stored.get('/api/summary?type=Deposit').get_json() == []
+    assert stored.get('/api/summary?group_by=details').status_code == 400
+
+
+def categories_by_id(client):
+    transactions = client.get('/api/transactions?limit=100').get_json()['transactions']
+    return {t['id']: (t['category'], t['subcategory']) for t in transactions}
+
+
+def bulk_set(client, **body):
+    return client.post('/api/bulk-set-category', json={'category': "Home -> Tools", **body})
+
+
+@pytest.mark.parametrize("body, expected_ids", [
+    ({'ids': [2, 4, 99]}, [2, 4]),
+    ({'filters': {'category': "Income", 'max_amount': 12}}, [11, 12]),
+    ({'q': '"kroger 13"'}, [13]),
+    ({'q': 'krog* 14'}, [14]),
+    ({'ids': [1, 12, 13], 'filters': {'category': "Income"}, 'q': 'kroger'}, [12, 13]),
+])
+def test_bulk_set_category_selects_by_ids_filters_and_search(stored, body, expected_ids):
+    response = bulk_set(stored, **body)
+
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == len(expected_ids)
+    updated = [i for i, pair in categories_by_id(stored).items() if pair == ("Home", "Tools")]
+    assert updated == expected_ids
+
+
+@pytest.mark.parametrize("body", [
+    {'ids': []},
+    {'ids': "12"},
+    {'ids': [1, "2"]},
+    {'ids': [1.5]},
+    {'ids': [True]},
+    {'ids': {'id': 1}},
+    {'filters': ["Income"]},
+    {'filters': {'category': ["Income"]}},
+    {'filters': {'nope': 1}},
+    {'q': 12},
+    {'q': '*'},
+    {},
+])
+def test_bad_bulk_selection_is_a_400(stored, body):
+    response = bulk_set(stored, **body)
+
+    assert response.status_code == 400
+    assert response.get_json()['error']
+    assert ("Home", "Tools") not in categories_by_id(stored).values()
+
+
+def test_unchanged_data_is_a_304_until_a_row_changes(stored):
+    first = stored.get('/api/transactions')
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    repeat = stored.get('/api/transactions', headers={'If-None-Match': etag})
+    assert (repeat.status_code, repeat.data) == (304, b'')
+    assert stored.get('/api/summary', headers={'If-None-Match': etag}).status_code == 304
+
+    api.db_handler.update_transaction_category(1, "Home", "Tools")
+    changed = stored.get('/api/transactions', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_if_modified_since_is_used_without_an_etag(stored):
+    last_modified = stored.get('/api/transactions').headers['Last-Modified']
+
+    assert stored.get('/api/transactions', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert stored.get('/api/transactions', headers={
+        'If-Modified-Since': last_modified, 'If-None-Match': 'W/"data-0"'
+    }).status_code == 200
+
+
+def test_errors_get_no_validators(stored):
+    response = stored.get('/api/transactions?sort=nope')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+
+def test_large_bodies_are_gzipped(stored):
+    plain = stored.get('/api/transactions')
+    zipped = stored.get('/api/transactions', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+
+    small = stored.get('/api/transactions?limit=1', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_streamed_bodies_are_gzipped_chunk_by_chunk(stored):
+    plain = stored.get('/api/transactions?format=ndjson').data
+    zipped = stored.get('/api/transactions?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain
+
+
+def test_metrics_count_requests_and_stage_work(stored, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'metrics', instrumentation.Metrics())
+    monkeypatch.setattr(api, 'metrics', instrumentation.metrics)
+    stored.get('/api/transactions')
+    stored.get('/api/transactions?sort=nope')
+    api.db_handler.insert_transactions([make_transaction(20)])
+
+    response = stored.get('/api/metrics')
+    assert response.content_type.startswith('text/plain')
+    body = response.get_data(as_text=True)
+    assert 'duckle_http_requests_total{endpoint="/api/transactions",method="GET",status="200"} 1' in body
+    assert 'duckle_http_requests_total{endpoint="/api/transactions",method="GET",status="400"} 1' in body
+    assert 'duckle_http_request_seconds_count{endpoint="/api/transactions"} 2' in body
+    assert 'duckle_rows_written_total{operation="insert"} 1' in body
@@ -0,0 +1,38 @@
+from benchmark import STAGES, benchmark_size, compare, drop_triggers
+from database_handler import DatabaseHandler
+
+
+def test_every_stage_is_timed_or_skipped(tmp_path):
+    results = benchmark_size(120, str(tmp_path), workers=1, seed=0, ocr_pages=1)
+
+    assert set(results) == {'generate'} | set(STAGES)
+    assert results['parse']['complete']
+    for stage in ('insert', 'insert_bare', 'triggers', 'fetch', 'export'):
+        assert results[stage]['count'] == 120
+    assert results['triggers']['seconds'] <= results['insert']['seconds']
+    assert 0 <= results['triggers']['share_of_insert'] <= 1
+
+
+def test_drop_triggers_leaves_a_plain_table(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'bare.db'))
+    db.create_tables()
+    drop_triggers(db)
+    db.insert_transactions([("2025-01-01", "Withdrawal", "POS", "Kroger", 1.0, 9.0, "Grocery", "Grocery")])
+
+    with db.pool.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM monthly_rollups').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 1
+    db.close()
+
+
+def report(**seconds):
+    return {'commit': 'abc', 'results': {'1000': {stage: {'seconds': value} for stage, value in seconds.items()}}}
+
+
+def test_compare_flags_only_real_slowdowns(capsys):
+    baseline = report(insert=1.0, triggers=0.5, fetch=0.01)
+
+    assert not compare(report(insert=1.1, triggers=0.5, fetch=0.03), baseline, 0.2, 0.05)
+    assert compare(report(insert=1.0, triggers=0.7, fetch=0.01), baseline, 0.2, 0.05)
+    assert 'SLOWER' in capsys.readouterr().out.splitlines()[-2]
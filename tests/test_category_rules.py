@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from category_rules import DEFAULT_RULES, CategoryRegistry
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'categories.json')
+
+
+def test_saved_rules_merge_after_the_defaults(path):
+    with open(path, 'w') as f:
+        json.dump({"Grocery": ["Kroger", "Trader Joe"], "Pets": ["Petco"]}, f)
+
+    registry = CategoryRegistry(path)
+
+    assert registry.rules["Grocery"] == DEFAULT_RULES["Grocery"] + ["Trader Joe"]
+    assert list(registry.rules)[-1] == "Pets"
+    assert registry.version == 1
+
+
+def test_unreadable_file_keeps_the_defaults(path):
+    with open(path, 'w') as f:
+        f.write("{not json")
+    assert CategoryRegistry(path).rules == DEFAULT_RULES
+
+
+def test_changes_bump_the_version_and_persist(path):
+    registry = CategoryRegistry(path)
+    version, rules = registry.snapshot()
+    fingerprint = registry.fingerprint()
+
+    assert registry.add_category("Pets", ["Petco"])
+    assert not registry.add_category("Pets", ["Petco"])
+
+    assert registry.version == version + 1
+    assert registry.fingerprint() != fingerprint
+    assert "Pets" not in rules  # Published rule sets are never mutated
+    with open(path) as f:
+        assert json.load(f)["Pets"] == ["Petco"]
+    assert CategoryRegistry(path).rules == registry.rules
+
+
+def test_fingerprint_is_stable_across_restarts(path):
+    assert CategoryRegistry(path).fingerprint() == CategoryRegistry(path).fingerprint()
+
+
+def test_defaults_cover_the_gui_categories():
+    for category in ("Entertainment -> Meals", "Debt -> Credit Card", "Home -> Home Improvement", "Snacks"):
+        assert category in DEFAULT_RULES
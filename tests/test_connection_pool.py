@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from connection_pool import ConnectionPool, PoolTimeout
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), readers=2, timeout=2.0)
+    with pool.writer() as conn:
+        conn.execute('CREATE TABLE items (value INTEGER)')
+        conn.commit()
+    yield pool
+    pool.close()
+
+
+def test_readers_are_read_only_and_see_committed_writes(pool):
+    with pool.writer() as conn:
+        conn.execute('INSERT INTO items VALUES (1)')
+        conn.commit()
+
+    with pool.reader() as conn:
+        assert [row['value'] for row in conn.execute('SELECT value FROM items')] == [1]
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute('INSERT INTO items VALUES (2)')
+
+
+def test_uncommitted_writes_are_rolled_back(pool):
+    with pool.writer() as conn:
+        conn.execute('INSERT INTO items VALUES (1)')
+        with pool.writer() as inner:
+            assert inner is conn
+        assert conn.in_transaction
+
+    with pool.reader() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+
+
+def test_readers_are_reused_up_to_the_limit(pool):
+    with pool.reader() as first:
+        pass
+    with pool.reader() as again:
+        assert again is first
+        with pool.reader():
+            assert pool.stats() == {'readers_open': 2, 'readers_idle': 0, 'readers_waiting': 0, 'max_readers': 2}
+    assert pool.stats()['readers_idle'] == 2
+
+
+def test_waiting_for_a_busy_pool_times_out(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), readers=1, timeout=0.05)
+    with pool.reader():
+        with pytest.raises(PoolTimeout):
+            with pool.reader():
+                pass
+    assert pool.stats()['readers_waiting'] == 0
+    pool.close()
+
+
+def test_waiters_are_served_in_arrival_order(pool):
+    held = [pool._acquire_reader() for _ in range(2)]
+    served = []
+
+    def wait(name):
+        with pool.reader():
+            served.append(name)
+
+    threads = []
+    for name in range(4):
+        thread = threading.Thread(target=wait, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Queue each thread before starting the next
+        while pool.stats()['readers_waiting'] <= name:
+            time.sleep(0.001)
+
+    # One connection goes round, so each waiter is served only after the one before it
+    pool._release_reader(held.pop())
+    for thread in threads:
+        thread.join()
+    pool._release_reader(held.pop())
+    assert served == [0, 1, 2, 3]
+
+
+def test_close_wakes_waiters_with_an_error(pool):
+    held = [pool._acquire_reader() for _ in range(2)]
+    errors = []
+
+    def wait():
+        try:
+            with pool.reader():
+                pass
+        except sqlite3.ProgrammingError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    while pool.stats()['readers_waiting'] == 0:
+        time.sleep(0.001)
+    pool.close()
+    thread.join()
+
+    assert len(errors) == 1
+    for conn in held:
+        pool._release_reader(conn)
+    assert pool.stats()['readers_open'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        with pool.reader():
+            pass
@@ -0,0 +1,378 @@
+import random
+import sqlite3
+
+import pytest
+
+import database_handler
+from database_handler import SORTABLE_COLUMNS, DatabaseHandler, fts_query, transaction_key
+
+
+def make_transaction(n, details="Kroger"):
+    return (f"2025-01-{n:02d}", "Withdrawal", "POS", f"{details} {n}", float(n), 1000.0 - n, "Grocery", "Grocery")
+
+
+@pytest.fixture
+def db(tmp_path):
+    handler = DatabaseHandler(str(tmp_path / 'transactions.db'))
+    handler.create_tables()
+    yield handler
+    handler.close()
+
+
+def execute(db, sql, params=()):
+    # Runs one statement on the writer connection and commits it
+    with db.pool.writer() as conn:
+        rows = conn.execute(sql, params).fetchall()
+        conn.commit()
+    return rows
+
+
+def test_insert_transactions_returns_consecutive_ids(db):
+    db.insert_transaction(make_transaction(1))
+    result = db.insert_transactions(make_transaction(n) for n in range(2, 6))
+
+    assert result == {'ids': [2, 3, 4, 5], 'inserted': 4, 'duplicates': 0}
+    assert [row['details'] for row in db.fetch_all_transactions()] == [f"Kroger {n}" for n in range(1, 6)]
+
+
+def test_insert_nothing_returns_no_ids(db):
+    assert db.insert_transactions([]) == {'ids': [], 'inserted': 0, 'duplicates': 0}
+    assert db.fetch_all_transactions() == []
+
+
+def test_failed_batch_inserts_nothing(db):
+    rows = [make_transaction(1), make_transaction(2)[:7]]
+    with pytest.raises(sqlite3.ProgrammingError):
+        db.insert_transactions(rows)
+    assert db.fetch_all_transactions() == []
+
+
+def test_update_transaction_category(db):
+    db.insert_transactions([make_transaction(1)])
+    db.update_transaction_category(1, "Home", "Tools")
+
+    row = db.fetch_all_transactions()[0]
+    assert (row['category'], row['subcategory']) == ("Home", "Tools")
+
+
+def test_reimport_skips_stored_transactions(db):
+    db.insert_transactions([make_transaction(1), make_transaction(2)])
+    result = db.insert_transactions([make_transaction(2), make_transaction(3)])
+
+    assert (result['inserted'], result['duplicates']) == (1, 1)
+    assert [row['id'] for row in db.fetch_all_transactions()][-1:] == result['ids']
+    assert len(db.fetch_all_transactions()) == 3
+
+
+def test_groups_share_one_transaction_and_count_their_own_duplicates(db):
+    results = db.insert_transaction_groups([
+        [make_transaction(1), make_transaction(2)],
+        [make_transaction(2), make_transaction(3)],
+        [],
+    ])
+
+    assert [(r['inserted'], r['duplicates']) for r in results] == [(2, 0), (1, 1), (0, 0)]
+    assert [len(r['ids']) for r in results] == [2, 1, 0]
+    assert sorted(results[0]['ids'] + results[1]['ids']) == [row['id'] for row in db.fetch_all_transactions()]
+
+
+def test_key_ignores_case_and_punctuation_in_details():
+    assert transaction_key("2025-01-05", 12.3, 100, "POS Kroger #123") == \
+        transaction_key("2025-01-05", "12.30", "100.00", "pos kroger 123")
+    assert transaction_key("2025-01-05", 12.3, 100, "Kroger") != transaction_key("2025-01-05", 12.3, 99, "Kroger")
+
+
+def test_upgrade_keeps_the_lowest_id_of_each_duplicate(tmp_path):
+    db_name = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_name)
+    conn.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, withdrawal_or_deposit TEXT,
+            transaction_type TEXT, details TEXT, amount REAL, balance REAL,
+            category TEXT, subcategory TEXT
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO transactions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [make_transaction(1), make_transaction(2), make_transaction(1), make_transaction(2),
+         make_transaction(1), ("2025-01-09", None, None, None, None, None, None, None)],
+    )
+    conn.commit()
+    conn.close()
+
+    handler = DatabaseHandler(db_name)
+    try:
+        handler.create_tables()
+        rows = execute(handler, 'SELECT id, dedup_key FROM transactions ORDER BY id')
+    finally:
+        handler.close()
+
+    assert [row[0] for row in rows] == [1, 2, 6]
+    assert all(row[1] is not None for row in rows)
+
+
+def random_transactions(count, seed=0):
+    rng = random.Random(seed)
+
+    def maybe(value):
+        return None if rng.random() < 0.2 else value
+
+    return [
+        (
+            maybe(f"2025-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}"),
+            maybe(rng.choice(["Withdrawal", "Deposit"])),
+            maybe(rng.choice(["POS", "ACH", "ATM"])),
+            maybe(rng.choice(["Kroger", "Netflix", "Payroll", "Shell"])) or "",
+            maybe(float(rng.randint(1, 20))),
+            maybe(float(rng.randint(100, 120))),
+            maybe(rng.choice(["Grocery", "Income", "Gas"])),
+            maybe(rng.choice(["Grocery", "Income", "Snacks"])),
+        )
+        for _ in range(count)
+    ]
+
+
+def sort_key(value, transaction_id):
+    # SQLite orders NULLs first and compares text by byte value
+    return (value is not None, value if value is not None else 0, transaction_id)
+
+
+@pytest.mark.parametrize("sort", SORTABLE_COLUMNS)
+@pytest.mark.parametrize("descending", [False, True])
+def test_paging_visits_every_row_once_in_order(db, sort, descending):
+    # Exercise the index ranges, including duplicates of the same sort value
+    db.insert_transactions(random_transactions(200))
+    rows = {row['id']: row for row in db.fetch_all_transactions()}
+    expected = sorted(
+        rows,
+        key=lambda transaction_id: sort_key(rows[transaction_id][sort], transaction_id),
+        reverse=descending,
+    )
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = db.fetch_transactions(limit=7, after=cursor, sort=sort, descending=descending)
+        seen += [row['id'] for row in page]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+
+def test_paging_applies_filters(db):
+    db.insert_transactions(random_transactions(200))
+    filters = {'category': 'Grocery', 'min_amount': 5, 'max_amount': 15}
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = db.fetch_transactions(limit=5, after=cursor, sort='balance', filters=filters)
+        seen += page
+        if cursor is None:
+            break
+
+    assert seen
+    assert all(row['category'] == 'Grocery' and 5 <= row['amount'] <= 15 for row in seen)
+    assert len(seen) == sum(
+        1 for row in db.fetch_all_transactions()
+        if row['category'] == 'Grocery' and row['amount'] is not None and 5 <= row['amount'] <= 15
+    )
+
+
+def test_bad_sort_filter_or_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        db.fetch_transactions(sort='id; DROP TABLE transactions')
+    with pytest.raises(ValueError):
+        db.fetch_transactions(filters={'nope': 1})
+    with pytest.raises(ValueError):
+        db.fetch_transactions(after='not a cursor')
+
+
+@pytest.mark.parametrize("sort", SORTABLE_COLUMNS)
+def test_every_sort_reads_an_index(db, sort):
+    order_by = 'id DESC' if sort == 'id' else f'{sort} DESC, id DESC'
+    plan = execute(db, f'EXPLAIN QUERY PLAN SELECT * FROM transactions ORDER BY {order_by} LIMIT 10')
+    assert not any('TEMP B-TREE' in row[3] for row in plan)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('kroger store', '"kroger" "store"'),
+    ('"home depot"', '"home depot"'),
+    ('kro*', '"kro"*'),
+    ('"home dep"*', '"home dep"*'),
+    ('k-mart (NOT', '"k mart" "NOT"'),
+])
+def test_fts_query_quotes_every_term(text, expected):
+    assert fts_query(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "  ", '"" * -'])
+def test_fts_query_without_words_is_rejected(text):
+    with pytest.raises(ValueError):
+        fts_query(text)
+
+
+def search_details(db, query, **kwargs):
+    return [row[4] for row in db.search_transactions(query, **kwargs)[0]]
+
+
+def test_search_matches_words_phrases_and_prefixes(db):
+    db.insert_transactions([
+        make_transaction(1, "Home Depot"), make_transaction(2, "Depot Home"), make_transaction(3, "Kroger"),
+    ])
+
+    assert sorted(search_details(db, 'home depot')) == ["Depot Home 2", "Home Depot 1"]
+    assert search_details(db, '"home depot"') == ["Home Depot 1"]
+    assert search_details(db, 'krog*') == ["Kroger 3"]
+    assert search_details(db, 'krog') == []
+
+
+def test_search_index_follows_updates_and_deletes(db):
+    db.insert_transactions([make_transaction(1, "Kroger"), make_transaction(2, "Aldi")])
+    execute(db, "UPDATE transactions SET details = 'Aldi Market' WHERE id = 1")
+    execute(db, "DELETE FROM transactions WHERE id = 2")
+    db.update_transaction_category(1, "Home", "Tools")
+
+    assert search_details(db, 'kroger') == []
+    assert search_details(db, 'aldi') == ["Aldi Market"]
+    assert execute(db, "SELECT COUNT(*) FROM transactions_fts WHERE transactions_fts MATCH 'aldi'")[0][0] == 1
+
+
+@pytest.mark.parametrize("limit", [1, 3, 4, 100])
+def test_search_pages_through_the_ranked_window_and_older_matches(db, monkeypatch, limit):
+    monkeypatch.setattr(database_handler, 'SEARCH_RANK_WINDOW', 5)
+    db.insert_transactions([
+        make_transaction(n, "Kroger Kroger" if n % 3 == 0 else "Kroger" if n % 2 else "Aldi") for n in range(1, 21)
+    ])
+    matching = [n for n in range(1, 21) if n % 3 == 0 or n % 2]
+
+    ids, after = [], None
+    while True:
+        rows, after = db.search_transactions('kroger', limit=limit, after=after)
+        assert len(rows) <= limit
+        ids.extend(row[0] for row in rows)
+        if after is None:
+            break
+
+    window = sorted(matching, reverse=True)[:5]
+    assert sorted(ids[:5]) == sorted(window)
+    # Rows naming Kroger twice rank above the rest of the window; ties go by id
+    assert ids[:2] == [15, 18]
+    assert ids[5:] == sorted(set(matching) - set(window), reverse=True)
+
+
+def rollups(db):
+    return [tuple(row) for row in execute(
+        db, 'SELECT * FROM monthly_rollups ORDER BY month, category, subcategory, direction'
+    )]
+
+
+def grouped_rollups(db):
+    # What the rollup table should hold, computed from scratch
+    return [tuple(row) for row in execute(db, '''
+        SELECT IFNULL(substr(date, 1, 7), ''), IFNULL(category, ''), IFNULL(subcategory, ''),
+               IFNULL(withdrawal_or_deposit, ''), SUM(IFNULL(amount, 0)), COUNT(*),
+               MIN(IFNULL(amount, 0)), MAX(IFNULL(amount, 0))
+        FROM transactions
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+    ''')]
+
+
+def test_rollups_treat_a_null_amount_as_zero(db):
+    db.insert_transactions([make_transaction(1), make_transaction(2)])
+    execute(db, '''
+        INSERT INTO transactions (date, withdrawal_or_deposit, details, amount, category, subcategory)
+        VALUES ('2025-01-03', 'Withdrawal', 'Legacy', NULL, 'Grocery', 'Grocery')
+    ''')
+    assert rollups(db) == grouped_rollups(db) == [("2025-01", "Grocery", "Grocery", "Withdrawal", 3.0, 3, 0.0, 2.0)]
+
+    execute(db, "UPDATE transactions SET amount = NULL WHERE id = 2")
+    execute(db, "UPDATE transactions SET category = 'Home' WHERE details = 'Legacy'")
+    assert rollups(db) == grouped_rollups(db)
+
+    execute(db, "DELETE FROM transactions WHERE amount IS NULL")
+    assert rollups(db) == grouped_rollups(db) == [("2025-01", "Grocery", "Grocery", "Withdrawal", 1.0, 1, 1.0, 1.0)]
+
+
+
+def test_rows_without_a_date_roll_up_under_an_empty_month(db):
+    db.insert_transactions([make_transaction(1), (None, "Withdrawal", "POS", "Legacy", 4.0, 1.0, "Grocery", "Grocery")])
+    execute(db, "UPDATE transactions SET amount = 3.0 WHERE date IS NULL")
+
+    assert rollups(db) == grouped_rollups(db) == [
+        ("", "Grocery", "Grocery", "Withdrawal", 3.0, 1, 3.0, 3.0),
+        ("2025-01", "Grocery", "Grocery", "Withdrawal", 1.0, 1, 1.0, 1.0),
+    ]
+
+
+def test_rollups_follow_random_edits(db):
+    rng = random.Random(7)
+    db.insert_transactions(random_transactions(200, seed=7))
+    for _ in range(100):
+        ids = [row[0] for row in execute(db, 'SELECT id FROM transactions')]
+        transaction_id = rng.choice(ids)
+        action = rng.randrange(4)
+        if action == 0:
+            db.update_transaction_category(transaction_id, rng.choice(["Home", "Gas", None]), "Other")
+        elif action == 1:
+            execute(db, 'UPDATE transactions SET amount = ? WHERE id = ?', (rng.uniform(-50, 50), transaction_id))
+        elif action == 2:
+            execute(db, "UPDATE transactions SET date = '2025-03-01' WHERE id = ?", (transaction_id,))
+        else:
+            execute(db, 'DELETE FROM transactions WHERE id = ?', (transaction_id,))
+
+    assert len(rollups(db)) == len(grouped_rollups(db))
+    for actual, expected in zip(rollups(db), grouped_rollups(db)):
+        assert actual[:4] == expected[:4] and actual[5:] == expected[5:]
+        assert actual[4] == pytest.approx(expected[4])
+
+
+def test_summary_merges_and_filters_rollups(db):
+    db.insert_transactions([
+        make_transaction(1), make_transaction(2, "Aldi"),
+        ("2025-02-01", "Deposit", "ACH", "Payroll", 500.0, 1500.0, "Income", "Salary"),
+    ])
+    db.update_transaction_category(2, "Grocery", "Organic")
+
+    by_category = [tuple(row) for row in db.summary(group_by=['month', 'category'])]
+    assert by_category == [("2025-01", "Grocery", 3.0, 2, 1.0, 2.0), ("2025-02", "Income", 500.0, 1, 500.0, 500.0)]
+    assert [tuple(row) for row in db.summary({'direction': 'Deposit'}, ['category'])] == [("Income", 500.0, 1, 500.0, 500.0)]
+    assert [tuple(row) for row in db.summary({'month_to': '2025-01'}, ['subcategory'])] == [
+        ("Grocery", 1.0, 1, 1.0, 1.0), ("Organic", 2.0, 1, 2.0, 2.0)
+    ]
+    with pytest.raises(ValueError):
+        db.summary(group_by=['details'])
+
+
+def test_bulk_update_category_marks_rows_manual(db):
+    db.insert_transactions([make_transaction(n) for n in range(1, 6)])
+
+    assert db.bulk_update_category("Home", "Tools", ids=[1, 2, 3], filters={'min_amount': 2}) == 2
+    assert db.bulk_update_category("Gas", "Gas", search="kroger", filters={'max_amount': 1}) == 1
+    rows = execute(db, 'SELECT id, category, category_source FROM transactions ORDER BY id')
+    assert [tuple(row) for row in rows] == [
+        (1, "Gas", "manual"), (2, "Home", "manual"), (3, "Home", "manual"), (4, "Grocery", "rule"), (5, "Grocery", "rule"),
+    ]
+    with pytest.raises(ValueError):
+        db.bulk_update_category("Home", "Tools")
+
+
+def test_find_transaction_ids_maps_parsed_rows_to_stored_ids(db):
+    db.insert_transactions([make_transaction(1), make_transaction(2)])
+
+    assert db.find_transaction_ids([make_transaction(2), make_transaction(3), make_transaction(1)]) == [2, None, 1]
+
+
+def test_data_version_moves_on_every_change(db):
+    versions = [db.data_version()[0]]
+    db.insert_transactions([make_transaction(1), make_transaction(2)])
+    versions.append(db.data_version()[0])
+    db.update_transaction_category(1, "Home", "Tools")
+    versions.append(db.data_version()[0])
+    execute(db, 'DELETE FROM transactions WHERE id = 2')
+    versions.append(db.data_version()[0])
+
+    assert versions == sorted(set(versions))
+    assert db.data_version()[1] > 0
@@ -0,0 +1,138 @@
+import os
+
+import pytest
+
+import duckle_parser
+from category_rules import CategoryRegistry
+from duckle_parser import BankStatementParser
+from transaction import TransactionBatch
+
+STATEMENT_PDF = os.path.join(os.path.dirname(__file__), 'data', 'statement.pdf')
+
+STATEMENT = """Page: 1 of 2
+01/05 Withdrawal POS Kroger Fuel Center -12.34 4,987.66
+Ref:123456789
+Jan 6 Deposit Payroll Acme Corp 1,500.00 6,487.66
+01/07 Netflix Subscription -15.99 6,471.67
+Page: 2 of 2
+Feb 1 ACH Columbia Gas Payment -80.00 6,391.67
+Feb 2 Card Purchase Speedway Fuel -12.00 6,379.67
+"""
+
+
+@pytest.fixture
+def parser(tmp_path):
+    # Only the built-in rules, whatever categories.json holds
+    return BankStatementParser(use_cache=False, registry=CategoryRegistry(str(tmp_path / 'categories.json')))
+
+
+def test_parses_every_layout(parser):
+    transactions = parser.parse_bank_statement_with_year(STATEMENT)
+    assert [transaction.as_row() for transaction in transactions] == [
+        ("2025-01-05", "Withdrawal", "POS", "Kroger Fuel Center Ref:123456789",
+         12.34, 4987.66, "Grocery", "Grocery"),
+        ("2025-01-06", "Deposit", "Other", "Payroll Acme Corp", 1500.0, 6487.66, "Income", "Income"),
+        ("2025-01-07", "Withdrawal", "Other", "Netflix Subscription", 15.99, 6471.67,
+         "Entertainment", "Entertainment"),
+        ("2025-02-01", "Withdrawal", "ACH", "Columbia Gas Payment", 80.0, 6391.67, "Utilities", "Utilities"),
+        ("2025-02-02", "Withdrawal", "Card Purchase", "Speedway Fuel", 12.0, 6379.67, "Gas", "Snacks"),
+    ]
+
+
+def test_unknown_month_keeps_a_zero_month(parser):
+    transactions = parser.parse_bank_statement_with_year("Foo 3 Deposit Refund 5.00 10.00")
+    assert transactions[0].date == "2025-00-03"
+
+
+@pytest.mark.parametrize("text", ["", "no transactions on this page"])
+def test_text_without_transactions_parses_to_nothing(parser, text):
+    assert parser.parse_bank_statement_with_year(text) == []
+
+
+@pytest.mark.parametrize("details, amount, expected", [
+    ("SHELL OIL 123", "45.00", ("Gas", "Gas")),
+    ("Shell Oil 123", "29.99", ("Gas", "Snacks")),
+    ("The Home Depot", "10.00", ("Home", "Home Improvement")),
+    ("Taco Bell #12", "10.00", ("Entertainment", "Meals")),
+    ("Sheetz 0042", "8.00", ("Gas", "Snacks")),
+    ("Corner Bakery", "10.00", ("Uncategorized", "Other")),
+])
+def test_categorize_transaction(parser, details, amount, expected):
+    assert parser.categorize_transaction(details, amount) == expected
+
+
+def test_batches_are_categorized_from_their_cents(parser):
+    batch = TransactionBatch(
+        ("2025-01-01", "Withdrawal", "POS", details, amount, 0.0, None, None)
+        for details, amount in [("Shell Oil", 29.99), ("Shell Oil", 30.0), ("Home Depot", 10.0), ("Bakery", 1.0)]
+    )
+    expected = [("Gas", "Snacks"), ("Gas", "Gas"), ("Home", "Home Improvement"), ("Uncategorized", "Other")]
+
+    assert parser.categorize_batch(batch) == expected
+    assert parser.categorize_many(batch.details, [29.99, 30.0, 10.0, 1.0]) == expected
+
+
+def test_streaming_matches_whole_text_parse(parser):
+    expected = parser.parse_bank_statement_with_year(STATEMENT)
+    lines = STATEMENT.splitlines()
+    for split in range(len(lines) + 1):
+        pages = ["\n".join(lines[:split]), "\n".join(lines[split:])]
+        assert list(parser.iter_transactions(pages)) == expected
+
+
+def test_streaming_joins_a_transaction_split_by_a_page_break(parser):
+    pages = [
+        "01/05 Withdrawal POS Kroger Fuel",
+        "Center -12.34 4,987.66\nRef:123456789",
+        "Jan 6 Deposit Payroll Acme Corp 1,500.00 6,487.66",
+    ]
+    transactions = list(parser.iter_transactions(pages))
+    assert [t[3] for t in transactions] == ["Kroger Fuel Center Ref:123456789", "Payroll Acme Corp"]
+
+
+def test_streaming_yields_before_the_last_page_is_read(parser):
+    def pages():
+        yield "01/05 Netflix -15.99 100.00\n01/06 Spotify -9.99 90.01"
+        raise AssertionError("read past the first page")
+
+    assert next(parser.iter_transactions(pages()))[3] == "Netflix"
+
+
+def test_pdf_transactions_stream_from_the_text_layer():
+    parser = BankStatementParser(workers=1, use_cache=False)
+    transactions = list(parser.iter_pdf_transactions(STATEMENT_PDF))
+
+    assert len(transactions) == 12
+    assert transactions[0].as_row()[:5] == ("2025-01-01", "Withdrawal", "POS", "Kroger Store 1", 10.0)
+    assert transactions[-1].balance_cents == 88000
+
+
+def test_only_pages_without_a_text_layer_are_ocrd(monkeypatch):
+    parser = BankStatementParser(workers=1, use_cache=False)
+    monkeypatch.setattr(parser.extractor, 'iter_page_texts', lambda path: iter([
+        "01/05 Netflix Subscription -15.99 100.00", "", "  short  ",
+    ]))
+    ocr_pages = []
+
+    def fake_ocr(pdf_file_path, page_number):
+        ocr_pages.append(page_number)
+        return f"OCR page {page_number}"
+
+    monkeypatch.setattr(duckle_parser, 'ocr_page', fake_ocr)
+
+    assert list(parser.iter_pdf_page_texts("statement.pdf")) == [
+        "01/05 Netflix Subscription -15.99 100.00", "OCR page 1", "OCR page 2",
+    ]
+    assert ocr_pages == [1, 2]
+
+
+def test_failed_ocr_keeps_the_text_layer(monkeypatch):
+    parser = BankStatementParser(workers=1, use_cache=False)
+    monkeypatch.setattr(parser.extractor, 'iter_page_texts', lambda path: iter(["x"]))
+
+    def broken_ocr(pdf_file_path, page_number):
+        raise RuntimeError("tesseract is not installed")
+
+    monkeypatch.setattr(duckle_parser, 'ocr_page', broken_ocr)
+
+    assert list(parser.iter_pdf_page_texts("statement.pdf")) == ["x"]
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from duckle_parser import BankStatementParser
+from extraction_cache import ExtractionCache, hash_file
+
+STATEMENT_PDF = os.path.join(os.path.dirname(__file__), 'data', 'statement.pdf')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(str(tmp_path / 'cache.db'))
+
+
+def test_entries_are_keyed_by_kind_hash_and_version(cache):
+    cache.put_pages('abc', 1, ["page one", "page two"])
+    cache.put_transactions('abc', 'v1', [("2025-01-05", "Withdrawal", 1.5)])
+
+    assert cache.get_pages('abc', 1) == ["page one", "page two"]
+    assert cache.get_pages('abc', 2) is None
+    assert cache.get_pages('def', 1) is None
+    assert cache.get_transactions('abc', 'v1') == [("2025-01-05", "Withdrawal", 1.5)]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache.db'), max_bytes=40)
+    cache.put_pages('a', 1, ["x" * 10])
+    cache.put_pages('b', 1, ["x" * 10])
+    cache.get_pages('a', 1)  # b is now the least recently used
+    cache.put_pages('c', 1, ["x" * 10])
+
+    assert cache.get_pages('a', 1) is not None
+    assert cache.get_pages('b', 1) is None
+    assert cache.get_pages('c', 1) is not None
+
+
+def test_purge_one_file_or_everything(cache):
+    cache.put_pages('a', 1, ["a"])
+    cache.put_transactions('a', 'v1', [])
+    cache.put_pages('b', 1, ["b"])
+
+    assert cache.purge('a') == 2
+    assert [entry[1] for entry in cache.entries()] == ['b']
+    assert cache.purge() == 1
+    assert cache.entries() == []
+
+
+def test_hash_file_matches_content(tmp_path):
+    first = tmp_path / 'first.pdf'
+    second = tmp_path / 'second.pdf'
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    assert hash_file(str(first)) == hash_file(str(second))
+
+
+def test_repeat_parse_is_served_from_the_cache(cache, monkeypatch):
+    parser = BankStatementParser(workers=1)
+    parser.cache = cache
+    first = list(parser.iter_pdf_transactions(STATEMENT_PDF))
+
+    def no_extraction(pdf_file_path):
+        raise AssertionError("extracted a cached file again")
+
+    monkeypatch.setattr(parser, 'iter_pdf_page_texts', no_extraction)
+    assert list(parser.iter_pdf_transactions(STATEMENT_PDF)) == first
+    assert len(first) == 12
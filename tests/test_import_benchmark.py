@@ -0,0 +1,11 @@
+import import_benchmark
+
+
+def test_api_import_loads_no_heavy_modules():
+    _, loaded = import_benchmark.time_target(import_benchmark.API_TARGET, runs=1)
+    assert loaded == []
+
+
+def test_cli_help_loads_no_heavy_modules():
+    _, loaded = import_benchmark.time_target(import_benchmark.CLI_TARGET, runs=1)
+    assert loaded == []
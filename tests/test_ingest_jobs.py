@@ -0,0 +1,151 @@
+import os
+import queue
+import shutil
+import threading
+import time
+
+import pytest
+
+from category_rules import CategoryRegistry
+from database_handler import DatabaseHandler
+from duckle_parser import BankStatementParser
+from ingest_jobs import IngestJobQueue, find_pdfs, ingest_files
+
+STATEMENT_PDF = os.path.join(os.path.dirname(__file__), 'data', 'statement.pdf')
+
+
+@pytest.fixture
+def db(tmp_path):
+    handler = DatabaseHandler(str(tmp_path / 'transactions.db'))
+    handler.create_tables()
+    yield handler
+    handler.close()
+
+
+@pytest.fixture
+def parser():
+    return BankStatementParser(workers=1, use_cache=False)
+
+
+def wait_for(job, timeout=10):
+    deadline = time.time() + timeout
+    while job.finished is None:
+        assert time.time() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job.to_dict()
+
+
+def test_job_reports_progress_and_result(parser, db, tmp_path):
+    pdf_path = str(tmp_path / 'upload.pdf')
+    shutil.copy(STATEMENT_PDF, pdf_path)
+
+    jobs = IngestJobQueue(parser, db, workers=1)
+    job = wait_for(jobs.submit(pdf_path, 'statement.pdf', delete_after=True))
+
+    assert job['status'] == 'done'
+    assert job['progress'] == {'pages_extracted': 6, 'pages_ocrd': 0, 'rows_parsed': 12, 'rows_inserted': 12}
+    assert (job['result']['parsed'], job['result']['inserted'], job['result']['duplicates']) == (12, 12, 0)
+    # The upload is deleted just after the job reports done
+    deadline = time.time() + 10
+    while os.path.exists(pdf_path):
+        assert time.time() < deadline, "upload was not deleted"
+        time.sleep(0.01)
+    assert job['filenames'] == ['statement.pdf']
+
+
+def test_failed_job_keeps_its_error(parser, db, tmp_path):
+    jobs = IngestJobQueue(parser, db, workers=1)
+    job = wait_for(jobs.submit(str(tmp_path / 'missing.pdf')))
+
+    assert job['status'] == 'failed'
+    assert job['error']
+    assert job['filenames'] == ['missing.pdf']
+
+
+def test_full_queue_refuses_new_jobs(db):
+    release = threading.Event()
+
+    class BlockingParser:
+        def rules_snapshot(self):
+            return None, {}
+
+        def iter_pdf_transactions(self, pdf_file_path, on_progress=None):
+            release.wait()
+            return iter([])
+
+    jobs = IngestJobQueue(BlockingParser(), db, workers=1, max_queued=1)
+    running = jobs.submit('a.pdf')
+    while running.started is None:
+        time.sleep(0.01)
+    jobs.submit('b.pdf')
+
+    with pytest.raises(queue.Full):
+        jobs.submit('c.pdf')
+    assert jobs.pending() == 1
+
+    release.set()
+    assert wait_for(running)['status'] == 'done'
+
+
+def test_only_recent_finished_jobs_are_kept(db):
+    class EmptyParser:
+        def rules_snapshot(self):
+            return None, {}
+
+        def iter_pdf_transactions(self, pdf_file_path, on_progress=None):
+            return iter([])
+
+    jobs = IngestJobQueue(EmptyParser(), db, workers=1, keep_finished=2)
+    finished = [wait_for(jobs.submit(f'{n}.pdf'))['id'] for n in range(4)]
+    jobs.submit('last.pdf')
+
+    assert [jobs.get(job_id) is not None for job_id in finished] == [False, False, True, True]
+
+
+def test_ingest_files_summarizes_each_file(parser, db, tmp_path):
+    copy = str(tmp_path / 'copy.pdf')
+    shutil.copy(STATEMENT_PDF, copy)
+    progress = []
+
+    summaries = ingest_files(
+        parser, db, [STATEMENT_PDF, str(tmp_path / 'missing.pdf'), copy],
+        workers=3, on_progress=lambda stage, count=1: progress.append((stage, count)),
+    )
+
+    assert [(s['filename'], s['parsed'], s['inserted'], s['duplicates']) for s in summaries] == [
+        ('statement.pdf', 12, 12, 0),
+        ('missing.pdf', 0, 0, 0),
+        ('copy.pdf', 12, 0, 12),
+    ]
+    assert summaries[1]['error'] and summaries[0]['error'] is None
+    assert ('rows_inserted', 12) in progress
+    assert len(db.fetch_all_transactions()) == 12
+
+
+def test_find_pdfs(tmp_path):
+    (tmp_path / 'nested').mkdir()
+    for name in ('b.PDF', 'a.pdf', 'notes.txt', 'nested/c.pdf'):
+        (tmp_path / name).write_bytes(b'')
+
+    names = [os.path.relpath(path, tmp_path) for path in find_pdfs(str(tmp_path))]
+    assert names == ['a.pdf', 'b.PDF', os.path.join('nested', 'c.pdf')]
+    assert len(find_pdfs(str(tmp_path), recursive=False)) == 2
+
+
+def test_rows_are_stamped_with_the_rules_read_before_parsing(db, tmp_path):
+    registry = CategoryRegistry(str(tmp_path / 'categories.json'))
+    parser = BankStatementParser(workers=1, use_cache=False, registry=registry)
+    before_version, before_rules = registry.stamp()
+    parse = parser.iter_pdf_transactions
+
+    def parse_while_rules_change(pdf_file_path, on_progress=None):
+        registry.add_category("Pets", ["Petco"])
+        return parse(pdf_file_path, on_progress=on_progress)
+
+    parser.iter_pdf_transactions = parse_while_rules_change
+    ingest_files(parser, db, [STATEMENT_PDF])
+
+    with db.pool.reader() as conn:
+        assert {row[0] for row in conn.execute('SELECT rules_version FROM transactions')} == {before_version}
+    assert db.get_rules_version(before_version) == before_rules
+    assert registry.fingerprint() != before_version
@@ -0,0 +1,95 @@
+import json
+import logging
+
+import pytest
+
+import instrumentation
+from instrumentation import JsonFormatter, Metrics, configure_logging, timed, timed_iter
+
+DEFINITIONS = {
+    'rows_parsed_total': ('counter', 'Rows.'),
+    'stage_seconds': ('histogram', 'Seconds.'),
+    'stage_errors_total': ('counter', 'Errors.'),
+    'stage_peak_bytes': ('gauge', 'Peak.'),
+}
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = Metrics(DEFINITIONS, buckets=(0.1, 1))
+    monkeypatch.setattr(instrumentation, 'metrics', metrics)
+    return metrics
+
+
+def test_render_uses_the_prometheus_text_format(metrics):
+    metrics.increment('rows_parsed_total', 3, stage='parse')
+    metrics.increment('rows_parsed_total', 2, stage='parse')
+    metrics.observe('stage_seconds', 0.05, stage='ocr')
+    metrics.observe('stage_seconds', 0.5, stage='ocr')
+    metrics.set_max('stage_peak_bytes', 10, stage='ocr')
+    metrics.set_max('stage_peak_bytes', 4, stage='ocr')
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE duckle_rows_parsed_total counter' in lines
+    assert 'duckle_rows_parsed_total{stage="parse"} 5' in lines
+    assert 'duckle_stage_seconds_bucket{stage="ocr",le="0.1"} 1' in lines
+    assert 'duckle_stage_seconds_bucket{stage="ocr",le="1"} 2' in lines
+    assert 'duckle_stage_seconds_bucket{stage="ocr",le="+Inf"} 2' in lines
+    assert 'duckle_stage_seconds_count{stage="ocr"} 2' in lines
+    assert 'duckle_stage_peak_bytes{stage="ocr"} 10' in lines
+
+
+def test_label_values_are_escaped(metrics):
+    metrics.increment('rows_parsed_total', stage='a "b"\n')
+    assert 'duckle_rows_parsed_total{stage="a \\"b\\"\\n"} 1' in metrics.render()
+
+
+def test_unlisted_metrics_are_rejected(metrics):
+    with pytest.raises(KeyError):
+        metrics.increment('rows_typoed_total')
+
+
+def test_timed_counts_failures_and_still_times_them(metrics):
+    with timed('parse'):
+        pass
+    with pytest.raises(ValueError):
+        with timed('parse'):
+            raise ValueError("bad page")
+
+    rendered = metrics.render()
+    assert 'duckle_stage_seconds_count{stage="parse"} 2' in rendered
+    assert 'duckle_stage_errors_total{stage="parse"} 1' in rendered
+
+
+def test_timed_iter_times_each_item(metrics):
+    assert list(timed_iter('parse_page', iter([1, 2, 3]))) == [1, 2, 3]
+    assert 'duckle_stage_seconds_count{stage="parse_page"} 3' in metrics.render()
+
+
+def test_json_formatter_keeps_extra_fields():
+    record = logging.LogRecord('duckle', logging.INFO, __file__, 1, 'Imported %d rows', (12,), None)
+    record.path = 'statement.pdf'
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'Imported 12 rows'
+    assert (entry['level'], entry['logger'], entry['path']) == ('INFO', 'duckle', 'statement.pdf')
+
+
+def test_configure_logging_leaves_existing_handlers_alone(monkeypatch):
+    root = logging.getLogger()
+    existing = logging.NullHandler()
+    monkeypatch.setattr(root, 'handlers', [existing])
+
+    configure_logging(level='DEBUG')
+    assert root.handlers == [existing]
+
+
+def test_configure_logging_sets_level_and_json_format(monkeypatch):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, 'handlers', [])
+    monkeypatch.setattr(root, 'level', root.level)
+    monkeypatch.setenv('DUCKLE_LOG_FORMAT', 'json')
+
+    configure_logging(level='warning')
+    assert root.level == logging.WARNING
+    assert isinstance(root.handlers[0].formatter, JsonFormatter)
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from keyword_matcher import KeywordMatcher
+
+
+def naive_first_match(keywords, text):
+    text = text.lower()
+    for keyword, value in keywords:
+        if keyword.lower() in text:
+            return value
+    return None
+
+
+def test_no_keywords_match_nothing():
+    assert KeywordMatcher([]).first_match("anything") is None
+
+
+def test_match_is_case_insensitive():
+    assert KeywordMatcher([("Kroger", "Grocery")]).first_match("POS KROGER #123") == "Grocery"
+
+
+def test_priority_beats_position_in_text():
+    matcher = KeywordMatcher([("gas", "Utilities"), ("shell", "Gas")])
+    assert matcher.first_match("shell station gas") == "Utilities"
+
+
+def test_overlapping_keywords_are_found_through_fail_links():
+    # "she" is only reachable by falling back from the "ushe" branch
+    matcher = KeywordMatcher([("she", "A"), ("ushers", "B")])
+    assert matcher.first_match("usher") == "A"
+    assert matcher.first_match("ushe") == "A"
+
+
+def test_empty_keyword_matches_everything():
+    assert KeywordMatcher([("", "Default")]).first_match("") == "Default"
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_agrees_with_a_naive_scan(seed):
+    rng = random.Random(seed)
+    alphabet = "abc"
+    keywords = [("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))), n) for n in range(15)]
+    matcher = KeywordMatcher(keywords)
+    for _ in range(50):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        assert matcher.first_match(text) == naive_first_match(keywords, text)
@@ -0,0 +1,53 @@
+import csv
+import os
+import shutil
+import sys
+
+import pytest
+
+import main
+
+STATEMENT_PDF = os.path.join(os.path.dirname(__file__), 'data', 'statement.pdf')
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def run(*args):
+        monkeypatch.setattr(sys, 'argv', ['main.py', '--db', str(tmp_path / 'transactions.db'), *args])
+        with pytest.raises(SystemExit) as exit_info:
+            main.main()
+        return exit_info.value.code
+
+    return run
+
+
+def test_ingest_then_export(run, tmp_path, capsys):
+    folder = tmp_path / 'statements'
+    folder.mkdir()
+    shutil.copy(STATEMENT_PDF, folder / 'copy.pdf')
+
+    # No --workers: one file per core
+    assert run('--ingest', STATEMENT_PDF, str(folder), '--export', 'out.csv') == 0
+
+    output = capsys.readouterr().out
+    assert f"OK      {STATEMENT_PDF}: 12 parsed, 12 new, 0 duplicates" in output
+    assert "24 rows parsed, 12 inserted" in output
+    assert f"OK      {folder / 'copy.pdf'}: 12 parsed, 0 new, 12 duplicates" in output
+
+    with open(tmp_path / 'out.csv', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == main.EXPORT_COLUMNS
+    assert len(rows) == 13
+    assert rows[1][4] == "Kroger Store 1"
+
+
+def test_failed_file_sets_the_exit_status(run, tmp_path, capsys):
+    assert run('--ingest', str(tmp_path / 'missing.pdf'), '--workers', '1') == 1
+    assert "FAILED" in capsys.readouterr().out
+
+
+def test_empty_directory_has_nothing_to_ingest(run, tmp_path):
+    (tmp_path / 'empty').mkdir()
+    assert run('--ingest', str(tmp_path / 'empty')) == 1
@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, withdrawal_or_deposit TEXT,
+        transaction_type TEXT, details TEXT, amount REAL, balance REAL,
+        category TEXT, subcategory TEXT
+    )
+'''
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'transactions.db'))
+    yield conn
+    conn.close()
+
+
+def insert_legacy_rows(conn, rows):
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany('INSERT INTO transactions VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+
+
+def test_fresh_database_reaches_the_latest_version(conn):
+    assert migrations.migrate(conn) == migrations.SCHEMA_VERSION
+    assert migrations.migrate(conn) == migrations.SCHEMA_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_transactions_dedup_key', 'idx_transactions_date'} <= indexes
+
+
+def test_legacy_rows_with_nulls_are_keyed(conn):
+    insert_legacy_rows(conn, [
+        ("2025-01-05", "Withdrawal", "POS", "Kroger", 12.5, 100.0, "Grocery", "Grocery"),
+        ("2025-01-06", None, None, None, None, None, None, None),
+        ("2025-01-07", "Deposit", None, "Payroll", 500.0, None, None, None),
+        ("2025-01-06", None, None, None, None, None, None, None),
+    ])
+
+    migrations.migrate(conn)
+
+    rows = conn.execute('SELECT id, dedup_key FROM transactions ORDER BY id').fetchall()
+    assert rows == [
+        (1, migrations._dedup_key_v2("2025-01-05", 12.5, 100.0, "Kroger")),
+        (2, migrations._dedup_key_v2("2025-01-06", None, None, "")),
+        (3, migrations._dedup_key_v2("2025-01-07", 500.0, None, "Payroll")),
+    ]
+    assert rows[1][1].startswith("2025-01-06|||")
+
+
+def test_frozen_key_format():
+    # Rows keyed by this step must keep matching what it wrote when it shipped
+    assert migrations._dedup_key_v2("2025-01-05", 12.5, 100.0, "POS Kroger #1") == \
+        "2025-01-05|12.50|100.00|03b6cfffc7e625d7"
+
+
+def test_failed_step_rolls_back_and_keeps_the_version(conn, monkeypatch):
+    def broken_step(cursor):
+        cursor.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError("step failed")
+
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:1] + [broken_step])
+    monkeypatch.setattr(migrations, 'SCHEMA_VERSION', 2)
+
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+    assert migrations.get_schema_version(conn) == 1
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
+
+
+def test_newer_database_is_refused(conn):
+    conn.execute(f'PRAGMA user_version = {migrations.SCHEMA_VERSION + 1}')
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
@@ -0,0 +1,51 @@
+import os
+
+import pdfplumber
+import pytest
+
+import pdf_extractor
+from pdf_extractor import PdfExtractor
+
+STATEMENT_PDF = os.path.join(os.path.dirname(__file__), 'data', 'statement.pdf')
+
+
+@pytest.fixture
+def open_count(monkeypatch):
+    opened = []
+    real_open = pdfplumber.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(pdfplumber, 'open', counting_open)
+    return opened
+
+
+def test_page_ranges_cover_every_page():
+    assert PdfExtractor(workers=1, pages_per_task=4)._page_ranges(9) == [(0, 4), (4, 8), (8, 9)]
+    assert PdfExtractor(workers=1)._page_ranges(0) == []
+
+
+def test_single_worker_opens_the_pdf_once(open_count):
+    extractor = PdfExtractor(workers=1, pages_per_task=2)
+    texts = list(extractor.iter_page_texts(STATEMENT_PDF))
+
+    assert len(texts) == 6
+    assert [text.splitlines()[0] for text in texts] == [f"Page: {n} of 6" for n in range(1, 7)]
+    assert open_count == [STATEMENT_PDF]
+
+
+def test_worker_pool_returns_pages_in_order():
+    expected = list(PdfExtractor(workers=1).iter_page_texts(STATEMENT_PDF))
+
+    extractor = PdfExtractor(workers=2, pages_per_task=1)
+    try:
+        assert list(extractor.iter_page_texts(STATEMENT_PDF)) == expected
+    finally:
+        extractor.close()
+
+
+def test_extract_page_range_reads_a_slice():
+    texts = pdf_extractor.extract_page_range(STATEMENT_PDF, 4, 6)
+    assert [text.splitlines()[0] for text in texts] == ["Page: 5 of 6", "Page: 6 of 6"]
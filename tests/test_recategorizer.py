@@ -0,0 +1,141 @@
+import pytest
+
+import database_handler
+
+from category_rules import CategoryRegistry
+from database_handler import DatabaseHandler
+from duckle_parser import BankStatementParser
+from recategorizer import changed_keywords, recategorize
+
+
+def test_changed_keywords_are_the_added_and_removed_ones():
+    old = {"Grocery": ["Kroger", "Aldi"], "Gas": ["Shell"]}
+    new = {"Grocery": ["Kroger"], "Gas": ["Shell", "BP"]}
+    assert changed_keywords(old, new) == ["aldi", "bp"]
+
+
+def test_moving_a_keyword_between_categories_changes_it():
+    old = {"Grocery": ["Walmart"], "Home": []}
+    new = {"Grocery": [], "Home": ["Walmart"]}
+    assert changed_keywords(old, new) == ["walmart"]
+
+
+def test_reordering_shared_keywords_changes_every_keyword():
+    old = {"Grocery": ["Kroger"], "Gas": ["Kroger Fuel"]}
+    new = {"Gas": ["Kroger Fuel"], "Grocery": ["Kroger"]}
+    assert changed_keywords(old, new) == ["kroger", "kroger fuel"]
+
+
+@pytest.fixture
+def db(tmp_path):
+    handler = DatabaseHandler(str(tmp_path / 'transactions.db'))
+    handler.create_tables()
+    yield handler
+    handler.close()
+
+
+@pytest.fixture
+def parser(tmp_path):
+    registry = CategoryRegistry(str(tmp_path / 'categories.json'))
+    return BankStatementParser(workers=1, use_cache=False, registry=registry)
+
+
+def row(n, details, category="Uncategorized", subcategory="Other"):
+    return (f"2025-01-{n:02d}", "Withdrawal", "POS", details, 10.0, 100.0 - n, category, subcategory)
+
+
+def categories(db):
+    with db.pool.reader() as conn:
+        return {
+            row['details']: (row['category'], row['subcategory'])
+            for row in conn.execute('SELECT details, category, subcategory FROM transactions')
+        }
+
+
+def test_rule_change_updates_only_affected_rule_rows(db, parser):
+    rules_version, rules = parser.rules_snapshot()
+    db.insert_transactions([row(1, "Petco 123"), row(2, "Corner Bakery"), row(3, "Petco Manual")],
+                           rules_version, rules)
+    db.update_transaction_category(3, "Gifts", "Gifts")
+    parser.add_category("Pets", ["Petco"])
+
+    summary = recategorize(parser, db)
+
+    assert (summary['stale'], summary['checked'], summary['updated']) == (2, 1, 1)
+    assert categories(db) == {
+        "Petco 123": ("Pets", "Pets"),
+        "Corner Bakery": ("Uncategorized", "Other"),
+        "Petco Manual": ("Gifts", "Gifts"),
+    }
+    assert recategorize(parser, db)['stale'] == 0
+
+
+def test_rows_of_unknown_provenance_need_include_unknown(db, parser):
+    db.insert_transactions([row(1, "Petco 123")])
+    with db.pool.writer() as conn:
+        conn.execute('UPDATE transactions SET category_source = NULL')
+        conn.commit()
+    parser.add_category("Pets", ["Petco"])
+
+    assert recategorize(parser, db)['updated'] == 0
+    assert recategorize(parser, db, include_unknown=True)['updated'] == 1
+    assert categories(db)["Petco 123"] == ("Pets", "Pets")
+
+
+def test_keywords_with_like_wildcards_match_literally(db, parser):
+    rules_version, rules = parser.rules_snapshot()
+    db.insert_transactions([row(1, "Store 100% Off"), row(2, "Store 1000 Off")], rules_version, rules)
+    parser.add_category("Sales", ["100%"])
+
+    summary = recategorize(parser, db)
+
+    assert summary['checked'] == 1
+    assert categories(db)["Store 100% Off"] == ("Sales", "Sales")
+    assert categories(db)["Store 1000 Off"] == ("Uncategorized", "Other")
+
+
+def test_index_terms_cover_keywords_inside_words(db):
+    db.insert_transactions([row(1, "WALMART #12"), row(2, "Kmart Store"), row(3, "Corner Bakery")])
+
+    assert db.keyword_index_terms(["mart"]) == ["kmart", "walmart"]
+    assert db.keyword_index_terms(["art store"]) == ["store"]
+    assert db.keyword_index_terms(["zzz"]) == []
+
+
+def test_index_terms_give_up_when_the_index_cannot_narrow_rows(db, monkeypatch):
+    db.insert_transactions([row(n, f"Shop{n}") for n in range(1, 6)])
+
+    assert db.keyword_index_terms(["café"]) is None
+    assert db.keyword_index_terms(["%"]) is None
+    monkeypatch.setattr(database_handler, 'MAX_KEYWORD_TERMS', 4)
+    assert db.keyword_index_terms(["shop"]) is None
+
+
+def test_index_candidates_match_the_like_scan(db):
+    details = ["WALMART #12", "Kmart Store", "Smart Cafe", "Corner Bakery", "MART", "Art Store"] * 5
+    db.insert_transactions([row(n % 28 + 1, f"{text} {n}") for n, text in enumerate(details)])
+    with db.pool.reader() as conn:
+        rules_version = conn.execute('SELECT rules_version FROM transactions').fetchone()[0]
+
+    for keywords in (["mart"], ["art store", "bakery"], ["zzz"]):
+        terms = db.keyword_index_terms(keywords)
+        for limit in (1, 7, 100):
+            scanned, indexed = [], []
+            for found, use_terms in ((scanned, None), (indexed, terms)):
+                after_id = 0
+                while rows := db.fetch_recategorize_candidates(rules_version, keywords, after_id, limit,
+                                                               terms=use_terms):
+                    found.extend(tuple(r) for r in rows)
+                    after_id = rows[-1][0]
+            assert indexed == scanned
+
+
+def test_recategorize_finds_keywords_inside_words_through_the_index(db, parser):
+    rules_version, rules = parser.rules_snapshot()
+    db.insert_transactions([row(1, "SUPERPETCO 9"), row(2, "Corner Bakery")], rules_version, rules)
+    parser.add_category("Pets", ["Petco"])
+
+    summary = recategorize(parser, db)
+
+    assert (summary['checked'], summary['updated']) == (1, 1)
+    assert categories(db)["SUPERPETCO 9"] == ("Pets", "Pets")
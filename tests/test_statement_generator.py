@@ -0,0 +1,50 @@
+import pytest
+
+from duckle_parser import BankStatementParser
+from statement_generator import generate_statement, generate_transactions, page_texts, write_pdf_statement
+
+
+@pytest.fixture
+def parser():
+    return BankStatementParser(workers=1, use_cache=False)
+
+
+def test_statements_are_deterministic_per_seed():
+    assert generate_statement(50, seed=1) == generate_statement(50, seed=1)
+    assert generate_statement(50, seed=1) != generate_statement(50, seed=2)
+
+
+def test_pages_are_numbered_and_never_overflow():
+    pages = generate_statement(500, lines_per_page=40)
+
+    assert [page[0] for page in pages] == [f"Page: {n} of {len(pages)}" for n in range(1, len(pages) + 1)]
+    assert all(len(page) <= 41 for page in pages)
+    # A reference line never starts a page away from its transaction
+    assert not any(page[1].startswith("Ref:") for page in pages)
+
+
+def test_balances_follow_the_amounts():
+    balance = 5000.00
+    for line in generate_transactions(300, seed=4):
+        *_, amount, new_balance = line.split("\n")[0].split(" ")
+        balance = round(balance + float(amount.replace(",", "")), 2)
+        assert float(new_balance.replace(",", "")) == balance
+        assert balance >= 0
+
+
+def test_every_generated_transaction_is_parsed(parser):
+    pages = generate_statement(400, seed=5)
+    transactions = list(parser.iter_transactions(page_texts(pages)))
+
+    assert len(transactions) == 400
+    assert [t[0] for t in transactions] == sorted(t[0] for t in transactions)
+
+
+def test_pdf_statement_reads_back_through_the_parser(parser, tmp_path):
+    pytest.importorskip('pdfplumber')
+    pages = generate_statement(150, seed=6)
+    path = tmp_path / 'statement.pdf'
+    write_pdf_statement(str(path), pages)
+
+    assert path.read_bytes().startswith(b'%PDF-')
+    assert list(parser.iter_pdf_transactions(str(path))) == list(parser.iter_transactions(page_texts(pages)))
@@ -0,0 +1,105 @@
+import hashlib
+import re
+
+import pytest
+
+from database_handler import DatabaseHandler, keyed_rows, transaction_key, with_key
+from transaction import (
+    Transaction, TransactionBatch, as_transaction, format_cents, format_datestamp, to_cents, to_datestamp,
+)
+
+ROWS = [
+    ("2025-01-05", "Withdrawal", "POS", "Kroger Fuel Center", 12.34, 4987.66, "Grocery", "Grocery"),
+    ("2025-01-06", "Deposit", "Other", "Payroll Acme Corp", 1500.0, 6487.66, "Income", "Income"),
+    ("2025-00-07", "Withdrawal", "POS", "Speedway Fuel", 0.1, -0.07, "Gas", "Snacks"),
+]
+
+
+@pytest.mark.parametrize("value, cents", [
+    ("-1,234.56", -123456),
+    ("12.3", 1230),
+    ("-.05", -5),
+    ("7", 700),
+    (0.1 + 0.2, 30),
+    (12.34, 1234),
+    (5, 500),
+    (None, None),
+])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize("cents, text", [(-123456, "-1234.56"), (5, "0.05"), (-5, "-0.05"), (0, "0.00"), (None, "")])
+def test_format_cents(cents, text):
+    assert format_cents(cents) == text
+
+
+@pytest.mark.parametrize("date, datestamp", [("2025-01-05", 20250105), ("2025-00-31", 20250031), (None, None)])
+def test_datestamps_round_trip(date, datestamp):
+    assert to_datestamp(date) == datestamp
+    assert to_datestamp(datestamp) == datestamp
+    assert format_datestamp(datestamp) == date
+
+
+def test_transaction_converts_to_and_from_rows():
+    transaction = Transaction.from_values(*ROWS[0])
+    assert transaction == (20250105, "Withdrawal", "POS", "Kroger Fuel Center", 1234, 498766, "Grocery", "Grocery")
+    assert (transaction.date, transaction.amount, transaction.balance) == ("2025-01-05", 12.34, 4987.66)
+    assert transaction.as_row() == ROWS[0]
+    assert Transaction.from_row(ROWS[0] + ("extra",)) == transaction
+    assert as_transaction(transaction) is transaction
+    assert as_transaction(ROWS[0]) == transaction
+
+
+def test_stored_nulls_pass_through():
+    row = (None, "Withdrawal", "POS", "Legacy", None, None, "Grocery", "Grocery")
+    assert Transaction.from_row(row).as_row() == row
+
+
+def test_batch_stores_repeated_strings_once():
+    batch = TransactionBatch(ROWS * 100)
+
+    assert len(batch) == 300
+    assert batch.categories.values == ["Grocery", "Income", "Gas"]
+    assert batch.categories.codes.itemsize == 2
+    assert (batch.datestamps.typecode, batch.amounts_cents.typecode) == ('l', 'q')
+    assert batch[4] == Transaction.from_values(*ROWS[1])
+
+
+def test_batch_rows_match_the_records():
+    batch = TransactionBatch(ROWS)
+    assert list(batch) == [Transaction.from_values(*row) for row in ROWS]
+    assert list(batch.iter_rows()) == ROWS
+
+
+def old_transaction_key(date, amount, balance, details):
+    # The key as computed before amounts were held in cents
+    normalized_details = re.sub(r'[^a-z0-9]+', '', details.lower())
+    details_hash = hashlib.sha1(normalized_details.encode()).hexdigest()[:16]
+
+    def number(value):
+        return '' if value is None else f"{float(value):.2f}"
+
+    return f"{date}|{number(amount)}|{number(balance)}|{details_hash}"
+
+
+def test_dedup_keys_are_unchanged():
+    expected = [old_transaction_key(row[0], row[4], row[5], row[3]) for row in ROWS]
+    records = [Transaction.from_values(*row) for row in ROWS]
+
+    assert [row[-1] for row in keyed_rows(TransactionBatch(ROWS))] == expected
+    assert [row[-1] for row in keyed_rows(records)] == expected
+    assert [with_key(row)[-1] for row in ROWS] == expected
+    assert transaction_key(None, None, None, "Legacy") == old_transaction_key(None, None, None, "Legacy")
+
+
+def test_batch_rows_are_inserted_with_their_keys(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'transactions.db'))
+    db.create_tables()
+    try:
+        assert db.insert_transactions(TransactionBatch(ROWS))['inserted'] == 3
+        # The same lines as old-style tuples are recognised as duplicates
+        assert db.insert_transactions(ROWS)['inserted'] == 0
+        assert [tuple(row)[1:9] for row in db.fetch_all_transactions()] == ROWS
+    finally:
+        db.close()
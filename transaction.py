@@ -0,0 +1,208 @@
+"""Compact in-memory forms of parsed transactions.
+
+A Transaction is an immutable 8-field record, in the same order as the
+old tuples. Money is integer cents and the date is a YYYYMMDD integer,
+so amounts compare and add exactly. The database and the UIs still see
+ISO dates and dollar amounts through `date`, `amount`, `balance` and
+as_row().
+
+TransactionBatch keeps many transactions in columns: typed arrays for
+dates and money, and 16-bit codes for the few distinct
+type/category strings. It uses a fraction of the memory of a list of
+records, and iter_rows() feeds bulk inserts straight from the columns.
+"""
+from array import array
+from collections import namedtuple
+
+
+def to_cents(value):
+    """Convert an amount to integer cents.
+
+    Accepts statement text ("-1,234.56"), a float or an int of dollars.
+    Text with two decimal places converts without going through a float.
+    None, a NULL column, stays None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        text = value.replace(',', '').strip()
+        sign = -1 if text.startswith('-') else 1
+        whole, _, fraction = text.lstrip('-').partition('.')
+        if len(fraction) > 2:
+            return round(float(text) * 100)
+        return sign * (int(whole or 0) * 100 + int(fraction.ljust(2, '0')))
+    return round(value * 100)
+
+
+def format_cents(cents):
+    """Format cents as a plain dollar amount with two decimals, e.g. -123456 -> "-1234.56".
+
+    None formats as an empty string.
+    """
+    if cents is None:
+        return ''
+    sign = '-' if cents < 0 else ''
+    whole, fraction = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{fraction:02d}"
+
+
+def to_datestamp(value):
+    """Convert an ISO date string ("2025-01-05") to a YYYYMMDD integer; integers pass through.
+
+    Unlike date ordinals this also round-trips the "2025-00-05" dates the
+    parser produces for unknown month names.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    year, month, day = value.split('-')
+    return int(year) * 10000 + int(month) * 100 + int(day)
+
+
+def format_datestamp(datestamp):
+    if datestamp is None:
+        return None
+    year, month_day = divmod(datestamp, 10000)
+    month, day = divmod(month_day, 100)
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+_TransactionFields = namedtuple('_TransactionFields', [
+    'datestamp', 'withdrawal_or_deposit', 'transaction_type', 'details',
+    'amount_cents', 'balance_cents', 'category', 'subcategory',
+])
+
+
+class Transaction(_TransactionFields):
+    """One statement line with a YYYYMMDD date and amounts in integer cents."""
+    __slots__ = ()
+
+    @classmethod
+    def from_values(cls, date, withdrawal_or_deposit, transaction_type, details,
+                    amount, balance, category, subcategory):
+        """Build from the database/display form: an ISO date and dollar amounts."""
+        return cls(
+            to_datestamp(date), withdrawal_or_deposit, transaction_type, details,
+            to_cents(amount), to_cents(balance), category, subcategory
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a stored row without its id (date through subcategory)."""
+        return cls.from_values(*row[:8])
+
+    @property
+    def date(self):
+        return format_datestamp(self.datestamp)
+
+    @property
+    def amount(self):
+        return _to_dollars(self.amount_cents)
+
+    @property
+    def balance(self):
+        return _to_dollars(self.balance_cents)
+
+    def as_row(self):
+        """The database/display form: ISO date and dollar amounts, in column order."""
+        return (
+            self.date, self.withdrawal_or_deposit, self.transaction_type, self.details,
+            self.amount, self.balance, self.category, self.subcategory
+        )
+
+
+def _to_dollars(cents):
+    return None if cents is None else cents / 100
+
+
+def as_transaction(value):
+    """Return value as a Transaction, converting an old-style 8-tuple of ISO date and dollars."""
+    if isinstance(value, Transaction):
+        return value
+    return Transaction.from_values(*value)
+
+
+class _CodedColumn:
+    """A column of few distinct strings, stored as 16-bit codes into a list of the values."""
+    __slots__ = ('values', 'codes', '_index')
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('H')
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, position):
+        return self.values[self.codes[position]]
+
+    def __iter__(self):
+        values = self.values
+        return (values[code] for code in self.codes)
+
+
+class TransactionBatch:
+    """Many transactions stored column by column.
+
+    Iterating yields Transaction records; iter_rows() yields database rows
+    without building them. Indexing returns the Transaction at a position.
+    """
+
+    def __init__(self, transactions=()):
+        self.datestamps = array('l')
+        self.amounts_cents = array('q')
+        self.balances_cents = array('q')
+        self.details = []
+        self.withdrawal_or_deposit = _CodedColumn()
+        self.transaction_types = _CodedColumn()
+        self.categories = _CodedColumn()
+        self.subcategories = _CodedColumn()
+        self.extend(transactions)
+
+    def append(self, transaction):
+        transaction = as_transaction(transaction)
+        self.datestamps.append(transaction.datestamp)
+        self.withdrawal_or_deposit.append(transaction.withdrawal_or_deposit)
+        self.transaction_types.append(transaction.transaction_type)
+        self.details.append(transaction.details)
+        self.amounts_cents.append(transaction.amount_cents)
+        self.balances_cents.append(transaction.balance_cents)
+        self.categories.append(transaction.category)
+        self.subcategories.append(transaction.subcategory)
+
+    def extend(self, transactions):
+        for transaction in transactions:
+            self.append(transaction)
+
+    def __len__(self):
+        return len(self.details)
+
+    def __getitem__(self, position):
+        return Transaction(
+            self.datestamps[position], self.withdrawal_or_deposit[position],
+            self.transaction_types[position], self.details[position],
+            self.amounts_cents[position], self.balances_cents[position],
+            self.categories[position], self.subcategories[position]
+        )
+
+    def _columns(self):
+        return (
+            self.datestamps, self.withdrawal_or_deposit, self.transaction_types, self.details,
+            self.amounts_cents, self.balances_cents, self.categories, self.subcategories
+        )
+
+    def __iter__(self):
+        return map(Transaction, *self._columns())
+
+    def iter_rows(self):
+        """Yield each transaction in the database/display form of Transaction.as_row()."""
+        for (datestamp, withdrawal_or_deposit, transaction_type, details,
+             amount_cents, balance_cents, category, subcategory) in zip(*self._columns()):
+            yield (
+                format_datestamp(datestamp), withdrawal_or_deposit, transaction_type, details,
+                amount_cents / 100, balance_cents / 100, category, subcategory
+            )